@@ -13,6 +13,56 @@ dotenv.load_dotenv()
 st.set_page_config(layout="wide")
 
 DISPLAY_TOP_VALUES = 8
+GRID_PAGE_SIZE = 15
+
+
+def paginated_grid(df, columns, key):
+    # Sorting, filtering and paging happen here so AgGrid only receives one page
+    # instead of the full cached result on every rerun
+    controls = st.columns([3, 2, 1, 1])
+    with controls[0]:
+        name_filter = st.text_input(
+            "Filter", placeholder="Filter by name", key=f"{key} filter"
+        )
+    with controls[1]:
+        sort_by = st.selectbox(
+            "Sort by", columns[1:], index=0, key=f"{key} sort"
+        )
+    with controls[2]:
+        ascending = st.toggle("Ascending", key=f"{key} ascending")
+
+    sorted_df = data.sort_and_filter(df[columns], sort_by, ascending, name_filter)
+    page_count = max(1, -(-len(sorted_df) // GRID_PAGE_SIZE))
+    # The page lives in the session state only, setting it there and passing a
+    # default value as well makes Streamlit warn. The filter can leave fewer pages
+    # than the page currently selected
+    if f"{key} page" not in st.session_state:
+        st.session_state[f"{key} page"] = 1
+    elif st.session_state[f"{key} page"] > page_count:
+        st.session_state[f"{key} page"] = page_count
+    with controls[3]:
+        page = st.number_input(
+            f"Page (of {page_count})",
+            min_value=1,
+            max_value=page_count,
+            key=f"{key} page",
+        )
+
+    page_df = data.get_page(sorted_df, page - 1, GRID_PAGE_SIZE)
+
+    gb = GridOptionsBuilder.from_dataframe(page_df, resizable=True)
+    gb.configure_default_column(sortable=False, filter=False)
+    gb.configure_selection(selection_mode="single")
+    grid_options = gb.build()
+
+    AgGrid(
+        page_df,
+        gridOptions=grid_options,
+        height=500,
+        width="100%",
+        fit_columns_on_grid_load=True,
+        key=key,
+    )
 
 
 def stream_metrics_cards(latest_stream_metrics):
@@ -39,9 +89,9 @@ def stream_metrics_cards(latest_stream_metrics):
             key="card3",
         )
 
-def stream_viewers_chart(live_viewers):
+def stream_viewers_chart(live_viewers, title="Current Viewers"):
     options = {
-            "title": {"text": "Current Viewers"},
+            "title": {"text": title},
             "tooltip": {
                 "trigger": "axis",
                 "axisPointer": {
@@ -128,31 +178,17 @@ def top_games_chart(stream_metrics, top_games):
         "legendselectchanged": "function(params) { return params.selected }",
     }
 
-    gb = GridOptionsBuilder.from_dataframe(
-        top_games[
+    cols = st.columns(2)
+    with cols[0]:
+        st.header(":video_game: Top Games")
+        paginated_grid(
+            top_games,
             [
                 "Name",
                 "Hours Watched",
                 "Highest # of Viewers",
                 "Highest # of Streamers",
-            ]
-        ],
-        resizable=True,
-    )
-
-    gb.configure_pagination(paginationAutoPageSize=True)
-    gb.configure_selection(selection_mode="single")
-    grid_options = gb.build()
-
-    cols = st.columns(2)
-    with cols[0]:
-        st.header(":video_game: Top Games")
-        AgGrid(
-            top_games,
-            gridOptions=grid_options,
-            height=500,
-            width="100%",
-            fit_columns_on_grid_load=True,
+            ],
             key="Top Games Chart",
         )
 
@@ -214,23 +250,12 @@ def top_streamers_chart(stream_metrics, top_streamers):
         "legendselectchanged": "function(params) { return params.selected }",
     }
 
-    gb = GridOptionsBuilder.from_dataframe(
-        top_streamers[["Name", "Hours Watched", "Highest # of Viewers"]],
-        resizable=True,
-    )
-    gb.configure_pagination(paginationAutoPageSize=True)
-    gb.configure_selection(selection_mode="single")
-    grid_options = gb.build()
-
     cols = st.columns(2)
     with cols[0]:
         st.header(":computer: Top Streamers")
-        AgGrid(
+        paginated_grid(
             top_streamers,
-            gridOptions=grid_options,
-            height=500,
-            width="100%",
-            fit_columns_on_grid_load=True,
+            ["Name", "Hours Watched", "Highest # of Viewers"],
             key="Top streamer chart",
         )
 
@@ -260,6 +285,13 @@ with st.spinner(text="Loading this may take up to 30 seconds..."):
 
 stream_viewers_chart(live_viewers)
 
+with st.spinner(text="Loading this may take up to 30 seconds..."):
+    top_stream_viewers = data.get_top_stream_viewers()
+
+# Sampled every minute between the 15 minute snapshots
+if not top_stream_viewers.empty:
+    stream_viewers_chart(top_stream_viewers, "Top Streams Viewers, Last Hour")
+
 @st.fragment
 def _search_streamer_fragment():
     st.header(":mag: Search for a streamer")
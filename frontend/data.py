@@ -1,13 +1,145 @@
+from contextlib import contextmanager
+import json
 import os
+import queue
+import threading
+import time
+import urllib.request
+from urllib.parse import urlencode
 
+import boto3
 from databricks import sql
+from databricks.sql.exc import OperationalError
 
 import pandas as pd
 import streamlit as st
 
+POOL_SIZE = int(os.getenv("DATABRICKS_POOL_SIZE", 4))
+# If set, tables are read from the live metrics service instead of the warehouse.
+# The service refreshes every few minutes so results are cached for less time.
+LIVE_METRICS_URL = os.getenv("LIVE_METRICS_URL")
+CACHE_TTL_SECONDS = 60 if LIVE_METRICS_URL else 7200
+# If set, the tables of a page view are read from the bundle written by the
+# dashboard_bundle notebook. Either an s3:// path, an http(s) URL, ex: a presigned
+# URL, or a local path.
+DASHBOARD_BUNDLE_URL = os.getenv("DASHBOARD_BUNDLE_URL")
+BUNDLE_VERSION = 1
+BUNDLE_TTL_SECONDS = 300
+# Idle connections older than this are checked before being handed out
+HEALTH_CHECK_INTERVAL_SECONDS = 60
+# A query waiting longer than this for a connection from the pool fails
+ACQUIRE_TIMEOUT_SECONDS = int(os.getenv("DATABRICKS_POOL_TIMEOUT", 30))
 
-@st.cache_resource(ttl=300)
-def get_connection():
+
+class ConnectionPool:
+    def __init__(
+        self,
+        connect,
+        size,
+        health_check_interval=HEALTH_CHECK_INTERVAL_SECONDS,
+        acquire_timeout=ACQUIRE_TIMEOUT_SECONDS,
+    ):
+        self._connect = connect
+        self._size = size
+        self._health_check_interval = health_check_interval
+        self._acquire_timeout = acquire_timeout
+        # LIFO so the most recently used, and most likely still alive, connection is reused
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._open_connections = 0
+
+    @contextmanager
+    def connection(self):
+        connection = self._acquire()
+        broken = False
+        try:
+            yield connection
+        except OperationalError:
+            broken = True
+            raise
+        finally:
+            # Also runs for BaseExceptions, ex: the script run being stopped, so the
+            # connection is never lost to the pool
+            if broken:
+                self._discard(connection)
+            else:
+                self._release(connection)
+
+    def _acquire(self):
+        deadline = time.monotonic() + self._acquire_timeout
+        while True:
+            try:
+                connection, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                if self._reserve():
+                    return self._open()
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        f"No database connection available after {self._acquire_timeout}s"
+                    )
+                try:
+                    connection, last_used = self._idle.get(timeout=min(remaining, 1))
+                except queue.Empty:
+                    continue
+
+            if (
+                time.monotonic() - last_used < self._health_check_interval
+                or self._is_alive(connection)
+            ):
+                return connection
+            self._discard(connection)
+
+    def _release(self, connection):
+        self._idle.put((connection, time.monotonic()))
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+        with self._lock:
+            self._open_connections -= 1
+
+        # Replace the connection in the background so the next query doesn't wait
+        # for a new session to be created
+        threading.Thread(target=self._replenish, daemon=True).start()
+
+    def _replenish(self):
+        if self._reserve():
+            try:
+                self._release(self._open())
+            except Exception:
+                pass
+
+    def _reserve(self):
+        with self._lock:
+            if self._open_connections >= self._size:
+                return False
+            self._open_connections += 1
+            return True
+
+    def _open(self):
+        try:
+            return self._connect()
+        except Exception:
+            with self._lock:
+                self._open_connections -= 1
+            raise
+
+    def _is_alive(self, connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+            return True
+        except Exception:
+            return False
+
+
+def _connect():
     return sql.connect(
         server_hostname=os.getenv("DATABRICKS_SERVER_HOSTNAME"),
         http_path=os.getenv("DATABRICKS_HTTP_PATH"),
@@ -15,17 +147,69 @@ def get_connection():
     )
 
 
+@st.cache_resource
+def get_connection_pool():
+    return ConnectionPool(_connect, POOL_SIZE)
+
+
 def execute_query(table, query):
-    connection = get_connection()
-    with connection.cursor() as cursor:
-        cursor.columns(schema_name="twitch_test", table_name=table)
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        column_names = [desc[0] for desc in cursor.description]
+    # Each query gets its own cursor on a pooled connection. A stale connection is
+    # dropped and the query retried once on another connection.
+    pool = get_connection_pool()
+    for attempt in range(2):
+        try:
+            with pool.connection() as connection, connection.cursor() as cursor:
+                cursor.columns(schema_name="twitch_test", table_name=table)
+                cursor.execute(query)
+                rows = cursor.fetchall()
+                column_names = [desc[0] for desc in cursor.description]
+
+                return pd.DataFrame(rows, columns=column_names)
+        except OperationalError:
+            if attempt:
+                raise
+
 
-        return pd.DataFrame(rows, columns=column_names)
+def fetch_live_metrics(view, **params):
+    query_string = urlencode({key: value for key, value in params.items() if value})
+    with urllib.request.urlopen(
+        f"{LIVE_METRICS_URL}/{view}?{query_string}", timeout=10
+    ) as response:
+        return pd.DataFrame(json.load(response))
 
-@st.cache_data(ttl=7200)
+
+@st.cache_resource(ttl=BUNDLE_TTL_SECONDS)
+def get_dashboard_bundle():
+    if DASHBOARD_BUNDLE_URL.startswith("s3://"):
+        bucket, _, key = DASHBOARD_BUNDLE_URL.removeprefix("s3://").partition("/")
+        response = boto3.client("s3").get_object(Bucket=bucket, Key=key)
+        bundle = json.load(response["Body"])
+    elif DASHBOARD_BUNDLE_URL.startswith(("http://", "https://")):
+        with urllib.request.urlopen(DASHBOARD_BUNDLE_URL, timeout=10) as response:
+            bundle = json.load(response)
+    else:
+        with open(DASHBOARD_BUNDLE_URL) as f:
+            bundle = json.load(f)
+
+    if bundle.get("version") != BUNDLE_VERSION:
+        raise ValueError(f"Unsupported dashboard bundle version {bundle.get('version')}")
+    return bundle
+
+
+def read_bundle_table(table):
+    table = get_dashboard_bundle()["tables"][table]
+    return pd.DataFrame(table["data"], columns=table["columns"])
+
+
+def read_table(table, query):
+    if LIVE_METRICS_URL:
+        return fetch_live_metrics(table)
+    if DASHBOARD_BUNDLE_URL:
+        return read_bundle_table(table)
+    return execute_query(table, query)
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
 def get_top_games(timescale):
     table_name = ""
     if timescale == "Hour":
@@ -36,7 +220,7 @@ def get_top_games(timescale):
         table_name = "top_games_week"
 
     query = f"SELECT * FROM {table_name} ORDER BY hours_watched DESC LIMIT 100"
-    df = execute_query(table_name, query)
+    df = read_table(table_name, query)
 
     df.rename(
         columns={
@@ -50,7 +234,7 @@ def get_top_games(timescale):
     return df
 
 
-@st.cache_data(ttl=7200)
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
 def get_top_streamers(timescale):
     table_name = ""
     if timescale == "Hour":
@@ -61,7 +245,7 @@ def get_top_streamers(timescale):
         table_name = "top_streamers_week"
 
     query = f"SELECT * FROM {table_name} ORDER BY hours_watched DESC LIMIT 1000"
-    df = execute_query(table_name, query)
+    df = read_table(table_name, query)
     df.rename(
         columns={
             "user_name": "Name",
@@ -73,7 +257,7 @@ def get_top_streamers(timescale):
     return df
 
 
-@st.cache_data(ttl=7200)
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
 def get_stream_metrics(timescale):
     table_name = ""
     if timescale == "Hour":
@@ -84,13 +268,19 @@ def get_stream_metrics(timescale):
         table_name = "latest_stream_metrics_week"
 
     query = f"SELECT * FROM {table_name}"
-    df = execute_query(table_name, query)
+    df = read_table(table_name, query)
     return df
 
 
-@st.cache_data(ttl=7200)
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
 def get_viewers(streamer: None):
     print(streamer)
+    if LIVE_METRICS_URL:
+        return fetch_live_metrics("viewers", streamer=streamer)
+    # The bundle only holds the overall series, streamers are still queried
+    if DASHBOARD_BUNDLE_URL and not streamer:
+        return read_bundle_table("viewers")
+
     query = """SELECT
         date_format(timestamp, 'MMM d HH:mm') as timestamp,
         SUM(viewer_count) as total_viewers 
@@ -114,13 +304,34 @@ def get_viewers(streamer: None):
     return df
 
 
-@st.cache_data(ttl=7200)
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
+def get_top_stream_viewers():
+    # Minute level samples of the top streams, the live metrics service already
+    # polls more often than the snapshots so it has no separate view
+    if LIVE_METRICS_URL:
+        return pd.DataFrame()
+    if DASHBOARD_BUNDLE_URL:
+        if "head_sample_viewers_hour" not in get_dashboard_bundle()["tables"]:
+            return pd.DataFrame()
+        return read_bundle_table("head_sample_viewers_hour")
+
+    query = """SELECT
+        date_format(samples.timestamp, 'MMM d HH:mm') as timestamp,
+        samples.total_viewers
+    FROM
+        head_sample_viewers_hour samples
+    ORDER BY
+        samples.timestamp ASC"""
+    return execute_query("head_sample_viewers_hour", query)
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
 def get_latest_stream_metrics():
     query = "SELECT * FROM latest_stream_metrics"
-    df = execute_query("latest_stream_metrics", query)
+    df = read_table("latest_stream_metrics", query)
     return df
 
-@st.cache_data(ttl=7200)
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
 def get_streamer_list(term: None):
     df = get_top_streamers("Week")
     streamer_list = df["Name"].to_list()
@@ -129,3 +340,14 @@ def get_streamer_list(term: None):
         streamer_list = [streamer for streamer in streamer_list if streamer.lower().startswith(term)]
     return streamer_list
 
+
+def sort_and_filter(df, sort_by, ascending=False, name_filter=None):
+    if name_filter:
+        df = df[df["Name"].str.contains(name_filter, case=False, na=False, regex=False)]
+    return df.sort_values(sort_by, ascending=ascending, kind="stable")
+
+
+def get_page(df, page, page_size):
+    # Only the rows of the visible page are sent to the browser
+    start = page * page_size
+    return df.iloc[start : start + page_size]
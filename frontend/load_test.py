@@ -0,0 +1,393 @@
+"""
+Load test for the dashboard. Runs simulated sessions of app.py concurrently with
+streamlit's AppTest against a local stand-in for the live metrics service, and
+reports the render latency of each interaction, the number of backend queries and
+the cache hit ratio of each loader in data.py.
+
+Every session loads the page, switches between the Hour, Day and Week tabs, types a
+streamer name into the searchbox and selects the first suggestion. Sessions share
+the process wide st.cache_data caches the same way sessions of a deployed app do.
+
+    python load_test.py --sessions 50 --concurrency 1 5 10 20 --backend-latency 0.5
+"""
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import random
+import string
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+TIMESCALES = ["Hour", "Day", "Week"]
+# Loaders that issue a single backend query on a cache miss, by the prefix of the
+# views they query
+LOADER_VIEWS = {
+    "get_latest_stream_metrics": "latest_stream_metrics",
+    "get_viewers": "viewers",
+    "get_top_games": "top_games_",
+    "get_stream_metrics": "latest_stream_metrics_",
+    "get_top_streamers": "top_streamers_",
+}
+LOADERS = list(LOADER_VIEWS) + ["get_streamer_list"]
+SEARCH_TERM_LENGTH = 3
+
+
+"""
+A local HTTP server serving synthetic tables in the format of the live metrics
+service. Queries are counted per view and delayed to simulate the warehouse.
+
+Parameters:
+-----------
+latency : float
+    Seconds each query takes.
+
+streamer_count : int, optional
+    Number of streamers in the top streamers tables.
+
+game_count : int, optional
+    Number of games in the top games tables.
+
+seed : int, optional
+    Seed of the generated names.
+"""
+class StandInBackend:
+    def __init__(
+        self,
+        latency: float,
+        streamer_count: int = 1000,
+        game_count: int = 100,
+        seed: int = 0,
+    ):
+        rng = random.Random(seed)
+        self.streamers = [
+            "".join(rng.choices(string.ascii_lowercase, k=10)) for _ in range(streamer_count)
+        ]
+        self._games = [f"Game {i}" for i in range(game_count)]
+        self._latency = latency
+        self._lock = threading.Lock()
+        self.queries = Counter()
+
+        backend = self
+
+        class StandInHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                view = url.path.strip("/")
+                streamer = parse_qs(url.query).get("streamer", [None])[0]
+
+                with backend._lock:
+                    backend.queries[view] += 1
+                time.sleep(backend._latency)
+
+                body = json.dumps(backend._records(view, streamer)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+        self._server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset(self):
+        with self._lock:
+            self.queries.clear()
+
+    def _records(self, view: str, streamer: str) -> list:
+        if view.startswith("top_games_"):
+            return [
+                {
+                    "game_id": str(i),
+                    "game_name": game,
+                    "hours_watched": 100000 - i,
+                    "max_viewer_count": 50000 - i,
+                    "max_streamers_count": 1000 - i,
+                }
+                for i, game in enumerate(self._games)
+            ]
+        if view.startswith("top_streamers_"):
+            return [
+                {
+                    "user_id": str(i),
+                    "user_name": name,
+                    "hours_watched": 10000 - i,
+                    "max_viewers": 5000 - i,
+                }
+                for i, name in enumerate(self.streamers)
+            ]
+        if view == "viewers":
+            # A week of 15 minute snapshots
+            viewers = 1000 if streamer else 2000000
+            return [
+                {"timestamp": f"Slot {i}", "total_viewers": viewers + i}
+                for i in range(7 * 24 * 4)
+            ]
+        return [
+            {
+                "total_viewers": 2000000,
+                "total_streams": 100000,
+                "unique_games": 5000,
+                "hours_watched": 2000000,
+            }
+        ]
+
+
+"""
+Wraps the loaders of the data module to count how often the app calls them.
+Returns the counter of calls per loader.
+"""
+def count_loader_calls(data) -> Counter:
+    calls = Counter()
+    lock = threading.Lock()
+
+    def counted(name, loader):
+        def wrapper(*args, **kwargs):
+            with lock:
+                calls[name] += 1
+            return loader(*args, **kwargs)
+
+        return wrapper
+
+    for name in LOADERS:
+        setattr(data, name, counted(name, getattr(data, name)))
+
+    return calls
+
+
+"""
+AppTest installs a mock runtime for the duration of each run and removes it when
+the run finishes, which breaks the runs of other sessions still in flight. Every
+run is given the same mock runtime instead.
+"""
+def share_runtime():
+    from unittest.mock import MagicMock
+
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import (
+        MemoryCacheStorageManager,
+    )
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: runtime)
+    Runtime.exists = classmethod(lambda cls: True)
+
+
+"""
+Run one session and return the latency in seconds of each interaction, as a list
+of (interaction, seconds) tuples. Interactions whose run raised an exception are
+recorded as errors instead.
+
+Parameters:
+-----------
+streamers : list
+    Streamer names to search for.
+
+timeout : float
+    Seconds a single run may take.
+
+seed : int
+    Seed of the session's choices.
+"""
+def run_session(streamers: list, timeout: float, seed: int) -> list:
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    timings = []
+    app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+
+    def timed_run(interaction):
+        start = time.perf_counter()
+        app.run()
+        elapsed = time.perf_counter() - start
+        timings.append(("error" if app.exception else interaction, elapsed))
+
+    timed_run("page_load")
+
+    for timescale in rng.sample(TIMESCALES[1:], 2) + ["Hour"]:
+        app.session_state["time_filter"] = timescale
+        timed_run("tab_switch")
+
+    # The searchbox is a custom component, so the interactions the browser would
+    # send are written to the state of its react component
+    react_key = app.session_state["streamer_searchbox"]["key_react"]
+    streamer = rng.choice(streamers)
+    for length in range(1, SEARCH_TERM_LENGTH + 1):
+        app.session_state[react_key] = {
+            "interaction": "search",
+            "value": streamer[:length],
+        }
+        timed_run("search")
+
+    app.session_state[react_key] = {"interaction": "submit", "value": 0}
+    timed_run("select_streamer")
+
+    return timings
+
+
+"""
+Run a number of sessions with a given concurrency on cold caches and return the
+report of the round.
+
+Parameters:
+-----------
+backend : StandInBackend
+    The backend the app is pointed at.
+
+calls : Counter
+    The loader call counter returned by count_loader_calls.
+
+sessions : int
+    Number of sessions to run.
+
+concurrency : int
+    Number of sessions running at the same time.
+
+timeout : float
+    Seconds a single run may take.
+"""
+def run_round(
+    backend: StandInBackend,
+    calls: Counter,
+    sessions: int,
+    concurrency: int,
+    timeout: float,
+) -> dict:
+    import streamlit as st
+
+    st.cache_data.clear()
+    backend.reset()
+    calls.clear()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(
+            executor.map(
+                lambda seed: run_session(backend.streamers, timeout, seed), range(sessions)
+            )
+        )
+    duration = time.perf_counter() - start
+
+    latencies = defaultdict(list)
+    for timings in results:
+        for interaction, seconds in timings:
+            latencies[interaction].append(seconds)
+
+    hit_ratios = {}
+    for loader, view in LOADER_VIEWS.items():
+        if not calls[loader]:
+            continue
+        misses = sum(
+            count
+            for queried_view, count in backend.queries.items()
+            if queried_view == view or (view.endswith("_") and queried_view.startswith(view))
+        )
+        hit_ratios[loader] = max(0, calls[loader] - misses) / calls[loader]
+
+    return {
+        "concurrency": concurrency,
+        "sessions": sessions,
+        "duration": duration,
+        "latencies": {
+            interaction: np.percentile(values, [50, 95, 99])
+            for interaction, values in latencies.items()
+        },
+        "queries": sum(backend.queries.values()),
+        "loader_calls": dict(calls),
+        "hit_ratios": hit_ratios,
+    }
+
+
+def print_report(report: dict):
+    print(
+        f"\nConcurrency {report['concurrency']}: {report['sessions']} sessions in "
+        f"{report['duration']:.1f}s, {report['queries']} backend queries"
+    )
+    print(f"  {'interaction':<16} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for interaction, (p50, p95, p99) in sorted(report["latencies"].items()):
+        print(f"  {interaction:<16} {p50:>7.3f}s {p95:>7.3f}s {p99:>7.3f}s")
+    print(f"  {'loader':<28} {'calls':>8} {'hit ratio':>10}")
+    for loader in LOADERS:
+        hit_ratio = report["hit_ratios"].get(loader)
+        hit_ratio = f"{hit_ratio:>10.1%}" if hit_ratio is not None else f"{'-':>10}"
+        print(f"  {loader:<28} {report['loader_calls'].get(loader, 0):>8} {hit_ratio}")
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Load test the dashboard")
+    parser.add_argument("--sessions", type=int, default=20, help="Sessions per round")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        nargs="+",
+        default=[1, 5, 10],
+        help="Concurrent sessions, one round is run per value",
+    )
+    parser.add_argument(
+        "--backend-latency", type=float, default=0.5, help="Seconds per backend query"
+    )
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds per run")
+    parser.add_argument(
+        "--max-p95",
+        type=float,
+        help="Exit with an error if the p95 latency of an interaction exceeds this",
+    )
+    args = parser.parse_args()
+
+    backend = StandInBackend(args.backend_latency)
+    backend.start()
+    # data reads the backend url when it is first imported
+    os.environ["LIVE_METRICS_URL"] = backend.url
+    os.environ.pop("DASHBOARD_BUNDLE_URL", None)
+    import data
+    import streamlit_searchbox
+
+    # AppTest always runs the whole script, so the fragment scoped rerun the
+    # searchbox requests after a search is left to the next interaction
+    streamlit_searchbox.rerun = lambda *args, **kwargs: None
+
+    share_runtime()
+    calls = count_loader_calls(data)
+    reports = [
+        run_round(backend, calls, args.sessions, concurrency, args.timeout)
+        for concurrency in args.concurrency
+    ]
+    backend.stop()
+
+    failed = False
+    for report in reports:
+        print_report(report)
+        if "error" in report["latencies"]:
+            failed = True
+        if args.max_p95 is not None and any(
+            p95 > args.max_p95 for _, p95, _ in report["latencies"].values()
+        ):
+            failed = True
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,88 @@
+import threading
+
+from databricks.sql.exc import OperationalError
+import pytest
+
+from data import ConnectionPool
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestConnectionPool:
+    @pytest.fixture(autouse=True)
+    def setup_method(self):
+        self.connections = []
+
+    def connect(self):
+        connection = FakeConnection()
+        self.connections.append(connection)
+        return connection
+
+    def test___released_connection___connection___reuses_connection(self):
+        pool = ConnectionPool(self.connect, size=2)
+
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+
+        assert first is second
+        assert len(self.connections) == 1
+
+    def test___pool_exhausted___connection___raises_after_timeout(self):
+        pool = ConnectionPool(self.connect, size=1, acquire_timeout=0.1)
+
+        with pool.connection():
+            with pytest.raises(TimeoutError):
+                with pool.connection():
+                    pass
+
+    def test___connection_released_while_waiting___connection___returns_connection(self):
+        pool = ConnectionPool(self.connect, size=1, acquire_timeout=5)
+        acquired = threading.Event()
+        release = threading.Event()
+
+        def hold_connection():
+            with pool.connection():
+                acquired.set()
+                release.wait()
+
+        holder = threading.Thread(target=hold_connection)
+        holder.start()
+        acquired.wait()
+        threading.Timer(0.1, release.set).start()
+
+        with pool.connection() as connection:
+            pass
+        holder.join()
+
+        assert connection is self.connections[0]
+
+    def test___base_exception___connection___releases_connection(self):
+        pool = ConnectionPool(self.connect, size=1, acquire_timeout=0.1)
+
+        with pytest.raises(KeyboardInterrupt):
+            with pool.connection():
+                raise KeyboardInterrupt()
+
+        with pool.connection() as connection:
+            pass
+        assert connection is self.connections[0]
+
+    def test___operational_error___connection___discards_connection(self):
+        pool = ConnectionPool(self.connect, size=1, acquire_timeout=1)
+
+        with pytest.raises(OperationalError):
+            with pool.connection():
+                raise OperationalError("session expired")
+
+        with pool.connection() as connection:
+            pass
+        assert self.connections[0].closed
+        assert connection is not self.connections[0]
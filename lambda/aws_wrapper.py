@@ -1,9 +1,16 @@
+import io
 import logging
 import json
+import threading
+
+from concurrent.futures import Future
 
 import boto3
-from pandas import DataFrame
-import awswrangler as wr
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from pandas import DataFrame, read_parquet
+
+from s3_uploader import S3Uploader, split_s3_path
 
 """
 A wrapper class for interacting with AWS
@@ -48,6 +55,9 @@ class AwsWrapper:
         else:
             self._session = boto3.Session(region_name=region_name)
         self._logging = logger
+        self._uploader = None
+        self._lambda_clients = {}
+        self._lambda_clients_lock = threading.Lock()
 
     """
     Get a secret from AWS Secret Manager
@@ -74,7 +84,7 @@ class AwsWrapper:
             raise e
 
     """
-    Write a dataframe to a parquet file in S3
+    Write a dataframe to a parquet file in S3 and wait for the upload to finish.
 
     Parameters:
     -----------
@@ -89,6 +99,145 @@ class AwsWrapper:
     """
     def write_parquet_to_s3(self, df: DataFrame, s3_path: str, logger: logging.Logger):
         logger.debug("Writing parquet to S3")
-        wr.s3.to_parquet(
-            df=df, path=s3_path, compression="gzip", boto3_session=self._session
+        self.upload_parquet(df, s3_path).result()
+
+    """
+    Write a dataframe to a parquet file in S3 in the background. The upload is
+    retried and checksummed, see S3Uploader. Returns a future that resolves once
+    the object is written, or use wait_for_uploads to wait for every upload.
+
+    Parameters:
+    -----------
+    df : Dataframe
+        Dataframe to export.
+
+    s3_path : str
+        S3 path to export to.
+    """
+    def upload_parquet(self, df: DataFrame, s3_path: str) -> Future:
+        if not self._uploader:
+            self._uploader = S3Uploader(self._session.client("s3"), self._logging)
+
+        return self._uploader.submit_parquet(df, s3_path)
+
+    """
+    Block until every upload started with upload_parquet has finished. Raises the
+    first upload error.
+    """
+    def wait_for_uploads(self):
+        if self._uploader:
+            self._uploader.wait()
+
+    """
+    Read a JSON object from S3. Returns None if the object does not exist.
+
+    Parameters:
+    -----------
+    s3_path : str
+        S3 path of the object, ex: s3://bucket/key.json
+    """
+    def read_json_from_s3(self, s3_path: str) -> dict:
+        bucket, key = split_s3_path(s3_path)
+        self._logging.debug("Reading %s from S3", s3_path)
+
+        try:
+            response = self._session.client("s3").get_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None
+            raise
+
+        return json.loads(response["Body"].read())
+
+    """
+    Write a dictionary to S3 as a JSON object.
+
+    Parameters:
+    -----------
+    data : dict
+        Dictionary to export.
+
+    s3_path : str
+        S3 path to export to, ex: s3://bucket/key.json
+    """
+    def write_json_to_s3(self, data: dict, s3_path: str):
+        bucket, key = split_s3_path(s3_path)
+        self._logging.debug("Writing %s to S3", s3_path)
+        self._session.client("s3").put_object(
+            Bucket=bucket,
+            Key=key,
+            Body=json.dumps(data).encode("utf-8"),
+            ContentType="application/json",
+        )
+
+    """
+    Delete an object from S3. Deleting an object that does not exist is not an error.
+
+    Parameters:
+    -----------
+    s3_path : str
+        S3 path of the object to delete.
+    """
+    def delete_from_s3(self, s3_path: str):
+        bucket, key = split_s3_path(s3_path)
+        self._logging.debug("Deleting %s from S3", s3_path)
+        self._session.client("s3").delete_object(Bucket=bucket, Key=key)
+
+    """
+    Read a parquet object from S3 into a dataframe.
+
+    Parameters:
+    -----------
+    s3_path : str
+        S3 path of the object, ex: s3://bucket/key.parquet
+    """
+    def read_parquet_from_s3(self, s3_path: str) -> DataFrame:
+        bucket, key = split_s3_path(s3_path)
+        self._logging.debug("Reading %s from S3", s3_path)
+        response = self._session.client("s3").get_object(Bucket=bucket, Key=key)
+
+        return read_parquet(io.BytesIO(response["Body"].read()))
+
+    """
+    Synchronously invoke a lambda function and return its decoded JSON response.
+    The invocation is not retried, a retry would run the function a second time.
+
+    Parameters:
+    -----------
+    function_name : str
+        Name or ARN of the lambda function.
+
+    payload : dict
+        Event passed to the function.
+
+    read_timeout : int, optional
+        Seconds to wait for the response. Must be longer than the timeout of the
+        function, the botocore default of 60 seconds is used if unspecified.
+    """
+    def invoke_lambda(self, function_name: str, payload: dict, read_timeout: int = None) -> dict:
+        self._logging.debug("Invoking %s", function_name)
+        response = self._get_lambda_client(read_timeout).invoke(
+            FunctionName=function_name,
+            InvocationType="RequestResponse",
+            Payload=json.dumps(payload).encode("utf-8"),
         )
+        result = json.loads(response["Payload"].read())
+
+        if "FunctionError" in response:
+            raise RuntimeError(f"{function_name} failed: {result}")
+
+        return result
+
+    def _get_lambda_client(self, read_timeout: int = None):
+        # Creating clients from a session is not thread safe and the dispatcher
+        # invokes the workers from a thread pool
+        with self._lambda_clients_lock:
+            if read_timeout not in self._lambda_clients:
+                config = Config(retries={"max_attempts": 0})
+                if read_timeout:
+                    config = config.merge(Config(read_timeout=read_timeout))
+                self._lambda_clients[read_timeout] = self._session.client(
+                    "lambda", config=config
+                )
+
+            return self._lambda_clients[read_timeout]
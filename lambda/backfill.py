@@ -0,0 +1,328 @@
+"""
+Rebuilds the game, streamer and global metric tables of the DLT pipeline from the
+snapshot parquet files written by the lambda, without rerunning the pipeline.
+
+Each day of snapshots is a partition processed by its own worker process. A worker
+cleans the day the same way as silver_twitch_streams and writes partial aggregates
+to the output directory along with a success marker, so a backfill that is
+interrupted only processes the missing days. Partial aggregates are kept under a
+version hashed from the cleaning and aggregation code, so a rerun after either
+changes reprocesses every day instead of reusing partials built the old way. The
+partial aggregates are then merged into the final tables.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from functools import cache
+import glob
+import hashlib
+import inspect
+import logging
+import os
+
+import pandas as pd
+
+# Snapshots are taken every 15 minutes so each row is a quarter hour of watch time
+HOURS_PER_SNAPSHOT = 0.25
+PARTIALS_FOLDER = "_partials"
+SUCCESS_MARKER = "_SUCCESS"
+
+"""
+Read every snapshot written on a day. The source is either a local directory or
+an S3 prefix in the layout written by the lambda, ex: s3://bucket/stream_updates/
+
+Parameters:
+-----------
+source : str
+    Local directory or S3 prefix containing the snapshots.
+
+day : date
+    The day to read.
+"""
+def read_snapshots(source: str, day: date) -> pd.DataFrame:
+    path = f"{source.rstrip('/')}/{day.year}/{day.month}/{day.day}/"
+
+    if source.startswith("s3://"):
+        import awswrangler as wr
+
+        if not wr.s3.list_objects(path, suffix=".parquet"):
+            return pd.DataFrame()
+        return wr.s3.read_parquet(path, path_suffix=".parquet")
+
+    files = sorted(glob.glob(os.path.join(path, "*.parquet")))
+    if not files:
+        return pd.DataFrame()
+    return pd.concat([pd.read_parquet(file) for file in files], ignore_index=True)
+
+
+"""
+Drop the rows that silver_twitch_streams drops: missing timestamps, missing user ids
+and start times that can't be parsed.
+"""
+def clean_snapshots(snapshots: pd.DataFrame) -> pd.DataFrame:
+    if snapshots.empty:
+        return snapshots
+
+    snapshots = snapshots.assign(
+        started_at=pd.to_datetime(snapshots["started_at"], errors="coerce", utc=True)
+    )
+    valid = (
+        snapshots["timestamp"].notna()
+        & snapshots["user_id"].notna()
+        & snapshots["started_at"].notna()
+    )
+
+    return snapshots[valid]
+
+
+"""
+Aggregate one day of cleaned snapshots into partial results that can be merged
+across days. Returns a dictionary of table name to dataframe.
+"""
+def aggregate_partition(streams: pd.DataFrame) -> dict:
+    if streams.empty:
+        return {
+            "game_metrics": pd.DataFrame(
+                columns=["timestamp", "game_id", "game_name", "total_streamers", "total_viewer_count"]
+            ),
+            "streamers": pd.DataFrame(
+                columns=["user_id", "user_name", "viewer_count_sum", "max_viewers"]
+            ),
+            "stream_metrics": pd.DataFrame(
+                columns=["timestamp", "total_viewers", "total_streams", "unique_games"]
+            ),
+        }
+
+    game_metrics = (
+        streams.groupby(["timestamp", "game_id", "game_name"], dropna=False)
+        .agg(
+            total_streamers=("user_id", "count"),
+            total_viewer_count=("viewer_count", "sum"),
+        )
+        .reset_index()
+    )
+    streamers = (
+        streams.groupby(["user_id", "user_name"], dropna=False)
+        .agg(
+            viewer_count_sum=("viewer_count", "sum"),
+            max_viewers=("viewer_count", "max"),
+        )
+        .reset_index()
+    )
+    stream_metrics = (
+        streams.groupby("timestamp")
+        .agg(
+            total_viewers=("viewer_count", "sum"),
+            total_streams=("stream_id", "count"),
+            unique_games=("game_id", "nunique"),
+        )
+        .reset_index()
+    )
+
+    return {
+        "game_metrics": game_metrics,
+        "streamers": streamers,
+        "stream_metrics": stream_metrics,
+    }
+
+
+"""
+Process a single day and write its partial results. Runs in a worker process.
+
+Parameters:
+-----------
+source : str
+    Local directory or S3 prefix containing the snapshots.
+
+day : date
+    The day to process.
+
+output : str
+    Directory to write the partial results to.
+
+Returns the number of rows kept after cleaning.
+"""
+def process_partition(source: str, day: date, output: str) -> int:
+    partition_dir = _partition_dir(output, day)
+    os.makedirs(partition_dir, exist_ok=True)
+
+    streams = clean_snapshots(read_snapshots(source, day))
+    for table, df in aggregate_partition(streams).items():
+        df.to_parquet(os.path.join(partition_dir, f"{table}.parquet"), index=False)
+
+    # Written last so a partition is only skipped on resume if every table was written
+    open(os.path.join(partition_dir, SUCCESS_MARKER), "w").close()
+
+    return len(streams)
+
+
+"""
+Merge the partial results of every day into the final tables.
+
+Parameters:
+-----------
+output : str
+    Directory containing the partial results.
+
+days : list
+    The days to merge.
+
+Returns a dictionary of table name to dataframe.
+"""
+def merge_partitions(output: str, days: list) -> dict:
+    partials = {"game_metrics": [], "streamers": [], "stream_metrics": []}
+    for day in days:
+        for table in partials:
+            partials[table].append(
+                pd.read_parquet(os.path.join(_partition_dir(output, day), f"{table}.parquet"))
+            )
+
+    game_metrics = _concat_partials(partials["game_metrics"])
+    streamers = _concat_partials(partials["streamers"])
+    stream_metrics = _concat_partials(partials["stream_metrics"])
+
+    top_games = (
+        game_metrics.groupby(["game_id", "game_name"], dropna=False)
+        .agg(
+            hours_watched=("total_viewer_count", "sum"),
+            max_viewer_count=("total_viewer_count", "max"),
+            max_streamers_count=("total_streamers", "max"),
+        )
+        .reset_index()
+    )
+    top_games["hours_watched"] = (top_games["hours_watched"] * HOURS_PER_SNAPSHOT).round()
+    top_games["rank_by_hours_watched"] = _dense_rank(top_games["hours_watched"])
+    top_games["rank_by_max_viewer"] = _dense_rank(top_games["max_viewer_count"])
+
+    top_streamers = (
+        streamers.groupby(["user_id", "user_name"], dropna=False)
+        .agg(
+            max_viewers=("max_viewers", "max"),
+            hours_watched=("viewer_count_sum", "sum"),
+        )
+        .reset_index()
+    )
+    top_streamers["hours_watched"] = (
+        top_streamers["hours_watched"] * HOURS_PER_SNAPSHOT
+    ).round()
+    top_streamers["rank_by_hours_watched"] = _dense_rank(top_streamers["hours_watched"])
+    top_streamers["rank_by_max_viewers"] = _dense_rank(top_streamers["max_viewers"])
+
+    return {
+        "gold_game_metrics": game_metrics.sort_values("timestamp", ignore_index=True),
+        "top_games": top_games.sort_values("rank_by_hours_watched", ignore_index=True),
+        "top_streamers": top_streamers.sort_values("rank_by_hours_watched", ignore_index=True),
+        "stream_metrics": stream_metrics.sort_values("timestamp", ignore_index=True),
+    }
+
+
+"""
+Rebuild the tables for a range of days and write them to the output directory.
+
+Parameters:
+-----------
+logger : logging.Logger
+    A logger instance.
+
+source : str
+    Local directory or S3 prefix containing the snapshots.
+
+output : str
+    Directory to write the tables and partial results to.
+
+start : date
+    First day to process.
+
+end : date
+    Last day to process, inclusive.
+
+workers : int, optional
+    Number of worker processes. Defaults to the number of CPUs.
+
+force : bool, optional
+    Reprocess days that already have partial results.
+
+Returns a dictionary of table name to dataframe.
+"""
+def backfill(
+    logger: logging.Logger,
+    source: str,
+    output: str,
+    start: date,
+    end: date,
+    workers: int = None,
+    force: bool = False,
+) -> dict:
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    pending = [
+        day
+        for day in days
+        if force or not os.path.exists(os.path.join(_partition_dir(output, day), SUCCESS_MARKER))
+    ]
+    logger.info(
+        "Backfilling %s days, %s already processed", len(days), len(days) - len(pending)
+    )
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            day: executor.submit(process_partition, source, day, output) for day in pending
+        }
+        for day, future in futures.items():
+            logger.info("Processed %s, %s rows", day, future.result())
+
+    tables = merge_partitions(output, days)
+    for table, df in tables.items():
+        df.to_parquet(os.path.join(output, f"{table}.parquet"), index=False)
+
+    return tables
+
+
+def _partition_dir(output: str, day: date) -> str:
+    return os.path.join(output, PARTIALS_FOLDER, _logic_version(), day.isoformat())
+
+
+@cache
+def _logic_version() -> str:
+    # Partials only depend on how a day is cleaned and aggregated
+    source = "".join(
+        inspect.getsource(function) for function in (clean_snapshots, aggregate_partition)
+    )
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()[:12]
+
+
+def _concat_partials(partials: list) -> pd.DataFrame:
+    # Days without snapshots have untyped empty partials which would turn the
+    # merged columns into objects
+    return pd.concat([df for df in partials if not df.empty] or partials, ignore_index=True)
+
+
+def _dense_rank(values: pd.Series) -> pd.Series:
+    return values.rank(method="dense", ascending=False).astype(int)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from twitch_metrics_updater import setup_logging
+
+    parser = argparse.ArgumentParser(
+        description="Rebuild the metric tables from historical snapshots"
+    )
+    parser.add_argument("source", help="Local directory or S3 prefix of the snapshots")
+    parser.add_argument("output", help="Directory to write the tables to")
+    parser.add_argument("--start", type=date.fromisoformat, required=True)
+    parser.add_argument("--end", type=date.fromisoformat, required=True)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--force", action="store_true", help="Reprocess days that were already processed"
+    )
+    args = parser.parse_args()
+
+    backfill(
+        setup_logging(),
+        args.source,
+        args.output,
+        args.start,
+        args.end,
+        args.workers,
+        args.force,
+    )
@@ -0,0 +1,185 @@
+"""
+De-duplicates the pages of a crawl of the streams endpoint as they arrive.
+
+The endpoint pages through streams ordered by viewers and a full crawl takes
+minutes, so streams move between pages while it runs. A stream moving from a page
+already read to a later one is returned twice, and the stream it displaces across
+the page boundary is never returned. Duplicates are dropped against the set of
+stream ids already seen, and the pages where they showed up mark where streams were
+likely skipped so those ranges can be fetched again at the end of the crawl. A
+stream moving up to a page already read is skipped too, and pushes the stream it
+overtakes back across the page boundary where it is returned twice, so both moves
+show up as duplicates. Boundaries with the most duplicates are fetched first.
+"""
+import base64
+from collections import Counter
+import logging
+import zlib
+
+import numpy as np
+import pandas as pd
+
+
+"""
+Parameters:
+-----------
+seen_stream_ids : str or list, optional
+    Stream ids already crawled, ex: from the checkpoint of a resumed crawl. Either
+    encoded by seen_stream_ids or a list of ids.
+"""
+class StreamDeduplicator:
+    def __init__(self, seen_stream_ids=None):
+        # Stream ids are numeric so they are kept as a sorted array of ints, a
+        # fraction of the size of the strings returned by the api
+        if isinstance(seen_stream_ids, str):
+            self._seen = _decode_stream_ids(seen_stream_ids)
+        else:
+            self._seen = np.unique(np.asarray(seen_stream_ids or [], dtype=np.int64))
+        self._cursors = []
+        # Page index to the number of duplicates found around it
+        self._drifted = Counter()
+        self.pages = 0
+        self.rows = 0
+        self.duplicates = 0
+        self.refetched_pages = 0
+        self.recovered = 0
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    """
+    Drop the streams of a page that were already crawled.
+
+    Parameters:
+    -----------
+    page : pd.DataFrame
+        A page of streams as returned by TwitchWrapper.get_stream_pages.
+
+    after : str, optional
+        The cursor the page was requested with, None for the first page.
+
+    Returns the page without the duplicated streams.
+    """
+    def add_page(self, page: pd.DataFrame, after: str = None) -> pd.DataFrame:
+        index = len(self._cursors)
+        self._cursors.append(after)
+        self.pages += 1
+        self.rows += len(page)
+
+        new_streams = self._drop_seen(page)
+        duplicates = len(page) - len(new_streams)
+        if duplicates:
+            self.duplicates += duplicates
+            # The skipped streams were displaced across the boundary with the
+            # previous page
+            self._drifted.update({max(index - 1, 0): duplicates, index: duplicates})
+
+        return new_streams
+
+    """
+    Fetch the pages around the boundaries where duplicates were found again and
+    return the streams they contain that were not crawled yet. Pages with the most
+    duplicates around them are fetched first.
+
+    Parameters:
+    -----------
+    twitch_wrapper : TwitchWrapper
+        An instance of TwitchWrapper.
+
+    max_pages : int
+        Maximum number of pages to fetch.
+
+    languages : list, optional
+        The languages the crawl was filtered to.
+
+    Returns a list of pages.
+    """
+    def refetch_drifted(self, twitch_wrapper, max_pages: int, languages: list = None) -> list:
+        recovered = []
+        ranked = sorted(self._drifted, key=lambda index: (-self._drifted[index], index))
+        for index in ranked[:max_pages]:
+            pages = twitch_wrapper.get_stream_pages(
+                after=self._cursors[index], languages=languages
+            )
+            page, _ = next(pages, (None, None))
+            if page is None:
+                continue
+
+            self.refetched_pages += 1
+            new_streams = self._drop_seen(page)
+            if not new_streams.empty:
+                self.recovered += len(new_streams)
+                recovered.append(new_streams)
+
+        return recovered
+
+    """
+    Returns the stream ids seen so far encoded as a compact string, to be saved with
+    a checkpoint and passed back to the constructor.
+    """
+    def seen_stream_ids(self) -> str:
+        return _encode_stream_ids(self._seen)
+
+    """
+    Returns the drift statistics of the crawl so far.
+    """
+    def stats(self) -> dict:
+        return {
+            "pages": self.pages,
+            "rows": self.rows,
+            "duplicates": self.duplicates,
+            "duplicate_rate": self.duplicates / self.rows if self.rows else 0.0,
+            "drifted_pages": len(self._drifted),
+            "refetched_pages": self.refetched_pages,
+            "recovered": self.recovered,
+        }
+
+    def log_stats(self, logger: logging.Logger):
+        stats = self.stats()
+        logger.info(
+            "Crawl drift: %s duplicates in %s rows (%.2f%%) around %s pages, "
+            "%s pages refetched recovering %s streams",
+            stats["duplicates"],
+            stats["rows"],
+            stats["duplicate_rate"] * 100,
+            stats["drifted_pages"],
+            stats["refetched_pages"],
+            stats["recovered"],
+        )
+
+    def _drop_seen(self, page: pd.DataFrame) -> pd.DataFrame:
+        if page.empty or "id" not in page.columns:
+            return page
+
+        # Invalid ids are left for validate_snapshot to quarantine
+        stream_ids = pd.to_numeric(page["id"], errors="coerce")
+        valid = stream_ids.notna().to_numpy()
+        valid_ids = stream_ids[valid].to_numpy(dtype=np.int64)
+
+        positions = np.searchsorted(self._seen, valid_ids)
+        seen = np.zeros(len(valid_ids), dtype=bool)
+        if len(self._seen):
+            seen = self._seen[positions.clip(max=len(self._seen) - 1)] == valid_ids
+        # A stream repeated within the page is only kept once too
+        seen |= pd.Series(valid_ids).duplicated().to_numpy()
+
+        # Inserting the new ids at their sorted positions keeps the array sorted
+        # without sorting every id seen again
+        new_ids = valid_ids[~seen]
+        order = np.argsort(new_ids)
+        self._seen = np.insert(self._seen, positions[~seen][order], new_ids[order])
+
+        keep = np.ones(len(page), dtype=bool)
+        keep[valid] = ~seen
+        return page[keep]
+
+
+def _encode_stream_ids(stream_ids: np.ndarray) -> str:
+    # Sorted ids are stored as the differences between them, which compress well
+    deltas = np.diff(stream_ids, prepend=0).astype("<i8")
+    return base64.b64encode(zlib.compress(deltas.tobytes())).decode()
+
+
+def _decode_stream_ids(encoded: str) -> np.ndarray:
+    deltas = np.frombuffer(zlib.decompress(base64.b64decode(encoded)), dtype="<i8")
+    return np.cumsum(deltas).astype(np.int64)
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+QUARANTINE_REASON_COLUMN = "quarantine_reason"
+
+
+"""
+Validate a snapshot before it is uploaded. Applies the same checks as the
+silver_twitch_streams constraints, but over the whole snapshot at once so invalid
+rows never reach the bronze table.
+
+Rows missing a stream id, user id or timestamp, or with a started_at or viewer_count
+that can't be parsed are split out with the first failing check recorded in the
+quarantine_reason column. The valid rows are returned with typed id and viewer_count
+columns. started_at stays a string to match the bronze table schema.
+
+Parameters:
+-----------
+snapshot : pd.DataFrame
+    A snapshot of live streams.
+
+Returns a tuple of the valid rows, the quarantined rows and a dictionary of the
+number of rows failing each check.
+"""
+def validate_snapshot(snapshot: pd.DataFrame) -> tuple:
+    if snapshot.empty:
+        return snapshot, snapshot.iloc[0:0], {}
+
+    viewer_count = pd.to_numeric(_column(snapshot, "viewer_count"), errors="coerce")
+    started_at = pd.to_datetime(
+        _column(snapshot, "started_at"), errors="coerce", utc=True, format="ISO8601"
+    )
+    checks = {
+        "missing_stream_id": _is_blank(_column(snapshot, "stream_id")),
+        "missing_user_id": _is_blank(_column(snapshot, "user_id")),
+        "missing_timestamp": _column(snapshot, "timestamp").isna(),
+        "invalid_started_at": started_at.isna(),
+        "invalid_viewer_count": viewer_count.isna(),
+    }
+
+    reasons = pd.Series(
+        np.select(list(checks.values()), list(checks.keys()), default=""),
+        index=snapshot.index,
+    )
+    invalid = reasons != ""
+    counts = {check: int(failed.sum()) for check, failed in checks.items() if failed.any()}
+
+    quarantined = snapshot[invalid].assign(**{QUARANTINE_REASON_COLUMN: reasons[invalid]})
+    # Invalid rows can hold mixed types that parquet can't store in one column
+    quarantined = quarantined.astype(
+        {column: "string" for column in quarantined.select_dtypes("object").columns}
+    )
+    valid = snapshot[~invalid].assign(viewer_count=viewer_count[~invalid].astype("int64"))
+    for id_column in ["stream_id", "user_id", "game_id"]:
+        if id_column in valid.columns:
+            valid[id_column] = valid[id_column].astype("string")
+
+    return valid, quarantined, counts
+
+
+def _column(snapshot: pd.DataFrame, column: str) -> pd.Series:
+    # A missing column fails its check for every row
+    if column in snapshot.columns:
+        return snapshot[column]
+    return pd.Series(None, index=snapshot.index, dtype="object")
+
+
+def _is_blank(values: pd.Series) -> pd.Series:
+    return values.isna() | (values.astype("string").str.strip() == "")
@@ -0,0 +1,138 @@
+from collections import OrderedDict
+import time
+
+DEFAULT_MAX_SIZE = 50000
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+# Game ids the games endpoint did not return are retried after this long
+DEFAULT_MISSING_TTL_SECONDS = 60 * 60
+
+
+"""
+A game dimension cache keyed by game_id with a least recently used eviction policy
+and a time to live per entry. Game ids the games endpoint does not return are
+cached as missing with a shorter time to live so they are not requested on every
+run. The cache is persisted between runs as a dictionary, see to_dict and
+from_dict, and is only marked as modified when games are added or evicted so a run
+without new games does not rewrite it. Reads reorder the games in memory, and the
+order is saved with the next change.
+
+Parameters:
+-----------
+max_size : int, optional
+    Maximum number of games to keep. The least recently used games are evicted first.
+
+ttl_seconds : int, optional
+    Games fetched longer ago than this are treated as missing so they are refreshed.
+
+missing_ttl_seconds : int, optional
+    Time to live of the game ids cached as missing.
+"""
+class GameCache:
+    def __init__(
+        self,
+        max_size: int = DEFAULT_MAX_SIZE,
+        ttl_seconds: int = DEFAULT_TTL_SECONDS,
+        missing_ttl_seconds: int = DEFAULT_MISSING_TTL_SECONDS,
+    ):
+        self._max_size = max_size
+        self._ttl_seconds = ttl_seconds
+        self._missing_ttl_seconds = missing_ttl_seconds
+        self._games = OrderedDict()
+        self.modified = False
+
+    def __len__(self) -> int:
+        return len(self._games)
+
+    def __contains__(self, game_id: str) -> bool:
+        return game_id in self._games
+
+    """
+    Get a cached game, marking it as recently used. Returns None if the game is
+    missing or expired.
+    """
+    def get(self, game_id: str, now: float = None) -> dict:
+        game = self._lookup(game_id, now)
+        if game is None or game.get("missing"):
+            return None
+
+        return game
+
+    """
+    Returns the game ids that are not cached or have expired. Game ids cached as
+    missing are only returned once they expire. Cached games in game_ids are marked
+    as recently used.
+    """
+    def get_missing(self, game_ids, now: float = None) -> list:
+        return [game_id for game_id in game_ids if self._lookup(game_id, now) is None]
+
+    """
+    Add or refresh games, evicting the least recently used games if the cache is full.
+
+    Parameters:
+    -----------
+    games : list
+        Games as returned by the Twitch games endpoint. Each must contain an id.
+    """
+    def update(self, games: list, now: float = None):
+        fetched_at = now if now is not None else time.time()
+        for game in games:
+            self._games[game["id"]] = {**game, "fetched_at": fetched_at}
+            self._games.move_to_end(game["id"])
+
+        if games:
+            self.modified = True
+        self._evict()
+
+    """
+    Cache game ids the games endpoint did not return, so they are not requested
+    again until the missing time to live expires.
+    """
+    def update_missing(self, game_ids: list, now: float = None):
+        fetched_at = now if now is not None else time.time()
+        for game_id in game_ids:
+            self._games[game_id] = {"id": game_id, "missing": True, "fetched_at": fetched_at}
+            self._games.move_to_end(game_id)
+
+        if game_ids:
+            self.modified = True
+        self._evict()
+
+    def to_dict(self) -> dict:
+        return {"games": list(self._games.values())}
+
+    """
+    Create a cache from a dictionary created by to_dict. The games keep their order
+    so the least recently used games are still evicted first.
+    """
+    @classmethod
+    def from_dict(
+        cls,
+        data: dict,
+        max_size: int = DEFAULT_MAX_SIZE,
+        ttl_seconds: int = DEFAULT_TTL_SECONDS,
+        missing_ttl_seconds: int = DEFAULT_MISSING_TTL_SECONDS,
+    ) -> "GameCache":
+        cache = cls(max_size, ttl_seconds, missing_ttl_seconds)
+        for game in (data or {}).get("games", []):
+            cache._games[game["id"]] = game
+        cache._evict()
+
+        return cache
+
+    def _lookup(self, game_id: str, now: float = None) -> dict:
+        game = self._games.get(game_id)
+        if game is None or self._is_expired(game, now):
+            return None
+
+        self._games.move_to_end(game_id)
+        return game
+
+    def _evict(self):
+        while len(self._games) > self._max_size:
+            self._games.popitem(last=False)
+            self.modified = True
+
+    def _is_expired(self, game: dict, now: float = None) -> bool:
+        now = now if now is not None else time.time()
+        ttl_seconds = self._missing_ttl_seconds if game.get("missing") else self._ttl_seconds
+        return now - game["fetched_at"] > ttl_seconds
@@ -0,0 +1,426 @@
+"""
+A local stand-in for the parts of the Twitch API used by TwitchWrapper, to measure
+a full crawl offline. Serves /oauth2/token, /helix/streams and /helix/games over
+HTTP with a configurable number of live streams, per request latency, a rate limit
+bucket sending the Ratelimit-* headers and 429 responses the Helix api does, and
+churn of the stream list while it is being paged through.
+
+Streams are ordered by viewers like the real endpoint and cursors are offsets into
+that order, so streams ending or changing viewers mid-crawl shift later pages the
+same way they do on Twitch, duplicating some streams and skipping others.
+
+Point TwitchWrapper at it with the api_url and auth_url arguments, or by setting
+TWITCH_API_URL=http://127.0.0.1:8081/helix and
+TWITCH_AUTH_URL=http://127.0.0.1:8081/oauth2/token
+"""
+import base64
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import math
+import secrets
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+MAX_PAGE_SIZE = 100
+# Helix allows 800 points per minute for an app access token
+DEFAULT_RATE_LIMIT = 800
+DEFAULT_REFILL_SECONDS = 60
+LANGUAGES = ["en", "es", "ja", "pt", "de", "ko", "fr", "ru", "zh", "it"]
+GAME_COUNT = 5000
+
+
+"""
+Parameters:
+-----------
+stream_count : int, optional
+    Number of live streams.
+
+latency : float, optional
+    Mean seconds each request takes.
+
+latency_jitter : float, optional
+    Standard deviation of the request latency in seconds.
+
+rate_limit : int, optional
+    Size of the rate limit bucket. Each request costs one point.
+
+refill_seconds : float, optional
+    Seconds for an empty bucket to refill completely.
+
+churn : float, optional
+    Fraction of streams that end and are replaced by new streams on each streams
+    request.
+
+viewer_drift : float, optional
+    Relative standard deviation of the change in viewers of every stream on each
+    streams request.
+
+seed : int, optional
+    Seed of the generated streams.
+"""
+class HelixSimulator:
+    def __init__(
+        self,
+        stream_count: int = 100000,
+        latency: float = 0.0,
+        latency_jitter: float = 0.0,
+        rate_limit: int = DEFAULT_RATE_LIMIT,
+        refill_seconds: float = DEFAULT_REFILL_SECONDS,
+        churn: float = 0.0,
+        viewer_drift: float = 0.0,
+        seed: int = 0,
+    ):
+        self._lock = threading.Lock()
+        self._rng = np.random.default_rng(seed)
+        self._latency = latency
+        self._latency_jitter = latency_jitter
+        self._churn = churn
+        self._viewer_drift = viewer_drift
+        self._now = datetime.now(timezone.utc)
+
+        self._rate_limit = rate_limit
+        self._refill_rate = rate_limit / refill_seconds
+        self._tokens = float(rate_limit)
+        self._refilled_at = time.monotonic()
+
+        self._access_tokens = set()
+        self._next_id = 0
+        self._streams = self._new_streams(stream_count)
+        self._sort_streams()
+        self.stats = {
+            "token_requests": 0,
+            "stream_requests": 0,
+            "game_requests": 0,
+            "rate_limited": 0,
+        }
+
+    @property
+    def stream_count(self) -> int:
+        return len(self._streams["id"])
+
+    """
+    Issue an app access token for a client credentials grant. Returns the token
+    response, or None if the client id or secret is missing.
+    """
+    def create_token(self, params: dict) -> dict:
+        if not params.get("client_id") or not params.get("client_secret"):
+            return None
+
+        with self._lock:
+            self.stats["token_requests"] += 1
+            access_token = secrets.token_hex(15)
+            self._access_tokens.add(access_token)
+
+        return {"access_token": access_token, "expires_in": 5000000, "token_type": "bearer"}
+
+    def is_authorized(self, headers) -> bool:
+        authorization = headers.get("Authorization", "")
+        return (
+            bool(headers.get("Client-ID"))
+            and authorization.startswith("Bearer ")
+            and authorization[len("Bearer "):] in self._access_tokens
+        )
+
+    """
+    Take a point from the rate limit bucket. Returns whether the request is allowed
+    and the Ratelimit-* headers to send with the response.
+    """
+    def take_rate_limit_point(self) -> tuple:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self._rate_limit, self._tokens + (now - self._refilled_at) * self._refill_rate
+            )
+            self._refilled_at = now
+
+            allowed = self._tokens >= 1
+            if allowed:
+                self._tokens -= 1
+            else:
+                self.stats["rate_limited"] += 1
+
+            seconds_to_full = (self._rate_limit - self._tokens) / self._refill_rate
+            headers = {
+                "Ratelimit-Limit": str(self._rate_limit),
+                "Ratelimit-Remaining": str(int(self._tokens)),
+                "Ratelimit-Reset": str(math.ceil(time.time() + seconds_to_full)),
+            }
+
+        return allowed, headers
+
+    def sleep_latency(self):
+        if self._latency or self._latency_jitter:
+            with self._lock:
+                latency = self._rng.normal(self._latency, self._latency_jitter)
+            time.sleep(max(0.0, latency))
+
+    """
+    Return a page of live streams in the format of Get Streams.
+
+    Parameters:
+    -----------
+    params : dict
+        Query parameters of the request, each a list of values.
+    """
+    def get_streams(self, params: dict) -> dict:
+        first = min(int(params.get("first", [20])[0]), MAX_PAGE_SIZE)
+        after = params.get("after", [None])[0]
+        offset = _decode_cursor(after) if after else 0
+        languages = params.get("language")
+
+        with self._lock:
+            self.stats["stream_requests"] += 1
+            self._apply_churn()
+
+            streams = self._streams
+            positions = np.arange(len(streams["id"]))
+            if languages:
+                positions = positions[np.isin(streams["language"], languages)]
+            page = positions[offset:offset + first]
+            data = [self._stream_record(position) for position in page]
+
+        pagination = {}
+        if offset + first < len(positions):
+            pagination["cursor"] = _encode_cursor(offset + first)
+
+        return {"data": data, "pagination": pagination}
+
+    def get_games(self, params: dict) -> dict:
+        with self._lock:
+            self.stats["game_requests"] += 1
+
+        return {
+            "data": [
+                {"id": game_id, "name": f"Game {game_id}", "box_art_url": "", "igdb_id": ""}
+                for game_id in params.get("id", [])[:MAX_PAGE_SIZE]
+            ]
+        }
+
+    def _new_streams(self, count: int) -> dict:
+        ids = np.arange(self._next_id, self._next_id + count)
+        self._next_id += count
+        # Viewers follow a long tail, most streams have a handful of viewers
+        viewer_count = np.floor(self._rng.pareto(1.2, count) * 5).astype(np.int64)
+
+        return {
+            "id": ids,
+            "viewer_count": viewer_count,
+            "game_id": self._rng.zipf(1.5, count) % GAME_COUNT,
+            "language": self._rng.choice(LANGUAGES, count),
+            "started_minutes_ago": self._rng.integers(0, 24 * 60, count),
+        }
+
+    def _apply_churn(self):
+        count = len(self._streams["id"])
+        changed = False
+
+        ended = self._rng.binomial(count, self._churn) if self._churn else 0
+        if ended:
+            keep = np.ones(count, dtype=bool)
+            keep[self._rng.choice(count, ended, replace=False)] = False
+            new_streams = self._new_streams(ended)
+            self._streams = {
+                column: np.concatenate([values[keep], new_streams[column]])
+                for column, values in self._streams.items()
+            }
+            changed = True
+
+        if self._viewer_drift:
+            viewer_count = self._streams["viewer_count"]
+            drift = self._rng.normal(1.0, self._viewer_drift, len(viewer_count))
+            self._streams["viewer_count"] = np.maximum(
+                0, np.round(viewer_count * drift)
+            ).astype(np.int64)
+            changed = True
+
+        if changed:
+            self._sort_streams()
+
+    def _sort_streams(self):
+        order = np.argsort(-self._streams["viewer_count"], kind="stable")
+        self._streams = {column: values[order] for column, values in self._streams.items()}
+
+    def _stream_record(self, position: int) -> dict:
+        streams = self._streams
+        stream_id = int(streams["id"][position])
+        started_at = self._now - timedelta(minutes=int(streams["started_minutes_ago"][position]))
+
+        return {
+            "id": str(stream_id),
+            "user_id": str(stream_id + 1000000000),
+            "user_login": f"streamer{stream_id}",
+            "user_name": f"Streamer{stream_id}",
+            "game_id": str(int(streams["game_id"][position])),
+            "game_name": f"Game {int(streams['game_id'][position])}",
+            "type": "live",
+            "title": f"Stream {stream_id}",
+            "tags": [],
+            "viewer_count": int(streams["viewer_count"][position]),
+            "started_at": started_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "language": str(streams["language"][position]),
+            "thumbnail_url": "",
+            "tag_ids": [],
+            "is_mature": False,
+        }
+
+
+def _encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"o": offset}).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> int:
+    return json.loads(base64.urlsafe_b64decode(cursor.encode()))["o"]
+
+
+"""
+Create an HTTP server for a simulator. Call serve_forever on the returned server
+to start serving.
+
+Parameters:
+-----------
+simulator : HelixSimulator
+    The simulator to serve.
+
+host : str
+    Host to bind to.
+
+port : int
+    Port to bind to. Use 0 to pick a free port.
+"""
+def create_server(simulator: HelixSimulator, host: str, port: int) -> ThreadingHTTPServer:
+    class HelixHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path != "/oauth2/token":
+                self._send_json(404, {"status": 404, "message": "Not Found"})
+                return
+
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            token = simulator.create_token(params)
+            if token is None:
+                self._send_json(400, {"status": 400, "message": "missing client id"})
+                return
+            self._send_json(200, token)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path not in ("/helix/streams", "/helix/games"):
+                self._send_json(404, {"status": 404, "message": "Not Found"})
+                return
+            if not simulator.is_authorized(self.headers):
+                self._send_json(401, {"status": 401, "message": "Invalid OAuth token"})
+                return
+
+            simulator.sleep_latency()
+            allowed, headers = simulator.take_rate_limit_point()
+            if not allowed:
+                self._send_json(
+                    429, {"error": "Too Many Requests", "status": 429, "message": ""}, headers
+                )
+                return
+
+            params = parse_qs(url.query)
+            if url.path == "/helix/streams":
+                self._send_json(200, simulator.get_streams(params), headers)
+            else:
+                self._send_json(200, simulator.get_games(params), headers)
+
+        def _send_json(self, status: int, body: dict, headers: dict = None):
+            body = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), HelixHandler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from crawl_dedup import StreamDeduplicator
+    from twitch_metrics_updater import setup_logging
+    from twitch_wrapper import TwitchWrapper
+
+    parser = argparse.ArgumentParser(description="Serve a local simulation of the Helix api")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--streams", type=int, default=100000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean seconds per request")
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=DEFAULT_RATE_LIMIT)
+    parser.add_argument("--refill-seconds", type=float, default=DEFAULT_REFILL_SECONDS)
+    parser.add_argument("--churn", type=float, default=0.0)
+    parser.add_argument("--viewer-drift", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--crawl",
+        action="store_true",
+        help="Crawl every stream once with TwitchWrapper, report the results and exit",
+    )
+    parser.add_argument(
+        "--refetch-pages",
+        type=int,
+        default=0,
+        help="Pages to fetch again after the crawl to recover skipped streams",
+    )
+    args = parser.parse_args()
+
+    logger = setup_logging()
+    simulator = HelixSimulator(
+        args.streams,
+        args.latency,
+        args.latency_jitter,
+        args.rate_limit,
+        args.refill_seconds,
+        args.churn,
+        args.viewer_drift,
+        args.seed,
+    )
+    server = create_server(simulator, args.host, args.port)
+    base_url = f"http://{args.host}:{server.server_port}"
+
+    if not args.crawl:
+        logger.info("Serving the Helix simulator on %s", base_url)
+        server.serve_forever()
+    else:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        twitch_wrapper = TwitchWrapper(
+            {"client_id": "simulator", "client_secret": "simulator"},
+            logger,
+            api_url=f"{base_url}/helix",
+            auth_url=f"{base_url}/oauth2/token",
+        )
+
+        start = time.perf_counter()
+        deduplicator = StreamDeduplicator()
+        cursor = None
+        for page, next_cursor in twitch_wrapper.get_stream_pages():
+            deduplicator.add_page(page, cursor)
+            cursor = next_cursor
+        if args.refetch_pages:
+            deduplicator.refetch_drifted(twitch_wrapper, args.refetch_pages)
+        duration = time.perf_counter() - start
+
+        deduplicator.log_stats(logger)
+        logger.info(
+            "Crawled %s unique streams of %s in %.1fs with %s requests, %s rate limited",
+            len(deduplicator),
+            simulator.stream_count,
+            duration,
+            simulator.stats["stream_requests"],
+            simulator.stats["rate_limited"],
+        )
+        server.shutdown()
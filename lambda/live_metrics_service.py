@@ -0,0 +1,429 @@
+"""
+A long-running alternative to the lambda and DLT pipeline for the dashboard. It polls
+the Twitch API with TwitchWrapper, keeps rolling aggregates of the last week in
+memory and serves the same tables the dashboard reads from the warehouse over a
+small local HTTP API.
+
+Snapshots are folded into 15 minute buckets as they arrive, so the week window is at
+most 672 small aggregated frames no matter how often the API is polled. The views
+for every timescale are recomputed once per poll and served from memory.
+"""
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import threading
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+from data_quality import validate_snapshot
+from session_store import SessionStore
+from twitch_wrapper import TwitchWrapper
+from viewer_store import ViewerStore
+
+BUCKET_SECONDS = 15 * 60
+TIMESCALES = {
+    "Hour": timedelta(hours=1),
+    "Day": timedelta(days=1),
+    "Week": timedelta(weeks=1),
+}
+# Only the streamers with the most viewers in each poll are kept for the top
+# streamers views, which is enough to rank the top TOP_STREAMERS_LIMIT.
+STREAMER_LIMIT = 5000
+TOP_GAMES_LIMIT = 100
+TOP_STREAMERS_LIMIT = 1000
+VIEW_NAMES = {"latest_stream_metrics"} | {
+    f"{view}_{timescale.lower()}"
+    for view in ["top_games", "top_streamers", "latest_stream_metrics"]
+    for timescale in TIMESCALES
+}
+
+
+"""
+Rolling in-memory aggregates of the live streams. Thread safe, snapshots are added
+by the poller while the HTTP server reads the precomputed views.
+
+Parameters:
+-----------
+viewer_store : ViewerStore, optional
+    Store used to serve the viewer series of individual streamers. If not provided
+    only the overall viewer series is available.
+
+session_store : SessionStore, optional
+    Store that every snapshot is sessionized into as it arrives.
+"""
+class LiveMetrics:
+    def __init__(self, viewer_store: ViewerStore = None, session_store: SessionStore = None):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self._series = deque()
+        self._views = {}
+        # User name to user id and the last time the streamer was seen, oldest first
+        self._user_ids = OrderedDict()
+        self._viewer_store = viewer_store
+        self._session_store = session_store
+
+    """
+    Add a snapshot of live streams and recompute the views.
+
+    Parameters:
+    -----------
+    snapshot : pd.DataFrame
+        Validated live streams, see validate_snapshot.
+
+    timestamp : datetime
+        Time the snapshot was taken.
+
+    interval_hours : float
+        Time the snapshot stands for, used to turn viewers into hours watched. See
+        poll, which uses the time since the previous snapshot.
+    """
+    def add_snapshot(self, snapshot: pd.DataFrame, timestamp: datetime, interval_hours: float):
+        games = (
+            snapshot.groupby(["game_id", "game_name"], dropna=False)
+            .agg(viewer_count=("viewer_count", "sum"), streamers=("user_id", "count"))
+            .reset_index()
+        )
+        games = games.assign(
+            viewer_hours=games["viewer_count"] * interval_hours,
+            max_viewer_count=games["viewer_count"],
+            max_streamers_count=games["streamers"],
+        )[["game_id", "game_name", "viewer_hours", "max_viewer_count", "max_streamers_count"]]
+
+        streamers = snapshot.nlargest(STREAMER_LIMIT, "viewer_count")
+        streamers = streamers.assign(
+            viewer_hours=streamers["viewer_count"] * interval_hours,
+            max_viewers=streamers["viewer_count"],
+        )[["user_id", "user_name", "viewer_hours", "max_viewers"]]
+
+        totals = {
+            "total_viewers": int(snapshot["viewer_count"].sum()),
+            "total_streams": len(snapshot),
+            "hours_watched": float(snapshot["viewer_count"].sum() * interval_hours),
+        }
+
+        with self._lock:
+            self._add_to_bucket(timestamp, games, streamers, totals)
+            self._series.append((timestamp, totals["total_viewers"]))
+            for user_name, user_id in zip(snapshot["user_name"], snapshot["user_id"]):
+                self._user_ids[user_name] = (user_id, timestamp)
+                self._user_ids.move_to_end(user_name)
+            self._expire(timestamp)
+
+            if self._viewer_store is not None:
+                self._viewer_store.append_snapshot(snapshot.assign(timestamp=timestamp))
+            if self._session_store is not None:
+                self._session_store.add_snapshot(snapshot.assign(timestamp=timestamp))
+
+            views = self._compute_views(timestamp)
+            views["latest_stream_metrics"] = [
+                {
+                    "total_viewers": totals["total_viewers"],
+                    "total_streams": totals["total_streams"],
+                    "unique_games": int(snapshot["game_id"].nunique()),
+                }
+            ]
+            self._views = views
+
+    """
+    Returns the records of a precomputed view, ex: top_games_hour. Returns an empty
+    list before the first snapshot and None for unknown views.
+    """
+    def get_view(self, name: str) -> list:
+        if name not in VIEW_NAMES:
+            return None
+
+        return self._views.get(name, [])
+
+    """
+    Returns the total viewers of every snapshot in the last week, or of a single
+    streamer if a user name is given.
+    """
+    def get_viewers(self, streamer: str = None) -> list:
+        with self._lock:
+            if not streamer:
+                series = pd.Series(
+                    [viewers for _, viewers in self._series],
+                    index=[timestamp for timestamp, _ in self._series],
+                    dtype="int64",
+                )
+            elif self._viewer_store is not None and streamer in self._user_ids:
+                series = self._viewer_store.get_viewers(self._user_ids[streamer][0])
+                series = series[series.index >= series.index.max() - TIMESCALES["Week"]]
+            else:
+                return []
+
+        return [
+            {
+                "timestamp": f"{timestamp:%b} {timestamp.day} {timestamp:%H:%M}",
+                "total_viewers": int(viewers),
+            }
+            for timestamp, viewers in series.items()
+        ]
+
+    def _add_to_bucket(self, timestamp, games, streamers, totals):
+        start = int(timestamp.timestamp()) // BUCKET_SECONDS * BUCKET_SECONDS
+        bucket = self._buckets.get(start)
+        if bucket is None:
+            self._buckets[start] = {
+                "games": games,
+                "streamers": streamers,
+                "totals": totals,
+                "polls": 1,
+                "game_ids": set(games["game_id"]),
+            }
+            return
+
+        # Several polls in the same bucket are merged the same way windows are. The
+        # totals are summed and averaged per poll when the views are computed.
+        bucket["games"] = _merge_games([bucket["games"], games])
+        bucket["streamers"] = _merge_streamers([bucket["streamers"], streamers])
+        bucket["totals"] = {
+            key: bucket["totals"][key] + value for key, value in totals.items()
+        }
+        bucket["polls"] += 1
+        bucket["game_ids"].update(games["game_id"])
+
+    def _expire(self, now: datetime):
+        oldest = (now - TIMESCALES["Week"]).timestamp()
+        while self._buckets and next(iter(self._buckets)) + BUCKET_SECONDS <= oldest:
+            self._buckets.popitem(last=False)
+        while self._series and self._series[0][0].timestamp() < oldest:
+            self._series.popleft()
+        while self._user_ids and next(iter(self._user_ids.values()))[1].timestamp() < oldest:
+            self._user_ids.popitem(last=False)
+
+    def _compute_views(self, now: datetime) -> dict:
+        views = {}
+        for timescale, window in TIMESCALES.items():
+            oldest = (now - window).timestamp()
+            buckets = [
+                bucket
+                for start, bucket in self._buckets.items()
+                if start + BUCKET_SECONDS > oldest
+            ]
+            suffix = timescale.lower()
+
+            top_games = _merge_games([bucket["games"] for bucket in buckets])
+            top_games = top_games.assign(hours_watched=top_games["viewer_hours"].round())
+            views[f"top_games_{suffix}"] = _records(
+                top_games.nlargest(TOP_GAMES_LIMIT, "hours_watched")[
+                    ["game_id", "game_name", "hours_watched", "max_viewer_count", "max_streamers_count"]
+                ]
+            )
+
+            top_streamers = _merge_streamers([bucket["streamers"] for bucket in buckets])
+            top_streamers = top_streamers.assign(
+                hours_watched=top_streamers["viewer_hours"].round()
+            )
+            views[f"top_streamers_{suffix}"] = _records(
+                top_streamers.nlargest(TOP_STREAMERS_LIMIT, "hours_watched")[
+                    ["user_id", "user_name", "max_viewers", "hours_watched"]
+                ]
+            )
+
+            # Hours watched already accounts for the interval of each poll, the
+            # other totals count each bucket once like a 15 minute snapshot
+            views[f"latest_stream_metrics_{suffix}"] = [
+                {
+                    "total_viewers": round(
+                        sum(b["totals"]["total_viewers"] / b["polls"] for b in buckets)
+                    ),
+                    "total_streams": round(
+                        sum(b["totals"]["total_streams"] / b["polls"] for b in buckets)
+                    ),
+                    "unique_games": len(set().union(*(b["game_ids"] for b in buckets))),
+                    "hours_watched": round(sum(b["totals"]["hours_watched"] for b in buckets)),
+                }
+            ]
+
+        return views
+
+
+def _merge_games(frames: list) -> pd.DataFrame:
+    return (
+        pd.concat(frames, ignore_index=True)
+        .groupby(["game_id", "game_name"], dropna=False)
+        .agg(
+            viewer_hours=("viewer_hours", "sum"),
+            max_viewer_count=("max_viewer_count", "max"),
+            max_streamers_count=("max_streamers_count", "max"),
+        )
+        .reset_index()
+    )
+
+
+def _merge_streamers(frames: list) -> pd.DataFrame:
+    return (
+        pd.concat(frames, ignore_index=True)
+        .groupby(["user_id", "user_name"], dropna=False)
+        .agg(viewer_hours=("viewer_hours", "sum"), max_viewers=("max_viewers", "max"))
+        .reset_index()
+    )
+
+
+def _records(df: pd.DataFrame) -> list:
+    return json.loads(df.to_json(orient="records"))
+
+
+"""
+Create an HTTP server for the live metrics. Every view is served as a JSON list of
+records at /<view name>, ex: /top_games_day, and the viewer series at
+/viewers?streamer=<user name>.
+
+Parameters:
+-----------
+metrics : LiveMetrics
+    The metrics to serve.
+
+host : str
+    Host to bind to.
+
+port : int
+    Port to bind to. Use 0 to pick a free port.
+"""
+def create_server(metrics: LiveMetrics, host: str, port: int) -> ThreadingHTTPServer:
+    class LiveMetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            name = url.path.strip("/")
+
+            if name == "viewers":
+                streamer = parse_qs(url.query).get("streamer", [None])[0]
+                records = metrics.get_viewers(streamer)
+            else:
+                records = metrics.get_view(name)
+
+            if records is None:
+                self.send_error(404, f"Unknown view {name}")
+                return
+
+            body = json.dumps(records).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), LiveMetricsHandler)
+
+
+"""
+Poll the live streams until stopped, adding a snapshot to the metrics every
+interval_seconds.
+
+Parameters:
+-----------
+logger : logging.Logger
+    A logger instance.
+
+twitch_wrapper : TwitchWrapper
+    An instance of TwitchWrapper.
+
+metrics : LiveMetrics
+    The metrics to update.
+
+interval_seconds : int
+    Time between polls. Hours watched use the time measured since the previous
+    snapshot, or interval_seconds for the first one.
+
+stop_event : threading.Event
+    Set to stop polling.
+"""
+def poll(
+    logger: logging.Logger,
+    twitch_wrapper: TwitchWrapper,
+    metrics: LiveMetrics,
+    interval_seconds: int,
+    stop_event: threading.Event,
+):
+    previous_timestamp = None
+    while not stop_event.is_set():
+        try:
+            timestamp = datetime.now(timezone.utc)
+            live_streams = twitch_wrapper.get_current_streams()
+            live_streams = live_streams.rename(columns={"id": "stream_id"}).assign(
+                timestamp=timestamp
+            )
+            valid, _, counts = validate_snapshot(live_streams)
+            if counts:
+                logger.warning("Dropped invalid rows: %s", counts)
+
+            # A slow crawl or a failed poll stretches the time a snapshot stands for
+            elapsed_seconds = interval_seconds
+            if previous_timestamp is not None:
+                elapsed_seconds = (timestamp - previous_timestamp).total_seconds()
+            previous_timestamp = timestamp
+
+            metrics.add_snapshot(valid, timestamp, elapsed_seconds / 3600)
+            logger.info("Added snapshot of %s streams", len(valid))
+        except Exception as e:
+            logger.error("Error polling live streams: %s", e, exc_info=True)
+
+        stop_event.wait(interval_seconds)
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import tempfile
+
+    import dotenv
+
+    from aws_wrapper import AwsWrapper
+    from twitch_metrics_updater import setup_logging
+
+    dotenv.load_dotenv()
+    parser = argparse.ArgumentParser(description="Serve live Twitch metrics")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--interval", type=int, default=BUCKET_SECONDS)
+    parser.add_argument(
+        "--store-dir", help="Directory for the streamer viewer store. Defaults to a temp dir"
+    )
+    parser.add_argument(
+        "--session-dir", help="Directory of a session store to sessionize the snapshots into"
+    )
+    args = parser.parse_args()
+
+    logger = setup_logging()
+    aws_session = AwsWrapper(
+        os.getenv("AWS_REGION"),
+        logger,
+        os.getenv("AWS_ACCESS_KEY_ID"),
+        os.getenv("AWS_SECRET_ACCESS_KEY"),
+    )
+    twitch_wrapper = TwitchWrapper(
+        aws_session.get_credentials(
+            os.getenv("TWITCH_CREDENTIALS_NAME", "twitch-client-credentials")
+        ),
+        logger,
+    )
+    # A temporary store is removed when the service exits
+    store_dir = args.store_dir
+    if not store_dir:
+        temp_dir = tempfile.TemporaryDirectory()
+        store_dir = temp_dir.name
+    metrics = LiveMetrics(
+        ViewerStore(store_dir),
+        SessionStore(args.session_dir, args.interval) if args.session_dir else None,
+    )
+
+    stop_event = threading.Event()
+    threading.Thread(
+        target=poll,
+        args=(logger, twitch_wrapper, metrics, args.interval, stop_event),
+        daemon=True,
+    ).start()
+
+    server = create_server(metrics, args.host, args.port)
+    logger.info("Serving live metrics on http://%s:%s", args.host, args.port)
+    try:
+        server.serve_forever()
+    finally:
+        stop_event.set()
@@ -0,0 +1,314 @@
+import base64
+from concurrent.futures import Future, ThreadPoolExecutor
+import hashlib
+import io
+import logging
+import random
+import time
+
+from botocore.exceptions import ClientError, HTTPClientError
+from botocore.exceptions import ConnectionError as BotocoreConnectionError
+from pandas import DataFrame
+
+# S3 requires every part of a multipart upload except the last to be at least 5 MiB
+MIN_PART_SIZE_BYTES = 5 * 1024 * 1024
+DEFAULT_PART_SIZE_BYTES = 8 * 1024 * 1024
+DEFAULT_MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 10
+# Error codes S3 returns when requests should be slowed down
+THROTTLING_ERROR_CODES = {
+    "SlowDown",
+    "Throttling",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+    "RequestTimeout",
+    "RequestTimeTooSkewed",
+}
+
+
+class ChecksumMismatchError(Exception):
+    pass
+
+
+"""
+Uploads parquet files to S3 on a background thread so callers can keep working
+while the upload is in flight. Dataframes are serialized to an in-memory buffer,
+files larger than a part are sent as a multipart upload with the parts uploaded in
+parallel, throttled, 5xx and connection errors are retried with exponential
+backoff and full jitter, and the SHA-256 of every part is sent with it so S3 rejects a corrupted body, then
+checked against the checksum S3 stored. Unlike the ETag, the checksum is the
+same for multipart uploads and for objects encrypted with SSE-KMS.
+
+Parameters:
+-----------
+s3_client : botocore.client.S3
+    An S3 client.
+
+logger : logging.Logger
+    A logger instance.
+
+part_size : int, optional
+    Size in bytes of each multipart part.
+
+max_part_workers : int, optional
+    Number of parts of a file uploaded at the same time.
+
+max_attempts : int, optional
+    Number of attempts for each request before the upload fails.
+"""
+class S3Uploader:
+    def __init__(
+        self,
+        s3_client,
+        logger: logging.Logger,
+        part_size: int = DEFAULT_PART_SIZE_BYTES,
+        max_part_workers: int = 4,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ):
+        self._s3_client = s3_client
+        self._logger = logger
+        self._part_size = max(part_size, MIN_PART_SIZE_BYTES)
+        self._max_attempts = max_attempts
+        self._file_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="s3-upload"
+        )
+        self._part_executor = ThreadPoolExecutor(
+            max_workers=max_part_workers, thread_name_prefix="s3-upload-part"
+        )
+        self._pending = []
+
+    """
+    Serialize a dataframe to parquet and upload it in the background.
+    Returns a future that resolves to the ETag of the uploaded object.
+
+    Parameters:
+    -----------
+    df : Dataframe
+        Dataframe to export.
+
+    s3_path : str
+        S3 path to export to, ex: s3://bucket/key.parquet
+    """
+    def submit_parquet(self, df: DataFrame, s3_path: str) -> Future:
+        future = self._file_executor.submit(self._upload_parquet, df, s3_path)
+        self._pending.append(future)
+        return future
+
+    """
+    Upload bytes to S3 on the calling thread. Returns the ETag of the object.
+    """
+    def upload_bytes(self, data: bytes, s3_path: str) -> str:
+        bucket, key = split_s3_path(s3_path)
+        view = memoryview(data)
+
+        if len(view) <= self._part_size:
+            return self._with_retry(self._put_object, bucket, key, view)
+
+        return self._upload_multipart(bucket, key, view)
+
+    """
+    Block until every submitted upload has finished. Raises the first upload error.
+    """
+    def wait(self):
+        pending, self._pending = self._pending, []
+        errors = []
+        for future in pending:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append(e)
+
+        if errors:
+            raise errors[0]
+
+    def close(self):
+        try:
+            self.wait()
+        finally:
+            self._file_executor.shutdown()
+            self._part_executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _upload_parquet(self, df: DataFrame, s3_path: str) -> str:
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, compression="gzip", index=False)
+        self._logger.debug("Uploading %s bytes to %s", buffer.tell(), s3_path)
+
+        return self.upload_bytes(buffer.getbuffer(), s3_path)
+
+    def _put_object(self, bucket: str, key: str, data: memoryview) -> str:
+        checksum = _sha256(data)
+        response = self._s3_client.put_object(
+            Bucket=bucket,
+            Key=key,
+            Body=_MemoryviewReader(data),
+            ChecksumAlgorithm="SHA256",
+            ChecksumSHA256=checksum,
+        )
+        _verify_checksum(response, checksum)
+
+        return response["ETag"]
+
+    def _upload_multipart(self, bucket: str, key: str, view: memoryview) -> str:
+        upload_id = self._with_retry(
+            self._s3_client.create_multipart_upload,
+            Bucket=bucket,
+            Key=key,
+            ChecksumAlgorithm="SHA256",
+        )["UploadId"]
+
+        try:
+            futures = [
+                self._part_executor.submit(
+                    self._with_retry,
+                    self._upload_part,
+                    bucket,
+                    key,
+                    upload_id,
+                    part_number,
+                    view[start:start + self._part_size],
+                )
+                for part_number, start in enumerate(
+                    range(0, len(view), self._part_size), start=1
+                )
+            ]
+            parts = [future.result() for future in futures]
+
+            response = self._with_retry(
+                self._s3_client.complete_multipart_upload,
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={
+                    "Parts": [
+                        {
+                            "PartNumber": part["PartNumber"],
+                            "ETag": part["ETag"],
+                            "ChecksumSHA256": part["ChecksumSHA256"],
+                        }
+                        for part in parts
+                    ]
+                },
+            )
+        except Exception:
+            # Failing to abort leaves the parts to the bucket lifecycle rules, the
+            # error that failed the upload is the one raised
+            try:
+                self._s3_client.abort_multipart_upload(
+                    Bucket=bucket, Key=key, UploadId=upload_id
+                )
+            except Exception as abort_error:
+                self._logger.warning(
+                    "Could not abort the multipart upload of %s: %s", key, abort_error
+                )
+            raise
+
+        # Every part was verified on upload and S3 rejects the completion if a part
+        # checksum listed here does not match the part it stored
+        return response["ETag"]
+
+    def _upload_part(
+        self,
+        bucket: str,
+        key: str,
+        upload_id: str,
+        part_number: int,
+        data: memoryview,
+    ) -> dict:
+        checksum = _sha256(data)
+        response = self._s3_client.upload_part(
+            Bucket=bucket,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=_MemoryviewReader(data),
+            ChecksumAlgorithm="SHA256",
+            ChecksumSHA256=checksum,
+        )
+        _verify_checksum(response, checksum)
+
+        return {"PartNumber": part_number, "ETag": response["ETag"], "ChecksumSHA256": checksum}
+
+    def _with_retry(self, function, *args, **kwargs):
+        for attempt in range(1, self._max_attempts + 1):
+            try:
+                return function(*args, **kwargs)
+            except Exception as e:
+                if attempt == self._max_attempts or not _is_retryable(e):
+                    raise
+
+                delay = random.uniform(
+                    0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2**attempt)
+                )
+                self._logger.warning(
+                    "S3 request failed on attempt %s, retrying in %.2fs: %s",
+                    attempt,
+                    delay,
+                    e,
+                )
+                time.sleep(delay)
+
+
+"""
+A seekable file object reading from a memoryview, so parts of a buffer can be sent
+as a request body without being copied.
+"""
+class _MemoryviewReader(io.RawIOBase):
+    def __init__(self, view: memoryview):
+        self._view = view.cast("B")
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), len(self._view) - self._position)
+        buffer[:size] = self._view[self._position:self._position + size]
+        self._position += size
+        return size
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(0, offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (ConnectionError, BotocoreConnectionError, HTTPClientError)):
+        return True
+    if isinstance(error, ClientError):
+        code = error.response.get("Error", {}).get("Code")
+        status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        return code in THROTTLING_ERROR_CODES or status >= 500
+
+    return False
+
+
+def _sha256(data: memoryview) -> str:
+    return base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+def _verify_checksum(response: dict, expected: str):
+    checksum = response.get("ChecksumSHA256")
+    if checksum != expected:
+        raise ChecksumMismatchError(f"Expected SHA-256 checksum {expected}, got {checksum}")
+
+
+def split_s3_path(s3_path: str) -> tuple:
+    bucket, _, key = s3_path.removeprefix("s3://").partition("/")
+    return bucket, key
@@ -0,0 +1,329 @@
+"""
+Incrementally groups the snapshots of live streams into stream sessions, so per
+stream questions such as how long a stream lasted, its average and peak viewers or
+how often it switched games take one pass per snapshot instead of a scan of every
+snapshot grouped by stream_id.
+
+The sessions still live are kept in a small state table keyed by stream_id that
+each snapshot updates. Once a stream has been missing from the snapshots for longer
+than the session gap it is closed and appended to the sessions file, which is only
+ever appended to. A stream that returns after that starts a new session, so a
+session is identified by its stream_id and first_seen.
+
+Only the open sessions and the sessions file are kept, on local disk, so snapshots
+are added by a long running process such as the live metrics service.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_SNAPSHOT_SECONDS = 15 * 60
+
+OPEN_SESSIONS_FILE = "open_sessions.parquet"
+SESSIONS_FILE = "sessions.csv"
+STATE_FILE = "state.json"
+
+SNAPSHOT_COLUMNS = [
+    "stream_id",
+    "user_id",
+    "user_name",
+    "game_id",
+    "started_at",
+    "viewer_count",
+]
+OPEN_SESSION_COLUMNS = [
+    "user_id",
+    "user_name",
+    "game_id",
+    "started_at",
+    "first_seen",
+    "last_seen",
+    "snapshots",
+    "viewer_sum",
+    "peak_viewers",
+    "game_switches",
+]
+SESSION_COLUMNS = [
+    "stream_id",
+    "user_id",
+    "user_name",
+    "game_id",
+    "started_at",
+    "first_seen",
+    "last_seen",
+    "snapshots",
+    "duration_minutes",
+    "avg_viewers",
+    "peak_viewers",
+    "game_switches",
+]
+
+
+"""
+Parameters:
+-----------
+directory : str
+    Directory holding the state and the sessions file. Created if it does not exist.
+
+snapshot_seconds : int, optional
+    Time between two snapshots. Each snapshot a stream is seen in counts for this
+    long in the session duration.
+
+gap_seconds : int, optional
+    How long a stream can be missing from the snapshots before its session is closed.
+    Defaults to two snapshots, so a stream missing from a single snapshot, ex:
+    skipped by the crawl, stays open.
+"""
+class SessionStore:
+    def __init__(
+        self,
+        directory: str,
+        snapshot_seconds: int = DEFAULT_SNAPSHOT_SECONDS,
+        gap_seconds: int = None,
+    ):
+        self._directory = directory
+        self._snapshot_seconds = snapshot_seconds
+        self._gap = pd.Timedelta(seconds=gap_seconds or 2 * snapshot_seconds)
+        os.makedirs(directory, exist_ok=True)
+
+        if os.path.exists(self._path(OPEN_SESSIONS_FILE)):
+            self._open = pd.read_parquet(self._path(OPEN_SESSIONS_FILE))
+            with open(self._path(STATE_FILE)) as f:
+                self._last_timestamp = pd.Timestamp(json.load(f)["last_timestamp"])
+        else:
+            self._open = _empty_open_sessions()
+            self._last_timestamp = None
+
+    def __len__(self) -> int:
+        return len(self._open)
+
+    """
+    Update the open sessions with a snapshot and close the sessions of streams that
+    have been missing for longer than the session gap. Snapshots split into several
+    parts can be added part by part. Snapshots older than the latest one added are
+    ignored.
+
+    Parameters:
+    -----------
+    snapshot : pd.DataFrame
+        A snapshot containing the stream_id, user_id, viewer_count and timestamp
+        columns, and optionally user_name, game_id and started_at.
+
+    Returns the sessions closed by the snapshot.
+    """
+    def add_snapshot(self, snapshot: pd.DataFrame) -> pd.DataFrame:
+        if snapshot.empty:
+            return _empty_sessions()
+
+        timestamp = _to_utc(snapshot["timestamp"].iloc[0])
+        if self._last_timestamp is not None and timestamp < self._last_timestamp:
+            return _empty_sessions()
+
+        streams = (
+            snapshot[snapshot["stream_id"].notna()]
+            .drop_duplicates("stream_id")
+            .reindex(columns=SNAPSHOT_COLUMNS)
+            .astype({"stream_id": str, "game_id": "string"})
+            .set_index("stream_id")
+        )
+        viewer_count = (
+            pd.to_numeric(streams["viewer_count"], errors="coerce").fillna(0).astype(np.int64)
+        )
+
+        open_sessions = self._open
+        continuing = streams.index.intersection(open_sessions.index)
+        # A stream seen in an earlier part of the same snapshot is not counted twice
+        continuing = continuing[open_sessions.loc[continuing, "last_seen"] < timestamp]
+        if len(continuing):
+            game_id = streams.loc[continuing, "game_id"]
+            previous_game_id = open_sessions.loc[continuing, "game_id"]
+            switched = game_id.notna() & previous_game_id.notna() & (game_id != previous_game_id)
+
+            open_sessions.loc[continuing, "last_seen"] = timestamp
+            open_sessions.loc[continuing, "snapshots"] += 1
+            open_sessions.loc[continuing, "viewer_sum"] += viewer_count[continuing]
+            open_sessions.loc[continuing, "peak_viewers"] = np.maximum(
+                open_sessions.loc[continuing, "peak_viewers"], viewer_count[continuing]
+            )
+            open_sessions.loc[continuing, "game_switches"] += switched.astype(np.int64)
+            open_sessions.loc[continuing, "game_id"] = game_id.fillna(previous_game_id)
+
+        new = streams.index.difference(open_sessions.index)
+        if len(new):
+            new_sessions = pd.DataFrame(
+                {
+                    "user_id": streams.loc[new, "user_id"],
+                    "user_name": streams.loc[new, "user_name"],
+                    "game_id": streams.loc[new, "game_id"],
+                    "started_at": streams.loc[new, "started_at"],
+                    "first_seen": timestamp,
+                    "last_seen": timestamp,
+                    "snapshots": 1,
+                    "viewer_sum": viewer_count[new],
+                    "peak_viewers": viewer_count[new],
+                    "game_switches": 0,
+                },
+                index=new,
+            )
+            open_sessions = pd.concat(
+                [open_sessions, new_sessions.astype(open_sessions.dtypes.to_dict())]
+            )
+
+        ended = open_sessions["last_seen"] < timestamp - self._gap
+        closed = _to_sessions(open_sessions[ended], self._snapshot_seconds)
+        self._open = open_sessions[~ended].copy()
+        self._last_timestamp = timestamp
+
+        # The sessions are appended before the state is replaced so a crash in
+        # between closes them again rather than losing them
+        if not closed.empty:
+            sessions_path = self._path(SESSIONS_FILE)
+            closed.to_csv(
+                sessions_path, mode="a", header=not os.path.exists(sessions_path), index=False
+            )
+        self._save()
+
+        return closed
+
+    """
+    Returns the open sessions with the same columns as the closed sessions.
+    """
+    def open_sessions(self) -> pd.DataFrame:
+        return _to_sessions(self._open, self._snapshot_seconds)
+
+    """
+    Returns every closed session.
+    """
+    def read_sessions(self) -> pd.DataFrame:
+        if not os.path.exists(self._path(SESSIONS_FILE)):
+            return _empty_sessions()
+
+        sessions = pd.read_csv(
+            self._path(SESSIONS_FILE),
+            dtype={"stream_id": str, "user_id": str, "user_name": str, "game_id": "string"},
+            keep_default_na=False,
+            na_values=[""],
+        )
+        for column in ["first_seen", "last_seen"]:
+            sessions[column] = pd.to_datetime(sessions[column], utc=True, format="ISO8601")
+
+        # A crash between appending and saving the state can close a session twice.
+        # A stream that returns after the session gap starts a new session with the
+        # same stream_id, so sessions are identified by stream_id and first_seen.
+        return sessions.drop_duplicates(
+            ["stream_id", "first_seen"], keep="last", ignore_index=True
+        )
+
+    """
+    Returns the session stats of each streamer over the closed and, optionally, the
+    open sessions.
+
+    Parameters:
+    -----------
+    include_open : bool, optional
+        Include the sessions still live.
+    """
+    def streamer_stats(self, include_open: bool = True) -> pd.DataFrame:
+        sessions = [self.read_sessions()]
+        if include_open:
+            sessions.append(self.open_sessions())
+        sessions = pd.concat([df for df in sessions if not df.empty] or sessions, ignore_index=True)
+
+        sessions = sessions.assign(
+            viewer_minutes=sessions["avg_viewers"] * sessions["duration_minutes"]
+        )
+        stats = (
+            sessions.groupby("user_id")
+            .agg(
+                user_name=("user_name", "last"),
+                sessions=("stream_id", "count"),
+                total_minutes=("duration_minutes", "sum"),
+                viewer_minutes=("viewer_minutes", "sum"),
+                peak_viewers=("peak_viewers", "max"),
+                game_switches=("game_switches", "sum"),
+            )
+            .reset_index()
+        )
+        stats["avg_viewers"] = (
+            stats["viewer_minutes"] / stats["total_minutes"].replace(0, np.nan)
+        ).fillna(0)
+
+        return stats.drop(columns="viewer_minutes")
+
+    def _save(self):
+        open_path = self._path(OPEN_SESSIONS_FILE)
+        self._open.to_parquet(f"{open_path}.tmp")
+        os.replace(f"{open_path}.tmp", open_path)
+
+        with open(self._path(STATE_FILE), "w") as f:
+            json.dump({"last_timestamp": self._last_timestamp.isoformat()}, f)
+
+    def _path(self, file_name: str) -> str:
+        return os.path.join(self._directory, file_name)
+
+
+def _to_utc(timestamp) -> pd.Timestamp:
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp.tzinfo is None:
+        return timestamp.tz_localize("UTC")
+    return timestamp.tz_convert("UTC")
+
+
+def _to_sessions(open_sessions: pd.DataFrame, snapshot_seconds: int) -> pd.DataFrame:
+    # Each snapshot stands for the snapshot_seconds until the next one
+    duration = (open_sessions["last_seen"] - open_sessions["first_seen"]).dt.total_seconds()
+    sessions = open_sessions.assign(
+        duration_minutes=(duration + snapshot_seconds) / 60,
+        avg_viewers=open_sessions["viewer_sum"] / open_sessions["snapshots"],
+    )
+
+    return sessions.rename_axis("stream_id").reset_index()[SESSION_COLUMNS]
+
+
+def _empty_open_sessions() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "user_id": pd.Series(dtype=object),
+            "user_name": pd.Series(dtype=object),
+            "game_id": pd.Series(dtype="string"),
+            "started_at": pd.Series(dtype=object),
+            "first_seen": pd.Series(dtype="datetime64[ns, UTC]"),
+            "last_seen": pd.Series(dtype="datetime64[ns, UTC]"),
+            "snapshots": pd.Series(dtype=np.int64),
+            "viewer_sum": pd.Series(dtype=np.int64),
+            "peak_viewers": pd.Series(dtype=np.int64),
+            "game_switches": pd.Series(dtype=np.int64),
+        },
+        index=pd.Index([], dtype=object, name="stream_id"),
+    )[OPEN_SESSION_COLUMNS]
+
+
+def _empty_sessions() -> pd.DataFrame:
+    return _to_sessions(_empty_open_sessions(), DEFAULT_SNAPSHOT_SECONDS)
+
+
+if __name__ == "__main__":
+    # Adds the snapshots of a range of days to a session store
+    import argparse
+    from datetime import date, timedelta
+
+    from backfill import read_snapshots
+
+    parser = argparse.ArgumentParser(description="Sessionize snapshots into a session store")
+    parser.add_argument("source", help="Local directory or S3 prefix of the snapshots")
+    parser.add_argument("store", help="Directory of the session store")
+    parser.add_argument("--start", type=date.fromisoformat, required=True)
+    parser.add_argument("--end", type=date.fromisoformat, required=True)
+    parser.add_argument("--snapshot-seconds", type=int, default=DEFAULT_SNAPSHOT_SECONDS)
+    args = parser.parse_args()
+
+    store = SessionStore(args.store, args.snapshot_seconds)
+    for i in range((args.end - args.start).days + 1):
+        snapshots = read_snapshots(args.source, args.start + timedelta(days=i))
+        if snapshots.empty:
+            continue
+
+        for _, snapshot in snapshots.groupby("timestamp"):
+            store.add_snapshot(snapshot)
@@ -0,0 +1,171 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from pandas import DataFrame
+
+from aws_wrapper import AwsWrapper
+
+# Extra time given to a worker invocation on top of the worker timeout to respond
+INVOKE_TIMEOUT_MARGIN_SECONDS = 30
+
+# Languages accepted by the language filter of the streams endpoint, roughly ordered
+# by the number of live streams. "other" covers any stream whose language Twitch does
+# not support so together the shards cover every live stream.
+STREAM_LANGUAGES = [
+    "en", "es", "ja", "pt", "ru", "de", "fr", "ko", "zh", "it", "pl", "tr",
+    "th", "ar", "uk", "cs", "zh-hk", "id", "nl", "vi", "sv", "hu", "fi", "no",
+    "da", "ro", "el", "hi", "bg", "sk", "ms", "tl", "ca", "he", "asl", "other",
+]
+
+
+"""
+Split the live streams into shards by language. The streams endpoint can only filter
+by language, so a shard is never smaller than its largest language.
+
+When the number of live streams per language measured by an earlier snapshot is
+provided, each language, largest first, is given to the shard with the fewest
+streams so far. Otherwise languages are dealt out in a snake order so the largest
+languages land in different shards.
+
+Parameters:
+-----------
+shard_count : int
+    Number of shards to create. Capped at the number of languages.
+
+stream_counts : dict, optional
+    Number of live streams per language code, see count_languages.
+
+Returns a list of lists of language codes.
+"""
+def build_language_shards(shard_count: int, stream_counts: dict = None) -> list:
+    shard_count = max(1, min(shard_count, len(STREAM_LANGUAGES)))
+    shards = [[] for _ in range(shard_count)]
+
+    if stream_counts:
+        totals = [0] * shard_count
+        for language in sorted(
+            STREAM_LANGUAGES, key=lambda language: -stream_counts.get(language, 0)
+        ):
+            # Ties go to the shard with the fewest languages so unmeasured languages spread out
+            position = min(range(shard_count), key=lambda i: (totals[i], len(shards[i])))
+            shards[position].append(language)
+            totals[position] += stream_counts.get(language, 0)
+
+        return shards
+
+    for i, language in enumerate(STREAM_LANGUAGES):
+        position = i % (2 * shard_count)
+        if position >= shard_count:
+            position = 2 * shard_count - 1 - position
+        shards[position].append(language)
+
+    return shards
+
+
+"""
+Count the live streams per language of a snapshot, for build_language_shards.
+Languages the streams endpoint cannot filter by are counted as "other".
+
+Parameters:
+-----------
+live_streams : pd.DataFrame
+    A snapshot containing the language column.
+"""
+def count_languages(live_streams: DataFrame) -> dict:
+    if "language" not in live_streams.columns:
+        return {}
+
+    languages = live_streams["language"].where(
+        live_streams["language"].isin(STREAM_LANGUAGES), "other"
+    )
+
+    return {language: int(count) for language, count in languages.value_counts().items()}
+
+
+"""
+Dispatches shard events to worker lambda invocations. All shards are invoked
+concurrently and the call returns once every worker has responded. Invocations
+wait for the full worker timeout and are never retried, so a slow shard is not
+crawled twice.
+
+Parameters:
+-----------
+function_name : str
+    Name or ARN of the worker lambda, which should use handle_shard as its handler.
+
+aws_session : AwsWrapper
+    An instance of AwsWrapper.
+
+worker_timeout : int
+    Timeout of the worker lambda in seconds.
+"""
+class LambdaShardDispatcher:
+    def __init__(self, function_name: str, aws_session: AwsWrapper, worker_timeout: int):
+        self._function_name = function_name
+        self._aws_session = aws_session
+        self._read_timeout = worker_timeout + INVOKE_TIMEOUT_MARGIN_SECONDS
+
+    def __call__(self, shard_events: list) -> list:
+        with ThreadPoolExecutor(max_workers=len(shard_events)) as executor:
+            return list(
+                executor.map(
+                    lambda event: self._aws_session.invoke_lambda(
+                        self._function_name, event, self._read_timeout
+                    ),
+                    shard_events,
+                )
+            )
+
+
+"""
+Dispatches shard events to a local process pool. Uses the same events and
+responses as LambdaShardDispatcher so a snapshot can be ingested and tested
+without deploying the worker lambda.
+
+Parameters:
+-----------
+worker : function
+    The shard handler, called as worker(event, context). Must be importable
+    from a child process.
+
+max_workers : int, optional
+    Size of the process pool. Defaults to one process per shard.
+"""
+class LocalShardDispatcher:
+    def __init__(self, worker, max_workers: int = None):
+        self._worker = worker
+        self._max_workers = max_workers
+
+    def __call__(self, shard_events: list) -> list:
+        max_workers = self._max_workers or len(shard_events)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(self._worker, event, None) for event in shard_events
+            ]
+            return [future.result() for future in futures]
+
+
+if __name__ == "__main__":
+    # Runs a full fan-out snapshot locally using a process pool instead of worker lambdas
+    import argparse
+    import os
+
+    import dotenv
+
+    from twitch_metrics_updater import coordinate_snapshot, handle_shard, setup_logging
+
+    dotenv.load_dotenv()
+    parser = argparse.ArgumentParser(description="Ingest a snapshot with local workers")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    logger = setup_logging()
+    logger.info(
+        "Manifest written to %s",
+        coordinate_snapshot(
+            logger,
+            LocalShardDispatcher(handle_shard, args.workers),
+            shard_count=args.workers,
+            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        ),
+    )
@@ -1,6 +1,9 @@
+import io
 import logging
 import json
+import pandas as pd
 import pytest
+from botocore.exceptions import ClientError
 from unittest.mock import Mock
 
 from aws_wrapper import AwsWrapper
@@ -41,3 +44,47 @@ class TestAWSWrapper:
             SecretId="fake_secret"
         )
         assert json.loads(secret_response["SecretString"]) == secret
+
+    def test___missing_object___read_json_from_s3___returns_none(self):
+        self.mock_session.client.return_value = self.mock_client
+        self.mock_client.get_object.side_effect = ClientError(
+            {"Error": {"Code": "NoSuchKey"}}, "GetObject"
+        )
+        aws_wrapper = AwsWrapper(
+            "region",
+            self.logger,
+            mock_session=self.mock_session
+        )
+
+        assert aws_wrapper.read_json_from_s3("s3://bucket/key.json") is None
+        self.mock_client.get_object.assert_called_once_with(
+            Bucket="bucket", Key="key.json"
+        )
+
+    def test___parquet_object___read_parquet_from_s3___returns_dataframe(self):
+        df = pd.DataFrame({"stream_id": ["1", "2"]})
+        self.mock_session.client.return_value = self.mock_client
+        self.mock_client.get_object.return_value = {"Body": io.BytesIO(df.to_parquet())}
+        aws_wrapper = AwsWrapper(
+            "region",
+            self.logger,
+            mock_session=self.mock_session
+        )
+
+        assert aws_wrapper.read_parquet_from_s3("s3://bucket/key.parquet").equals(df)
+
+    def test___read_timeout___invoke_lambda___disables_retries(self):
+        self.mock_session.client.return_value = self.mock_client
+        self.mock_client.invoke.return_value = {"Payload": io.BytesIO(b'{"statusCode": 200}')}
+        aws_wrapper = AwsWrapper(
+            "region",
+            self.logger,
+            mock_session=self.mock_session
+        )
+
+        result = aws_wrapper.invoke_lambda("worker", {"shard_id": 0}, read_timeout=630)
+
+        config = self.mock_session.client.call_args.kwargs["config"]
+        assert result == {"statusCode": 200}
+        assert config.read_timeout == 630
+        assert config.retries == {"max_attempts": 0}
@@ -0,0 +1,85 @@
+from datetime import date, datetime
+import logging
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+import backfill as backfill_module
+from backfill import backfill, clean_snapshots
+
+COLUMNS = ["stream_id", "user_id", "user_name", "game_id", "game_name", "viewer_count", "started_at", "timestamp"]
+
+
+def write_snapshot(source, timestamp, rows):
+    path = os.path.join(source, str(timestamp.year), str(timestamp.month), str(timestamp.day))
+    os.makedirs(path, exist_ok=True)
+    df = pd.DataFrame([row + [timestamp] for row in rows], columns=COLUMNS)
+    df.to_parquet(os.path.join(path, f"{timestamp:%Y-%m-%d_%H-%M-%S}.parquet"), index=False)
+
+
+class TestBackfill:
+    @pytest.fixture(autouse=True)
+    def setup_method(self, tmp_path):
+        self.logger = logging.getLogger("BackfillTest")
+        self.source = str(tmp_path / "source")
+        self.output = str(tmp_path / "output")
+        write_snapshot(self.source, datetime(2024, 10, 1, 12, 0), [
+            ["s1", "u1", "Streamer 1", "g1", "Game 1", 100, "2024-10-01T10:00:00Z"],
+            ["s2", "u2", "Streamer 2", "g2", "Game 2", 40, "2024-10-01T11:00:00Z"],
+        ])
+        write_snapshot(self.source, datetime(2024, 10, 2, 12, 0), [
+            ["s3", "u1", "Streamer 1", "g2", "Game 2", 200, "2024-10-02T10:00:00Z"],
+            ["s4", None, "Invalid", "g2", "Game 2", 1000, "2024-10-02T10:00:00Z"],
+            ["s5", "u3", "Invalid", "g2", "Game 2", 1000, "not a timestamp"],
+        ])
+
+    def test___invalid_rows___clean_snapshots___drops_rows_like_silver_table(self):
+        df = pd.DataFrame(
+            [
+                ["u1", "2024-10-01T10:00:00Z", datetime(2024, 10, 1)],
+                [None, "2024-10-01T10:00:00Z", datetime(2024, 10, 1)],
+                ["u2", "invalid", datetime(2024, 10, 1)],
+                ["u3", "2024-10-01T10:00:00Z", None],
+            ],
+            columns=["user_id", "started_at", "timestamp"],
+        )
+
+        assert clean_snapshots(df)["user_id"].tolist() == ["u1"]
+
+    def test___date_range___backfill___merges_partitions(self):
+        tables = backfill(
+            self.logger, self.source, self.output, date(2024, 10, 1), date(2024, 10, 3), workers=2
+        )
+
+        top_streamers = tables["top_streamers"].set_index("user_id")
+        top_games = tables["top_games"].set_index("game_id")
+        assert top_streamers.loc["u1", "hours_watched"] == 75
+        assert top_streamers.loc["u1", "max_viewers"] == 200
+        assert top_streamers.loc["u1", "rank_by_hours_watched"] == 1
+        assert top_games.loc["g2", "hours_watched"] == 60
+        assert top_games.loc["g2", "max_viewer_count"] == 200
+        assert tables["stream_metrics"]["total_viewers"].tolist() == [140, 200]
+        assert os.path.exists(os.path.join(self.output, "top_games.parquet"))
+
+    def test___already_processed___backfill___reuses_partial_results(self):
+        backfill(self.logger, self.source, self.output, date(2024, 10, 1), date(2024, 10, 2), workers=1)
+        shutil.rmtree(self.source)
+
+        tables = backfill(
+            self.logger, self.source, self.output, date(2024, 10, 1), date(2024, 10, 2), workers=1
+        )
+
+        assert tables["stream_metrics"]["total_viewers"].tolist() == [140, 200]
+
+    def test___logic_changed___backfill___reprocesses_days(self, monkeypatch):
+        backfill(self.logger, self.source, self.output, date(2024, 10, 1), date(2024, 10, 2), workers=1)
+        monkeypatch.setattr(backfill_module, "_logic_version", lambda: "changed")
+        shutil.rmtree(self.source)
+
+        tables = backfill(
+            self.logger, self.source, self.output, date(2024, 10, 1), date(2024, 10, 2), workers=1
+        )
+
+        assert tables["stream_metrics"].empty
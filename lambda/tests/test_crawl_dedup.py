@@ -0,0 +1,104 @@
+from unittest.mock import Mock
+
+import pandas as pd
+
+from crawl_dedup import StreamDeduplicator
+
+
+def page(*stream_ids, viewer_count=10):
+    return pd.DataFrame(
+        {"id": list(stream_ids), "viewer_count": [viewer_count] * len(stream_ids)}
+    )
+
+
+class TestStreamDeduplicator:
+    def test___stream_on_two_pages___add_page___drops_duplicate(self):
+        deduplicator = StreamDeduplicator()
+
+        first = deduplicator.add_page(page("1", "2"))
+        second = deduplicator.add_page(page("2", "3"), "cursor1")
+
+        assert first["id"].tolist() == ["1", "2"]
+        assert second["id"].tolist() == ["3"]
+        assert deduplicator.stats()["duplicates"] == 1
+        assert deduplicator.stats()["drifted_pages"] == 2
+
+    def test___invalid_stream_id___add_page___keeps_row(self):
+        deduplicator = StreamDeduplicator()
+
+        df = deduplicator.add_page(page(None, "abc", "1"))
+
+        assert len(df) == 3
+
+    def test___stream_repeated_in_page___add_page___keeps_first(self):
+        deduplicator = StreamDeduplicator()
+
+        df = deduplicator.add_page(page("1", "2", "1"))
+
+        assert df["id"].tolist() == ["1", "2"]
+
+    def test___more_viewers_than_previous_page___add_page___does_not_mark_drift(self):
+        deduplicator = StreamDeduplicator()
+        deduplicator.add_page(page("1", "2", viewer_count=50))
+
+        deduplicator.add_page(page("3", viewer_count=60), "cursor1")
+
+        assert deduplicator.stats()["drifted_pages"] == 0
+
+    def test___encoded_seen_stream_ids___init___drops_streams_seen_before_checkpoint(self):
+        crawled = StreamDeduplicator()
+        crawled.add_page(page("40000000001", "3", "40000000002"))
+
+        deduplicator = StreamDeduplicator(crawled.seen_stream_ids())
+
+        assert len(deduplicator) == 3
+        assert deduplicator.add_page(page("3", "40000000002", "5"))["id"].tolist() == ["5"]
+
+    def test___resumed_crawl___add_page___drops_streams_seen_before_checkpoint(self):
+        deduplicator = StreamDeduplicator([1])
+
+        df = deduplicator.add_page(page("1", "2"), "cursor5")
+
+        assert df["id"].tolist() == ["2"]
+
+    def test___drifted_pages___refetch_drifted___returns_only_new_streams(self):
+        deduplicator = StreamDeduplicator()
+        deduplicator.add_page(page("1", "2"))
+        deduplicator.add_page(page("2", "4"), "cursor1")
+        fake_twitch_wrapper = Mock()
+        fake_twitch_wrapper.get_stream_pages.side_effect = [
+            iter([(page("1", "3"), "cursor1")]),
+            iter([(page("3", "4"), None)]),
+        ]
+
+        recovered = deduplicator.refetch_drifted(fake_twitch_wrapper, max_pages=5)
+
+        assert [df["id"].tolist() for df in recovered] == [["3"]]
+        assert fake_twitch_wrapper.get_stream_pages.call_args_list[0].kwargs["after"] is None
+        assert fake_twitch_wrapper.get_stream_pages.call_args_list[1].kwargs["after"] == "cursor1"
+        assert deduplicator.stats()["recovered"] == 1
+
+    def test___max_pages___refetch_drifted___limits_requests(self):
+        deduplicator = StreamDeduplicator()
+        deduplicator.add_page(page("1"))
+        deduplicator.add_page(page("1"), "cursor1")
+        fake_twitch_wrapper = Mock()
+        fake_twitch_wrapper.get_stream_pages.return_value = iter([(page("2"), None)])
+
+        deduplicator.refetch_drifted(fake_twitch_wrapper, max_pages=1)
+
+        assert fake_twitch_wrapper.get_stream_pages.call_count == 1
+
+    def test___uneven_duplicates___refetch_drifted___fetches_most_duplicated_pages_first(self):
+        deduplicator = StreamDeduplicator()
+        deduplicator.add_page(page("1", "2", "3"))
+        deduplicator.add_page(page("3", "4"), "cursor1")
+        deduplicator.add_page(page("5", "6"), "cursor2")
+        deduplicator.add_page(page("5", "6", "7"), "cursor3")
+        fake_twitch_wrapper = Mock()
+        fake_twitch_wrapper.get_stream_pages.return_value = iter([])
+
+        deduplicator.refetch_drifted(fake_twitch_wrapper, max_pages=2)
+
+        afters = [call.kwargs["after"] for call in fake_twitch_wrapper.get_stream_pages.call_args_list]
+        assert afters == ["cursor2", "cursor3"]
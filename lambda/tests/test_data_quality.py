@@ -0,0 +1,59 @@
+import pandas as pd
+
+from data_quality import validate_snapshot
+
+
+class TestDataQuality:
+    def setup_method(self):
+        self.snapshot = pd.DataFrame(
+            {
+                "stream_id": ["1", "2", None, "4", "5"],
+                "user_id": ["a", " ", "c", "d", "e"],
+                "game_id": ["1", "1", "2", "2", "3"],
+                "viewer_count": [10, 20, 30, "many", 50],
+                "started_at": [
+                    "2024-10-01T10:00:00Z",
+                    "2024-10-01T10:00:00Z",
+                    "2024-10-01T10:00:00Z",
+                    "2024-10-01T10:00:00Z",
+                    "yesterday",
+                ],
+                "timestamp": pd.Timestamp("2024-10-01T12:00:00Z"),
+            }
+        )
+
+    def test___invalid_rows___validate_snapshot___quarantines_with_reason(self):
+        valid, quarantined, counts = validate_snapshot(self.snapshot)
+
+        assert valid["stream_id"].tolist() == ["1"]
+        assert quarantined["quarantine_reason"].tolist() == [
+            "missing_user_id",
+            "missing_stream_id",
+            "invalid_viewer_count",
+            "invalid_started_at",
+        ]
+        assert counts == {
+            "missing_stream_id": 1,
+            "missing_user_id": 1,
+            "invalid_started_at": 1,
+            "invalid_viewer_count": 1,
+        }
+
+    def test___valid_rows___validate_snapshot___types_columns(self):
+        valid, _, _ = validate_snapshot(self.snapshot)
+
+        assert valid["viewer_count"].dtype == "int64"
+        assert valid["user_id"].dtype == "string"
+
+    def test___missing_column___validate_snapshot___quarantines_every_row(self):
+        valid, quarantined, counts = validate_snapshot(self.snapshot.drop(columns="user_id"))
+
+        assert valid.empty
+        assert counts["missing_user_id"] == 5
+
+    def test___empty_snapshot___validate_snapshot___returns_empty(self):
+        valid, quarantined, counts = validate_snapshot(pd.DataFrame())
+
+        assert valid.empty
+        assert quarantined.empty
+        assert counts == {}
@@ -0,0 +1,61 @@
+from game_cache import GameCache
+
+
+class TestGameCache:
+    def test___cached_game___get_missing___returns_only_unknown_games(self):
+        cache = GameCache()
+        cache.update([{"id": "1", "name": "Game 1"}], now=0)
+
+        assert cache.get_missing(["1", "2"], now=0) == ["2"]
+
+    def test___expired_game___get_missing___returns_expired_game(self):
+        cache = GameCache(ttl_seconds=10)
+        cache.update([{"id": "1", "name": "Game 1"}], now=0)
+
+        assert cache.get_missing(["1"], now=11) == ["1"]
+
+    def test___missing_game___get_missing___skips_until_missing_ttl_expires(self):
+        cache = GameCache(ttl_seconds=100, missing_ttl_seconds=10)
+        cache.update_missing(["1"], now=0)
+
+        assert cache.get_missing(["1"], now=5) == []
+        assert cache.get("1", now=5) is None
+        assert cache.get_missing(["1"], now=11) == ["1"]
+
+    def test___cached_game_read___get_missing___does_not_mark_cache_modified(self):
+        cache = GameCache.from_dict({"games": [{"id": "1", "fetched_at": 0}]})
+
+        cache.get_missing(["1"], now=0)
+
+        assert not cache.modified
+
+    def test___more_games_than_max_size___from_dict___marks_cache_modified(self):
+        cache = GameCache.from_dict(
+            {"games": [{"id": "1", "fetched_at": 0}, {"id": "2", "fetched_at": 0}]}, max_size=1
+        )
+
+        assert "1" not in cache
+        assert cache.modified
+
+    def test___cache_full___update___evicts_least_recently_used(self):
+        cache = GameCache(max_size=2)
+        cache.update([{"id": "1"}, {"id": "2"}], now=0)
+        cache.get("1", now=0)
+
+        cache.update([{"id": "3"}], now=0)
+
+        assert "1" in cache
+        assert "2" not in cache
+        assert "3" in cache
+
+    def test___persisted_cache___from_dict___restores_games(self):
+        cache = GameCache()
+        cache.update([{"id": "1", "name": "Game 1"}], now=0)
+
+        restored = GameCache.from_dict(cache.to_dict())
+
+        assert not restored.modified
+        assert restored.get("1", now=0)["name"] == "Game 1"
+
+    def test___no_data___from_dict___returns_empty_cache(self):
+        assert len(GameCache.from_dict(None)) == 0
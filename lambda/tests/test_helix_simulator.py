@@ -0,0 +1,81 @@
+import logging
+import threading
+
+import pandas as pd
+import pytest
+import requests
+
+from helix_simulator import HelixSimulator, create_server
+from twitch_wrapper import TwitchWrapper
+
+
+@pytest.mark.withoutresponses
+class TestHelixSimulator:
+    @pytest.fixture(autouse=True)
+    def setup_method(self):
+        self.logger = logging.getLogger("HelixSimulatorTest")
+        self.credentials = {"client_id": "1234", "client_secret": "ABCD"}
+        self.servers = []
+        yield
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def start(self, simulator):
+        server = create_server(simulator, "127.0.0.1", 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}"
+
+    def create_wrapper(self, url):
+        return TwitchWrapper(
+            self.credentials,
+            self.logger,
+            api_url=f"{url}/helix",
+            auth_url=f"{url}/oauth2/token",
+        )
+
+    def test___no_churn___get_current_streams___returns_every_stream_once(self):
+        url = self.start(HelixSimulator(stream_count=250))
+
+        df = self.create_wrapper(url).get_current_streams()
+
+        assert len(df) == 250
+        assert df["id"].is_unique
+        assert df["viewer_count"].is_monotonic_decreasing
+
+    def test___language_filter___get_stream_pages___returns_only_languages(self):
+        url = self.start(HelixSimulator(stream_count=500))
+
+        pages = [df for df, _ in self.create_wrapper(url).get_stream_pages(languages=["en"])]
+
+        assert set(pages[0]["language"]) == {"en"}
+        assert sum(len(df) for df in pages) < 500
+
+    def test___churn___get_stream_pages___duplicates_streams(self):
+        url = self.start(HelixSimulator(stream_count=1000, churn=0.01, viewer_drift=0.2))
+
+        pages = [df for df, _ in self.create_wrapper(url).get_stream_pages()]
+
+        assert not pd.concat(pages)["id"].is_unique
+
+    def test___empty_bucket___get_streams___returns_rate_limited(self):
+        simulator = HelixSimulator(stream_count=10, rate_limit=1, refill_seconds=3600)
+        url = self.start(simulator)
+        headers = self.create_wrapper(url)._headers
+
+        first = requests.get(f"{url}/helix/streams", headers=headers)
+        second = requests.get(f"{url}/helix/streams", headers=headers)
+
+        assert first.status_code == 200
+        assert first.headers["Ratelimit-Limit"] == "1"
+        assert first.headers["Ratelimit-Remaining"] == "0"
+        assert second.status_code == 429
+        assert simulator.stats["rate_limited"] == 1
+
+    def test___missing_token___get_streams___returns_unauthorized(self):
+        url = self.start(HelixSimulator(stream_count=10))
+
+        response = requests.get(f"{url}/helix/streams")
+
+        assert response.status_code == 401
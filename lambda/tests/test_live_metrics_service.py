@@ -0,0 +1,167 @@
+from datetime import datetime, timedelta, timezone
+import json
+import logging
+import threading
+import urllib.request
+from unittest.mock import Mock
+
+import pandas as pd
+import pytest
+
+from live_metrics_service import LiveMetrics, create_server, poll
+from session_store import SessionStore
+from viewer_store import ViewerStore
+
+START = datetime(2024, 10, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def snapshot(rows):
+    return pd.DataFrame(
+        rows, columns=["stream_id", "user_id", "user_name", "game_id", "game_name", "viewer_count"]
+    )
+
+
+class TestLiveMetricsService:
+    @pytest.fixture(autouse=True)
+    def setup_method(self, tmp_path):
+        self.logger = logging.getLogger("LiveMetricsServiceTest")
+        self.metrics = LiveMetrics(ViewerStore(str(tmp_path / "store")))
+        self.metrics.add_snapshot(
+            snapshot([
+                ["s1", "u1", "Streamer 1", "g1", "Game 1", 100],
+                ["s2", "u2", "Streamer 2", "g2", "Game 2", 40],
+            ]),
+            START,
+            0.25,
+        )
+        self.metrics.add_snapshot(
+            snapshot([["s1", "u1", "Streamer 1", "g1", "Game 1", 200]]),
+            START + timedelta(minutes=15),
+            0.25,
+        )
+
+    def test___snapshots___get_view___returns_rolling_aggregates(self):
+        top_games = self.metrics.get_view("top_games_hour")
+        top_streamers = self.metrics.get_view("top_streamers_day")
+
+        assert top_games[0] == {
+            "game_id": "g1",
+            "game_name": "Game 1",
+            "hours_watched": 75,
+            "max_viewer_count": 200,
+            "max_streamers_count": 1,
+        }
+        assert [streamer["user_name"] for streamer in top_streamers] == ["Streamer 1", "Streamer 2"]
+        assert self.metrics.get_view("latest_stream_metrics") == [
+            {"total_viewers": 200, "total_streams": 1, "unique_games": 1}
+        ]
+        assert self.metrics.get_view("latest_stream_metrics_week")[0]["unique_games"] == 2
+
+    def test___old_snapshots___get_view___drops_snapshots_outside_window(self):
+        self.metrics.add_snapshot(
+            snapshot([["s3", "u3", "Streamer 3", "g3", "Game 3", 10]]),
+            START + timedelta(hours=2),
+            0.25,
+        )
+
+        assert [game["game_id"] for game in self.metrics.get_view("top_games_hour")] == ["g3"]
+        assert len(self.metrics.get_view("top_games_day")) == 3
+
+    def test___several_polls_in_bucket___get_view___averages_totals_per_poll(self):
+        metrics = LiveMetrics()
+        for minutes, viewers in [(0, 100), (5, 300)]:
+            metrics.add_snapshot(
+                snapshot([["s1", "u1", "Streamer 1", "g1", "Game 1", viewers]]),
+                START + timedelta(minutes=minutes),
+                5 / 60,
+            )
+
+        totals = metrics.get_view("latest_stream_metrics_hour")[0]
+
+        assert totals["total_viewers"] == 200
+        assert totals["total_streams"] == 1
+        assert totals["hours_watched"] == round(400 * 5 / 60)
+
+    def test___no_snapshot_yet___get_view___returns_empty_view(self):
+        metrics = LiveMetrics()
+
+        assert metrics.get_view("top_games_day") == []
+        assert metrics.get_view("latest_stream_metrics") == []
+        assert metrics.get_view("unknown") is None
+
+    def test___streamer_gone_for_a_week___get_viewers___forgets_streamer(self):
+        self.metrics.add_snapshot(
+            snapshot([["s1", "u1", "Streamer 1", "g1", "Game 1", 10]]),
+            START + timedelta(weeks=1, minutes=5),
+            0.25,
+        )
+
+        assert self.metrics.get_viewers("Streamer 2") == []
+        assert self.metrics.get_viewers("Streamer 1") != []
+
+    def test___streamer___get_viewers___returns_streamer_series(self):
+        assert self.metrics.get_viewers() == [
+            {"timestamp": "Oct 1 12:00", "total_viewers": 140},
+            {"timestamp": "Oct 1 12:15", "total_viewers": 200},
+        ]
+        assert [point["total_viewers"] for point in self.metrics.get_viewers("Streamer 2")] == [40, 0]
+        assert self.metrics.get_viewers("Unknown") == []
+
+    def test___running_server___get___serves_views_as_json(self):
+        server = create_server(self.metrics, "127.0.0.1", 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        try:
+            with urllib.request.urlopen(f"{url}/top_streamers_hour") as response:
+                top_streamers = json.load(response)
+            with urllib.request.urlopen(f"{url}/viewers?streamer=Streamer%201") as response:
+                viewers = json.load(response)
+            with pytest.raises(urllib.error.HTTPError):
+                urllib.request.urlopen(f"{url}/unknown")
+        finally:
+            server.shutdown()
+
+        assert top_streamers[0]["user_id"] == "u1"
+        assert [point["total_viewers"] for point in viewers] == [100, 200]
+
+    def test___session_store___add_snapshot___sessionizes_snapshot(self, tmp_path):
+        session_store = SessionStore(str(tmp_path / "sessions"))
+        metrics = LiveMetrics(session_store=session_store)
+
+        metrics.add_snapshot(snapshot([["s1", "u1", "Streamer 1", "g1", "Game 1", 100]]), START, 0.25)
+
+        sessions = session_store.open_sessions()
+        assert sessions["stream_id"].tolist() == ["s1"]
+        assert sessions["first_seen"].tolist() == [START]
+
+    def test___poll___adds_validated_snapshot(self):
+        metrics = LiveMetrics()
+        fake_twitch_wrapper = Mock()
+        fake_twitch_wrapper.get_current_streams.return_value = pd.DataFrame(
+            [["s1", "u1", "Streamer 1", "g1", "Game 1", 100, "2024-10-01T10:00:00Z"]],
+            columns=["id", "user_id", "user_name", "game_id", "game_name", "viewer_count", "started_at"],
+        )
+        stop_event = threading.Event()
+        stop_event.wait = lambda timeout: stop_event.set()
+
+        poll(self.logger, fake_twitch_wrapper, metrics, 60, stop_event)
+
+        assert metrics.get_view("latest_stream_metrics")[0]["total_viewers"] == 100
+
+    def test___polls___poll___uses_measured_interval(self):
+        metrics = Mock()
+        fake_twitch_wrapper = Mock()
+        fake_twitch_wrapper.get_current_streams.return_value = pd.DataFrame(
+            [["s1", "u1", "Streamer 1", "g1", "Game 1", 100, "2024-10-01T10:00:00Z"]],
+            columns=["id", "user_id", "user_name", "game_id", "game_name", "viewer_count", "started_at"],
+        )
+        stop_event = threading.Event()
+        waits = []
+        stop_event.wait = lambda timeout: waits.append(timeout) if not waits else stop_event.set()
+
+        poll(self.logger, fake_twitch_wrapper, metrics, 3600, stop_event)
+
+        first, second = [call[0][2] for call in metrics.add_snapshot.call_args_list]
+        assert first == 1
+        assert second < 0.01
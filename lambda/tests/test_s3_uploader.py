@@ -0,0 +1,127 @@
+import io
+import logging
+import boto3
+from botocore.exceptions import ClientError
+from moto import mock_aws
+import pandas as pd
+import pytest
+from unittest.mock import Mock
+
+import s3_uploader
+from s3_uploader import MIN_PART_SIZE_BYTES, ChecksumMismatchError, S3Uploader
+
+BUCKET = "test-bucket"
+
+
+def client_error(code, status):
+    return ClientError(
+        {"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}}, "PutObject"
+    )
+
+
+class TestS3Uploader:
+    @pytest.fixture(autouse=True)
+    def setup_method(self, monkeypatch):
+        monkeypatch.setattr(s3_uploader, "BACKOFF_BASE_SECONDS", 0)
+        self.logger = logging.getLogger("S3UploaderTest")
+        with mock_aws():
+            self.s3_client = boto3.client("s3", region_name="us-east-1")
+            self.s3_client.create_bucket(Bucket=BUCKET)
+            yield
+
+    def _read(self, key):
+        return self.s3_client.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+
+    def test___dataframe___submit_parquet___uploads_in_background(self):
+        df = pd.DataFrame({"stream_id": ["1", "2"], "viewer_count": [10, 20]})
+
+        with S3Uploader(self.s3_client, self.logger) as uploader:
+            future = uploader.submit_parquet(df, f"s3://{BUCKET}/2024/10/1/snapshot.parquet")
+
+        assert future.done()
+        assert pd.read_parquet(io.BytesIO(self._read("2024/10/1/snapshot.parquet"))).equals(df)
+
+    def test___larger_than_part___upload_bytes___uses_multipart_upload(self):
+        data = b"a" * MIN_PART_SIZE_BYTES + b"b" * 100
+        uploader = S3Uploader(self.s3_client, self.logger, part_size=MIN_PART_SIZE_BYTES)
+
+        etag = uploader.upload_bytes(data, f"s3://{BUCKET}/large")
+
+        assert etag.strip('"').endswith("-2")
+        assert self._read("large") == data
+
+    def test___sse_kms_bucket___upload_bytes___verifies_checksum(self):
+        self.s3_client.put_bucket_encryption(
+            Bucket=BUCKET,
+            ServerSideEncryptionConfiguration={
+                "Rules": [{"ApplyServerSideEncryptionByDefault": {"SSEAlgorithm": "aws:kms"}}]
+            },
+        )
+        uploader = S3Uploader(self.s3_client, self.logger)
+
+        uploader.upload_bytes(b"data", f"s3://{BUCKET}/encrypted")
+
+        assert self._read("encrypted") == b"data"
+
+    def test___transient_failure___upload_bytes___retries(self):
+        fake_client = Mock()
+        fake_client.put_object.side_effect = self._fail_once(self.s3_client.put_object)
+        uploader = S3Uploader(fake_client, self.logger)
+
+        uploader.upload_bytes(b"data", f"s3://{BUCKET}/retried")
+
+        assert fake_client.put_object.call_count == 2
+        assert self._read("retried") == b"data"
+
+    def test___checksum_mismatch___upload_bytes___raises_without_retry(self):
+        fake_client = Mock()
+        fake_client.put_object.return_value = {"ETag": '"etag"', "ChecksumSHA256": "not-the-sha256"}
+        uploader = S3Uploader(fake_client, self.logger, max_attempts=2)
+
+        with pytest.raises(ChecksumMismatchError):
+            uploader.upload_bytes(b"data", f"s3://{BUCKET}/corrupt")
+
+        assert fake_client.put_object.call_count == 1
+
+    def test___access_denied___upload_bytes___raises_without_retry(self):
+        fake_client = Mock()
+        fake_client.put_object.side_effect = client_error("AccessDenied", 403)
+        uploader = S3Uploader(fake_client, self.logger)
+
+        with pytest.raises(ClientError):
+            uploader.upload_bytes(b"data", f"s3://{BUCKET}/denied")
+
+        assert fake_client.put_object.call_count == 1
+
+    def test___abort_fails___upload_bytes___raises_original_error(self):
+        fake_client = Mock()
+        fake_client.create_multipart_upload.return_value = {"UploadId": "1"}
+        fake_client.upload_part.side_effect = client_error("NoSuchBucket", 404)
+        fake_client.abort_multipart_upload.side_effect = client_error("NoSuchUpload", 404)
+        uploader = S3Uploader(fake_client, self.logger, part_size=MIN_PART_SIZE_BYTES)
+
+        with pytest.raises(ClientError, match="NoSuchBucket"):
+            uploader.upload_bytes(b"a" * (MIN_PART_SIZE_BYTES + 1), f"s3://{BUCKET}/large")
+
+        fake_client.abort_multipart_upload.assert_called_once()
+
+    def test___failed_upload___wait___raises_error(self):
+        fake_client = Mock()
+        fake_client.put_object.side_effect = Exception("AccessDenied")
+        uploader = S3Uploader(fake_client, self.logger, max_attempts=1)
+
+        uploader.submit_parquet(pd.DataFrame({"a": [1]}), f"s3://{BUCKET}/denied")
+
+        with pytest.raises(Exception, match="AccessDenied"):
+            uploader.wait()
+
+    def _fail_once(self, function):
+        calls = []
+
+        def side_effect(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise client_error("SlowDown", 503)
+            return function(**kwargs)
+
+        return side_effect
@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+
+from session_store import SessionStore
+
+START = datetime(2024, 10, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def snapshot(minutes, streams):
+    return pd.DataFrame(
+        [
+            {
+                "stream_id": stream_id,
+                "user_id": f"user{stream_id}",
+                "user_name": f"Streamer {stream_id}",
+                "game_id": game_id,
+                "started_at": "2024-10-01T11:55:00Z",
+                "viewer_count": viewer_count,
+            }
+            for stream_id, (viewer_count, game_id) in streams.items()
+        ]
+    ).assign(timestamp=START + timedelta(minutes=minutes))
+
+
+class TestSessionStore:
+    @pytest.fixture(autouse=True)
+    def setup_method(self, tmp_path):
+        self.directory = str(tmp_path / "sessions")
+
+    def test___stream_in_snapshots___add_snapshot___updates_open_session(self):
+        store = SessionStore(self.directory)
+        store.add_snapshot(snapshot(0, {"1": (10, "g1")}))
+        store.add_snapshot(snapshot(15, {"1": (30, "g2")}))
+
+        session = store.open_sessions().iloc[0]
+
+        assert session["stream_id"] == "1"
+        assert session["snapshots"] == 2
+        assert session["avg_viewers"] == 20
+        assert session["peak_viewers"] == 30
+        assert session["game_switches"] == 1
+        assert session["game_id"] == "g2"
+        assert session["duration_minutes"] == 30
+
+    def test___snapshot_seconds___open_sessions___counts_each_snapshot_for_interval(self):
+        store = SessionStore(self.directory, snapshot_seconds=5 * 60)
+        store.add_snapshot(snapshot(0, {"1": (10, "g1")}))
+        store.add_snapshot(snapshot(5, {"1": (30, "g1")}))
+        store.add_snapshot(snapshot(15, {"1": (30, "g1")}))
+
+        session = store.open_sessions().iloc[0]
+
+        assert session["snapshots"] == 3
+        assert session["duration_minutes"] == 20
+
+    def test___stream_missing_longer_than_gap___add_snapshot___closes_session(self):
+        store = SessionStore(self.directory)
+        store.add_snapshot(snapshot(0, {"1": (10, "g1"), "2": (5, "g1")}))
+        store.add_snapshot(snapshot(15, {"2": (5, "g1")}))
+        still_open = store.add_snapshot(snapshot(30, {"2": (5, "g1")}))
+
+        closed = store.add_snapshot(snapshot(45, {"2": (5, "g1")}))
+
+        assert still_open.empty
+        assert closed["stream_id"].tolist() == ["1"]
+        assert store.read_sessions()["stream_id"].tolist() == ["1"]
+        assert store.open_sessions()["stream_id"].tolist() == ["2"]
+
+    def test___stream_returns_after_gap___read_sessions___keeps_both_sessions(self):
+        store = SessionStore(self.directory)
+        store.add_snapshot(snapshot(0, {"1": (10, "g1")}))
+        store.add_snapshot(snapshot(45, {"2": (5, "g1")}))
+        store.add_snapshot(snapshot(60, {"1": (20, "g1")}))
+
+        store.add_snapshot(snapshot(105, {"2": (5, "g1")}))
+
+        sessions = store.read_sessions()
+        assert sessions["stream_id"].tolist() == ["1", "1"]
+        assert sessions["avg_viewers"].tolist() == [10, 20]
+        assert sessions["first_seen"].tolist() == [
+            START, START + timedelta(minutes=60)
+        ]
+
+    def test___snapshot_parts___add_snapshot___counts_stream_once(self):
+        store = SessionStore(self.directory)
+        store.add_snapshot(snapshot(0, {"1": (10, "g1")}))
+        store.add_snapshot(snapshot(15, {"1": (10, "g1")}))
+        store.add_snapshot(snapshot(15, {"2": (10, "g1")}))
+
+        sessions = store.open_sessions().set_index("stream_id")
+
+        assert sessions.loc["1", "snapshots"] == 2
+        assert sessions.loc["2", "snapshots"] == 1
+
+    def test___older_snapshot___add_snapshot___is_ignored(self):
+        store = SessionStore(self.directory)
+        store.add_snapshot(snapshot(15, {"1": (10, "g1")}))
+
+        store.add_snapshot(snapshot(0, {"2": (10, "g1")}))
+
+        assert len(store) == 1
+
+    def test___reopened_store___add_snapshot___continues_sessions(self):
+        SessionStore(self.directory).add_snapshot(snapshot(0, {"1": (10, "g1")}))
+
+        store = SessionStore(self.directory)
+        store.add_snapshot(snapshot(15, {"1": (20, "g1")}))
+
+        assert store.open_sessions().iloc[0]["snapshots"] == 2
+
+    def test___closed_and_open_sessions___streamer_stats___aggregates_per_streamer(self):
+        store = SessionStore(self.directory)
+        store.add_snapshot(snapshot(0, {"1": (10, "g1")}))
+        store.add_snapshot(snapshot(60, {"2": (40, "g1")}))
+
+        stats = store.streamer_stats().set_index("user_id")
+
+        assert stats.loc["user1", "sessions"] == 1
+        assert stats.loc["user2", "peak_viewers"] == 40
+        assert stats.loc["user2", "total_minutes"] == 15
@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+from unittest.mock import Mock
+
+from shard_dispatcher import (
+    STREAM_LANGUAGES,
+    LambdaShardDispatcher,
+    LocalShardDispatcher,
+    build_language_shards,
+    count_languages,
+)
+
+
+def fake_worker(event, context):
+    return {"statusCode": 200, "body": {"shard_id": event["shard_id"]}}
+
+
+class TestShardDispatcher:
+    @pytest.mark.parametrize("shard_count", [1, 3, 8, 100])
+    def test___shard_count___build_language_shards___covers_each_language_once(self, shard_count):
+        shards = build_language_shards(shard_count)
+
+        languages = [language for shard in shards for language in shard]
+        assert sorted(languages) == sorted(STREAM_LANGUAGES)
+        assert len(shards) == min(shard_count, len(STREAM_LANGUAGES))
+
+    def test___multiple_shards___build_language_shards___spreads_largest_languages(self):
+        shards = build_language_shards(2)
+
+        assert shards[0][0] == "en"
+        assert shards[1][0] == "es"
+
+    def test___stream_counts___build_language_shards___balances_streams(self):
+        stream_counts = {"en": 100, "es": 40, "ja": 30, "pt": 30, "de": 5}
+
+        shards = build_language_shards(2, stream_counts)
+
+        totals = [sum(stream_counts.get(language, 0) for language in shard) for shard in shards]
+        assert sorted(language for shard in shards for language in shard) == sorted(STREAM_LANGUAGES)
+        assert max(totals) - min(totals) <= 5
+
+    def test___unsupported_language___count_languages___counts_as_other(self):
+        live_streams = pd.DataFrame({"language": ["en", "en", "xx", "other"]})
+
+        assert count_languages(live_streams) == {"en": 2, "other": 2}
+
+    def test___shard_events___lambda_dispatcher___invokes_worker_per_shard(self):
+        fake_aws_wrapper = Mock()
+        fake_aws_wrapper.invoke_lambda.side_effect = (
+            lambda name, event, read_timeout: fake_worker(event, None)
+        )
+        dispatcher = LambdaShardDispatcher("worker", fake_aws_wrapper, worker_timeout=600)
+
+        responses = dispatcher([{"shard_id": 0}, {"shard_id": 1}])
+
+        assert [response["body"]["shard_id"] for response in responses] == [0, 1]
+        assert fake_aws_wrapper.invoke_lambda.call_count == 2
+        assert fake_aws_wrapper.invoke_lambda.call_args[0][2] > 600
+
+    def test___shard_events___local_dispatcher___returns_responses_in_order(self):
+        dispatcher = LocalShardDispatcher(fake_worker, max_workers=2)
+
+        responses = dispatcher([{"shard_id": i} for i in range(4)])
+
+        assert [response["body"]["shard_id"] for response in responses] == [0, 1, 2, 3]
@@ -2,9 +2,32 @@ import logging
 import pandas as pd
 import pytest
 import re
+import twitch_metrics_updater
 from unittest.mock import Mock
 
-from twitch_metrics_updater import handle, update_twitch_metrics
+from crawl_dedup import StreamDeduplicator
+from twitch_metrics_updater import (
+    CHECKPOINT_FILE,
+    HEAD_SAMPLE_FOLDER,
+    LANGUAGE_COUNTS_FILE,
+    MANIFEST_FOLDER,
+    QUARANTINE_FOLDER,
+    STAGING_FOLDER,
+    coordinate_snapshot,
+    crawl_shard,
+    handle,
+    handle_shard,
+    setup_logging,
+    update_twitch_metrics,
+)
+
+
+def stream_page(stream_id, viewer_count=10):
+    return pd.DataFrame(
+        [[stream_id, f"user{stream_id}", "game", viewer_count, "2024-10-01T10:00:00Z"]],
+        columns=["id", "user_id", "game_id", "viewer_count", "started_at"],
+    )
+
 
 class TestTwitchMetricsUpdater:
     @pytest.fixture(autouse=True)
@@ -36,16 +59,21 @@ class TestTwitchMetricsUpdater:
 
         assert response["statusCode"] == 500
 
+    def test___head_pages_event___handle___passes_head_pages(self):
+        fake_updater_function = Mock()
+
+        handle({"head_pages": 5}, None, update_function=fake_updater_function)
+
+        assert fake_updater_function.call_args.kwargs["head_pages"] == 5
+
     def test___twitch_streams___handle____writes_to_s3_path(self):
-        fake_data = [
-            ["12345", "other_data"]
-        ]
-        twitch_data = pd.DataFrame(fake_data, columns=["id", "other_column"])
+        twitch_data = stream_page("12345").assign(other_column="other_data")
         fake_bucket = "fakeBucket/"
         fake_aws_wrapper = Mock()
+        fake_aws_wrapper.read_json_from_s3.return_value = None
         fake_twitch_wrapper = Mock()
-        fake_twitch_wrapper.get_current_streams.return_value = twitch_data
-        
+        fake_twitch_wrapper.get_stream_pages.return_value = iter([(twitch_data, None)])
+
         update_twitch_metrics(
             self.logger,
             aws_access_key_id=None,
@@ -54,9 +82,344 @@ class TestTwitchMetricsUpdater:
             s3_bucket_path=fake_bucket,
             twitch_wrapper=fake_twitch_wrapper)
 
-        args = fake_aws_wrapper.write_parquet_to_s3.call_args
+        args = fake_aws_wrapper.upload_parquet.call_args
         # s3_bucket/YYYY/MM/DD/%Y-%m-%d_%H-%M-%S.parquet
         pattern = rf'^{re.escape(fake_bucket)}(\d{{4}})/(\d{{1,2}})/(\d{{1,2}})/(\d{{4}}-\d{{2}}-\d{{2}}_\d{{2}}-\d{{2}}-\d{{2}})\.parquet$'
-        assert "stream_id" in args[0][0].columns
+        assert fake_aws_wrapper.upload_parquet.call_count == 1
+        assert args[0][0]["stream_id"].tolist() == ["12345"]
+        assert args[0][0]["other_column"].tolist() == ["other_data"]
         assert "timestamp" in args[0][0].columns
         assert re.match(pattern, args[0][1])
+
+
+    def test___near_deadline___update_twitch_metrics___writes_part_and_checkpoint(self):
+        page_1 = stream_page("1", 100)
+        page_2 = stream_page("2", 50)
+        fake_bucket = "s3://fakeBucket/"
+        fake_aws_wrapper = Mock()
+        fake_aws_wrapper.read_json_from_s3.return_value = None
+        fake_twitch_wrapper = Mock()
+        fake_twitch_wrapper.get_stream_pages.return_value = iter(
+            [(page_1, "cursor1"), (page_2, None)]
+        )
+        fake_context = Mock()
+        fake_context.get_remaining_time_in_millis.return_value = 1000
+
+        file_path = update_twitch_metrics(
+            self.logger,
+            aws_session=fake_aws_wrapper,
+            s3_bucket_path=fake_bucket,
+            twitch_wrapper=fake_twitch_wrapper,
+            context=fake_context)
+
+        written_df = fake_aws_wrapper.upload_parquet.call_args[0][0]
+        checkpoint, checkpoint_path = fake_aws_wrapper.write_json_to_s3.call_args[0]
+        assert written_df["stream_id"].tolist() == ["1"]
+        assert file_path.startswith(f"{fake_bucket}{STAGING_FOLDER}")
+        assert file_path.endswith("/part0.parquet")
+        assert checkpoint_path == f"{fake_bucket}{CHECKPOINT_FILE}"
+        assert checkpoint["cursor"] == "cursor1"
+        assert checkpoint["part"] == 1
+        assert StreamDeduplicator(checkpoint["seen_stream_ids"]).add_page(page_1).empty
+        fake_twitch_wrapper.enrich_games.assert_not_called()
+
+    def test___more_than_flush_pages___update_twitch_metrics___publishes_single_snapshot(self, monkeypatch):
+        monkeypatch.setattr(twitch_metrics_updater, "FLUSH_PAGES", 2)
+        pages = [
+            (stream_page(str(i)), f"cursor{i}" if i < 4 else None)
+            for i in range(5)
+        ]
+        fake_bucket = "s3://fakeBucket/"
+        fake_aws_wrapper = Mock()
+        fake_aws_wrapper.read_json_from_s3.return_value = None
+        fake_twitch_wrapper = Mock()
+        fake_twitch_wrapper.get_stream_pages.return_value = iter(pages)
+
+        file_path = update_twitch_metrics(
+            self.logger,
+            aws_session=fake_aws_wrapper,
+            s3_bucket_path=fake_bucket,
+            twitch_wrapper=fake_twitch_wrapper)
+
+        written_df, written_path = fake_aws_wrapper.upload_parquet.call_args[0]
+        assert fake_aws_wrapper.upload_parquet.call_count == 1
+        assert written_df["stream_id"].tolist() == ["0", "1", "2", "3", "4"]
+        assert written_path == file_path
+        assert not file_path.endswith("_part0.parquet")
+        fake_aws_wrapper.read_parquet_from_s3.assert_not_called()
+        assert len(fake_twitch_wrapper.enrich_games.call_args[0][0]) == 5
+
+    def test___failure_after_flush___update_twitch_metrics___publishes_nothing(self, monkeypatch):
+        monkeypatch.setattr(twitch_metrics_updater, "FLUSH_PAGES", 1)
+
+        def failing_crawl():
+            yield stream_page("1"), "cursor1"
+            raise TimeoutError()
+
+        fake_bucket = "s3://fakeBucket/"
+        fake_aws_wrapper = Mock()
+        fake_aws_wrapper.read_json_from_s3.return_value = None
+        fake_twitch_wrapper = Mock()
+        fake_twitch_wrapper.get_stream_pages.return_value = failing_crawl()
+
+        with pytest.raises(TimeoutError):
+            update_twitch_metrics(
+                self.logger,
+                aws_session=fake_aws_wrapper,
+                s3_bucket_path=fake_bucket,
+                twitch_wrapper=fake_twitch_wrapper)
+
+        fake_aws_wrapper.upload_parquet.assert_not_called()
+
+    def test___stream_moved_pages___update_twitch_metrics___drops_duplicate_and_refetches(self, monkeypatch):
+        monkeypatch.setattr(twitch_metrics_updater, "REFETCH_DRIFTED_PAGES", 2)
+        crawl = iter([(stream_page("1"), "cursor1"), (stream_page("1"), None)])
+        refetched_first_page = iter([(stream_page("2"), "cursor1")])
+        fake_aws_wrapper = Mock()
+        fake_aws_wrapper.read_json_from_s3.return_value = None
+        fake_twitch_wrapper = Mock()
+        fake_twitch_wrapper.get_stream_pages.side_effect = [
+            crawl, refetched_first_page, iter([])
+        ]
+
+        update_twitch_metrics(
+            self.logger,
+            aws_session=fake_aws_wrapper,
+            s3_bucket_path="s3://fakeBucket/",
+            twitch_wrapper=fake_twitch_wrapper)
+
+        written_df = fake_aws_wrapper.upload_parquet.call_args[0][0]
+        assert written_df["stream_id"].tolist() == ["1", "2"]
+
+    def test___checkpoint_exists___update_twitch_metrics___publishes_staged_parts_with_snapshot(self):
+        page = stream_page("2", 50)
+        fake_bucket = "s3://fakeBucket/"
+        staged_path = f"{fake_bucket}{STAGING_FOLDER}2024-10-01_12-15-00/part0.parquet"
+        fake_aws_wrapper = Mock()
+        fake_aws_wrapper.read_json_from_s3.return_value = {
+            "snapshot_time": "2024-10-01T12:15:00-05:00",
+            "cursor": "cursor1",
+            "part": 1,
+        }
+        fake_aws_wrapper.read_parquet_from_s3.return_value = stream_page("1", 100).rename(
+            columns={"id": "stream_id"}
+        )
+        fake_twitch_wrapper = Mock()
+        fake_twitch_wrapper.get_stream_pages.return_value = iter([(page, None)])
+
+        file_path = update_twitch_metrics(
+            self.logger,
+            aws_session=fake_aws_wrapper,
+            s3_bucket_path=fake_bucket,
+            twitch_wrapper=fake_twitch_wrapper)
+
+        written_df = fake_aws_wrapper.upload_parquet.call_args[0][0]
+        fake_twitch_wrapper.get_stream_pages.assert_called_once_with(after="cursor1")
+        fake_aws_wrapper.read_parquet_from_s3.assert_called_once_with(staged_path)
+        assert file_path == f"{fake_bucket}2024/10/1/2024-10-01_12-15-00.parquet"
+        assert written_df["stream_id"].tolist() == ["1", "2"]
+        assert written_df["timestamp"].iloc[-1].isoformat() == "2024-10-01T12:15:00-05:00"
+        fake_aws_wrapper.write_json_to_s3.assert_not_called()
+        deleted = [call[0][0] for call in fake_aws_wrapper.delete_from_s3.call_args_list]
+        assert deleted == [f"{fake_bucket}{CHECKPOINT_FILE}", staged_path]
+
+    def test___shard_event___crawl_shard___stages_shard_languages(self):
+        page = stream_page("1", 100)
+        fake_bucket = "s3://fakeBucket/"
+        fake_aws_wrapper = Mock()
+        fake_twitch_wrapper = Mock()
+        fake_twitch_wrapper.get_stream_pages.return_value = iter([(page, None)])
+        shard_event = {
+            "snapshot_time": "2024-10-01T12:15:00-05:00",
+            "shard_id": 2,
+            "languages": ["de", "fr"],
+        }
+
+        result = crawl_shard(
+            self.logger,
+            shard_event,
+            s3_bucket_path=fake_bucket,
+            aws_session=fake_aws_wrapper,
+            twitch_wrapper=fake_twitch_wrapper)
+
+        fake_twitch_wrapper.get_stream_pages.assert_called_once_with(languages=["de", "fr"])
+        assert result == {
+            "shard_id": 2,
+            "path": f"{fake_bucket}_staging/2024-10-01_12-15-00/shard2.parquet",
+            "rows": 1,
+            "language_counts": {},
+        }
+
+    def test___fail___handle_shard___return_fail_status(self):
+        fake_shard_function = Mock()
+        fake_shard_function.side_effect = Exception()
+
+        response = handle_shard({}, None, shard_function=fake_shard_function)
+
+        assert response["statusCode"] == 500
+
+    def test___all_shards_staged___coordinate_snapshot___commits_manifest(self):
+        fake_bucket = "s3://fakeBucket/"
+        fake_aws_wrapper = Mock()
+        fake_aws_wrapper.read_json_from_s3.return_value = None
+        fake_aws_wrapper.read_parquet_from_s3.side_effect = lambda path: pd.DataFrame(
+            {"stream_id": [path[-1]], "language": ["en" if path != "staged2" else "xx"]}
+        )
+
+        def fake_dispatcher(shard_events):
+            return [
+                {
+                    "statusCode": 200,
+                    "body": {"shard_id": event["shard_id"], "path": f"staged{event['shard_id']}", "rows": 10},
+                }
+                for event in shard_events
+            ]
+
+        manifest_path = coordinate_snapshot(
+            self.logger,
+            fake_dispatcher,
+            shard_count=3,
+            s3_bucket_path=fake_bucket,
+            aws_session=fake_aws_wrapper)
+
+        (manifest, written_path), (language_counts, language_counts_path) = [
+            call[0] for call in fake_aws_wrapper.write_json_to_s3.call_args_list
+        ]
+        read = [call[0][0] for call in fake_aws_wrapper.read_parquet_from_s3.call_args_list]
+        written_df, file_path = fake_aws_wrapper.write_parquet_to_s3.call_args[0][:2]
+        deleted = [call[0][0] for call in fake_aws_wrapper.delete_from_s3.call_args_list]
+        assert written_path == manifest_path
+        assert manifest_path.startswith(f"{fake_bucket}{MANIFEST_FOLDER}")
+        assert read == ["staged0", "staged1", "staged2"]
+        assert written_df["stream_id"].tolist() == ["0", "1", "2"]
+        assert manifest["path"] == file_path
+        assert manifest["rows"] == 3
+        assert deleted == ["staged0", "staged1", "staged2"]
+        assert language_counts_path == f"{fake_bucket}{LANGUAGE_COUNTS_FILE}"
+        assert language_counts == {"en": 2, "other": 1}
+
+    def test___language_counts___coordinate_snapshot___balances_shards(self):
+        fake_aws_wrapper = Mock()
+        fake_aws_wrapper.read_json_from_s3.return_value = {"en": 100, "es": 40, "ja": 30, "pt": 30}
+        fake_dispatcher = Mock(side_effect=lambda events: [{"statusCode": 500} for _ in events])
+
+        with pytest.raises(RuntimeError):
+            coordinate_snapshot(
+                self.logger,
+                fake_dispatcher,
+                shard_count=2,
+                s3_bucket_path="s3://fakeBucket/",
+                aws_session=fake_aws_wrapper)
+
+        shard_events = fake_dispatcher.call_args[0][0]
+        fake_aws_wrapper.read_json_from_s3.assert_called_once_with(
+            f"s3://fakeBucket/{LANGUAGE_COUNTS_FILE}"
+        )
+        assert shard_events[0]["languages"][0] == "en"
+        assert shard_events[1]["languages"][:3] == ["es", "ja", "pt"]
+
+    def test___failed_shard___coordinate_snapshot___does_not_commit(self):
+        fake_aws_wrapper = Mock()
+        fake_aws_wrapper.read_json_from_s3.return_value = None
+
+        def fake_dispatcher(shard_events):
+            return [{"statusCode": 500, "body": "failed"} for _ in shard_events]
+
+        with pytest.raises(RuntimeError):
+            coordinate_snapshot(
+                self.logger,
+                fake_dispatcher,
+                shard_count=2,
+                s3_bucket_path="s3://fakeBucket/",
+                aws_session=fake_aws_wrapper)
+
+        fake_aws_wrapper.write_parquet_to_s3.assert_not_called()
+        fake_aws_wrapper.write_json_to_s3.assert_not_called()
+        deleted = [call[0][0] for call in fake_aws_wrapper.delete_from_s3.call_args_list]
+        assert len(deleted) == 2
+        assert all(f"/{STAGING_FOLDER}" in path for path in deleted)
+
+    def test___dispatcher_raises___coordinate_snapshot___deletes_staged_shards(self):
+        fake_aws_wrapper = Mock()
+        fake_aws_wrapper.read_json_from_s3.return_value = None
+
+        def fake_dispatcher(shard_events):
+            raise TimeoutError("worker timed out")
+
+        with pytest.raises(TimeoutError):
+            coordinate_snapshot(
+                self.logger,
+                fake_dispatcher,
+                shard_count=3,
+                s3_bucket_path="s3://fakeBucket/",
+                aws_session=fake_aws_wrapper)
+
+        deleted = [call[0][0] for call in fake_aws_wrapper.delete_from_s3.call_args_list]
+        assert [path.rsplit("/", 1)[1] for path in deleted] == [
+            "shard0.parquet", "shard1.parquet", "shard2.parquet"
+        ]
+
+    def test___head_pages___update_twitch_metrics___samples_first_pages(self):
+        pages = [
+            (stream_page(str(i), 100 - i), f"cursor{i}")
+            for i in range(5)
+        ]
+        fake_bucket = "s3://fakeBucket/"
+        fake_aws_wrapper = Mock()
+        fake_twitch_wrapper = Mock()
+        fake_twitch_wrapper.get_stream_pages.return_value = iter(pages)
+
+        file_path = update_twitch_metrics(
+            self.logger,
+            aws_session=fake_aws_wrapper,
+            s3_bucket_path=fake_bucket,
+            twitch_wrapper=fake_twitch_wrapper,
+            head_pages=2)
+
+        written_df = fake_aws_wrapper.write_parquet_to_s3.call_args[0][0]
+        assert written_df["stream_id"].tolist() == ["0", "1"]
+        assert file_path.startswith(f"{fake_bucket}{HEAD_SAMPLE_FOLDER}")
+        fake_aws_wrapper.read_json_from_s3.assert_not_called()
+        fake_aws_wrapper.write_json_to_s3.assert_not_called()
+
+    def test___invalid_rows___update_twitch_metrics___quarantines_rows(self):
+        page = pd.concat(
+            [stream_page("1"), stream_page("2").assign(started_at="not a timestamp")],
+            ignore_index=True,
+        )
+        fake_bucket = "s3://fakeBucket/"
+        fake_aws_wrapper = Mock()
+        fake_aws_wrapper.read_json_from_s3.return_value = None
+        fake_twitch_wrapper = Mock()
+        fake_twitch_wrapper.get_stream_pages.return_value = iter([(page, None)])
+
+        file_path = update_twitch_metrics(
+            self.logger,
+            aws_session=fake_aws_wrapper,
+            s3_bucket_path=fake_bucket,
+            twitch_wrapper=fake_twitch_wrapper)
+
+        (quarantined, quarantine_path), (written_df, written_path) = [
+            upload[0] for upload in fake_aws_wrapper.upload_parquet.call_args_list
+        ]
+        assert written_path == file_path
+        assert written_df["stream_id"].tolist() == ["1"]
+        assert quarantine_path.startswith(f"{fake_bucket}{QUARANTINE_FOLDER}")
+        assert quarantined["stream_id"].tolist() == ["2"]
+        assert quarantined["quarantine_reason"].tolist() == ["invalid_started_at"]
+
+    def test___warm_invocation___create_twitch_wrapper___reuses_wrapper(self, monkeypatch):
+        monkeypatch.setattr(twitch_metrics_updater, "_twitch_wrapper", None)
+        monkeypatch.setattr(twitch_metrics_updater, "TwitchWrapper", Mock())
+        fake_aws_wrapper = Mock()
+
+        first = twitch_metrics_updater._create_twitch_wrapper(self.logger, fake_aws_wrapper)
+        second = twitch_metrics_updater._create_twitch_wrapper(self.logger, fake_aws_wrapper)
+
+        assert first is second
+        fake_aws_wrapper.get_credentials.assert_called_once()
+
+    def test___called_twice___setup_logging___adds_one_handler(self):
+        setup_logging()
+
+        assert len(setup_logging().handlers) == 1
@@ -1,8 +1,14 @@
 import logging
 import pandas as pd
 import pytest
+import time
 
-from twitch_wrapper import TwitchWrapper, AUTH_ENDPOINT, STREAM_ENDPOINT
+import twitch_wrapper
+from game_cache import GameCache
+from twitch_wrapper import TwitchWrapper, API_URL, AUTH_ENDPOINT
+
+STREAM_ENDPOINT = f"{API_URL}/streams"
+GAMES_ENDPOINT = f"{API_URL}/games"
 
 class TestTwitchWrapper:
     @pytest.fixture(autouse=True)
@@ -119,3 +125,122 @@ class TestTwitchWrapper:
         assert pd.DataFrame(stream_data_1 + stream_data_2).equals(actual_df)
         # Assert the last call passed the cursor for pagination
         assert responses.calls[-1].request.params["after"] == twitch_data_1["pagination"]["cursor"]
+
+
+    def test___after_cursor___get_stream_pages___resumes_from_cursor(self, responses):
+        stream_data = [
+            {
+                "viewer_count": 1000,
+                "title": "A random stream"
+            }
+        ]
+        responses.add(
+            responses.GET,
+            STREAM_ENDPOINT,
+            json={"data": stream_data, "pagination": {"cursor": "5678"}},
+            status=200
+        )
+
+        df, cursor = next(self.twitch_wrapper.get_stream_pages(after="1234"))
+
+        assert pd.DataFrame(stream_data).equals(df)
+        assert cursor == "5678"
+        assert responses.calls[-1].request.params["after"] == "1234"
+
+    def test___rejected_token___get_stream_pages___refreshes_token(self, responses):
+        responses.add(responses.GET, STREAM_ENDPOINT, status=401)
+        responses.add(
+            responses.GET, STREAM_ENDPOINT, json={"data": [{"id": "1"}], "pagination": {}}, status=200
+        )
+        auth_calls = len([call for call in responses.calls if call.request.url.startswith(AUTH_ENDPOINT)])
+
+        df, _ = next(self.twitch_wrapper.get_stream_pages())
+
+        assert df["id"].tolist() == ["1"]
+        assert len([call for call in responses.calls if call.request.url.startswith(AUTH_ENDPOINT)]) == auth_calls + 1
+
+    def test___expiring_token___get_stream_pages___refreshes_token_first(self, responses):
+        responses.add(responses.GET, STREAM_ENDPOINT, json={"data": []}, status=200)
+        self.twitch_wrapper._token_expires_at = 0
+
+        next(self.twitch_wrapper.get_stream_pages(), None)
+
+        assert responses.calls[-2].request.url.startswith(AUTH_ENDPOINT)
+
+    def test___rate_limited___get_stream_pages___waits_until_reset(self, responses, monkeypatch):
+        sleeps = []
+        monkeypatch.setattr(twitch_wrapper.time, "sleep", sleeps.append)
+        responses.add(
+            responses.GET,
+            STREAM_ENDPOINT,
+            status=429,
+            headers={"Ratelimit-Reset": str(int(time.time()) + 20)},
+        )
+        responses.add(
+            responses.GET, STREAM_ENDPOINT, json={"data": [{"id": "1"}], "pagination": {}}, status=200
+        )
+
+        df, _ = next(self.twitch_wrapper.get_stream_pages())
+
+        assert df["id"].tolist() == ["1"]
+        assert len(sleeps) == 1
+        assert 18 <= sleeps[0] <= 20
+
+    def test___more_than_batch_size___get_games___batches_requests(self, responses):
+        game_ids = [str(i) for i in range(150)]
+        responses.add(
+            responses.GET,
+            GAMES_ENDPOINT,
+            json={"data": [{"id": game_id} for game_id in game_ids[:100]]},
+            status=200
+        )
+        responses.add(
+            responses.GET,
+            GAMES_ENDPOINT,
+            json={"data": [{"id": game_id} for game_id in game_ids[100:]]},
+            status=200
+        )
+
+        games = self.twitch_wrapper.get_games(game_ids)
+
+        game_calls = [call for call in responses.calls if call.request.url.startswith(GAMES_ENDPOINT)]
+        assert len(game_calls) == 2
+        assert [game["id"] for game in games] == game_ids
+
+    def test___cached_games___enrich_games___fetches_only_unknown_games(self, responses):
+        responses.add(
+            responses.GET,
+            GAMES_ENDPOINT,
+            json={"data": [{"id": "2", "name": "Game 2"}]},
+            status=200
+        )
+        game_cache = GameCache()
+        game_cache.update([{"id": "1", "name": "Game 1"}])
+        live_streams = pd.DataFrame({"game_id": ["1", "2", "2", ""]})
+
+        fetched = self.twitch_wrapper.enrich_games(live_streams, game_cache)
+
+        assert fetched == 1
+        assert responses.calls[-1].request.params["id"] == "2"
+        assert game_cache.get("2")["name"] == "Game 2"
+
+    def test___unknown_game___enrich_games___caches_game_as_missing(self, responses):
+        responses.add(responses.GET, GAMES_ENDPOINT, json={"data": []}, status=200)
+        game_cache = GameCache()
+        self.twitch_wrapper.enrich_games(pd.DataFrame({"game_id": ["404"]}), game_cache)
+        calls = len(responses.calls)
+
+        fetched = self.twitch_wrapper.enrich_games(pd.DataFrame({"game_id": ["404"]}), game_cache)
+
+        assert fetched == 0
+        assert len(responses.calls) == calls
+
+    def test___all_games_cached___enrich_games___makes_no_requests(self, responses):
+        game_cache = GameCache()
+        game_cache.update([{"id": "1", "name": "Game 1"}])
+        calls = len(responses.calls)
+
+        fetched = self.twitch_wrapper.enrich_games(pd.DataFrame({"game_id": ["1"]}), game_cache)
+
+        assert fetched == 0
+        assert len(responses.calls) == calls
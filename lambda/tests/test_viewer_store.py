@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+
+from viewer_store import ViewerStore
+
+START = datetime(2024, 10, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def snapshot(timestamp, viewers):
+    return pd.DataFrame(
+        {
+            "user_id": list(viewers.keys()),
+            "viewer_count": list(viewers.values()),
+            "timestamp": timestamp,
+        }
+    )
+
+
+class TestViewerStore:
+    @pytest.fixture(autouse=True)
+    def setup_method(self, tmp_path):
+        self.directory = str(tmp_path / "store")
+
+    def test___snapshots___get_viewers___returns_series_in_time_order(self):
+        store = ViewerStore(self.directory, slots=4)
+        store.append_snapshot(snapshot(START, {"u1": 10, "u2": 20}))
+        store.append_snapshot(snapshot(START + timedelta(minutes=15), {"u1": 30}))
+
+        viewers = store.get_viewers("u1")
+
+        assert viewers.tolist() == [10, 30]
+        assert viewers.index[0] == pd.Timestamp(START)
+        assert store.get_viewers("u2").tolist() == [20, 0]
+
+    def test___reopened_store___get_viewers___returns_persisted_data(self):
+        ViewerStore(self.directory, slots=4).append_snapshot(snapshot(START, {"u1": 10}))
+
+        store = ViewerStore(self.directory)
+
+        assert store.get_viewers("u1").tolist() == [10]
+        assert store.slots == 4
+
+    def test___ring_wraps___append_snapshot___clears_reused_slot(self):
+        store = ViewerStore(self.directory, slots=2)
+        store.append_snapshot(snapshot(START, {"u1": 10}))
+        store.append_snapshot(snapshot(START + timedelta(minutes=15), {"u1": 20}))
+
+        store.append_snapshot(snapshot(START + timedelta(minutes=30), {"u2": 30}))
+
+        assert store.get_viewers("u1").tolist() == [20, 0]
+        assert not store.append_snapshot(snapshot(START, {"u1": 99}))
+
+    def test___more_streamers_than_capacity___append_snapshot___grows_store(self):
+        store = ViewerStore(self.directory, slots=2, capacity=2)
+        viewers = {f"u{i}": i for i in range(10)}
+
+        store.append_snapshot(snapshot(START, viewers))
+
+        assert len(store) == 10
+        assert store.get_viewers("u9").tolist() == [9]
+        assert len(ViewerStore(self.directory)) == 10
+
+    def test___unknown_streamer___get_row___returns_none(self):
+        assert ViewerStore(self.directory).get_row("missing") is None
+
+    def test___streamer_inactive_for_window___append_snapshot___evicts_streamer(self):
+        store = ViewerStore(self.directory, slots=2)
+        store.append_snapshot(snapshot(START, {"u1": 10, "u2": 20}))
+        store.append_snapshot(snapshot(START + timedelta(minutes=15), {"u2": 30}))
+
+        store.append_snapshot(snapshot(START + timedelta(minutes=30), {"u3": 40}))
+
+        assert "u1" not in store
+        assert store.get_viewers("u2").tolist() == [30, 0]
+        assert store.get_viewers("u3").tolist() == [0, 40]
+        reopened = ViewerStore(self.directory)
+        assert len(reopened) == 2
+        assert reopened.get_viewers("u3").tolist() == [0, 40]
@@ -4,13 +4,59 @@ import os
 import sys
 from zoneinfo import ZoneInfo
 
+import pandas as pd
+
 from aws_wrapper import AwsWrapper
+from crawl_dedup import StreamDeduplicator
+from data_quality import validate_snapshot
+from game_cache import GameCache
+from shard_dispatcher import LambdaShardDispatcher, build_language_shards, count_languages
 from twitch_wrapper import TwitchWrapper
 
+# Stop crawling once the lambda has less than this much time left so there is
+# enough time to upload the partial snapshot and the checkpoint.
+DEADLINE_BUFFER_MILLIS = int(os.getenv("DEADLINE_BUFFER_MILLIS", 60 * 1000))
+# Files and folders starting with an underscore are skipped by the DLT pipeline
+# when reading the bucket.
+CHECKPOINT_FILE = "_checkpoint/crawl_checkpoint.json"
+STAGING_FOLDER = "_staging/"
+MANIFEST_FOLDER = "_manifests/"
+GAME_CACHE_FILE = "_dimensions/game_cache.json"
+LANGUAGE_COUNTS_FILE = "_dimensions/language_counts.json"
+HEAD_SAMPLE_FOLDER = "_head_samples/"
+QUARANTINE_FOLDER = "_quarantine/"
+# Number of pages of 100 streams collected before they are uploaded as a part
+FLUSH_PAGES = int(os.getenv("FLUSH_PAGES", 250))
+# Maximum number of pages fetched again at the end of a crawl to recover streams
+# skipped because of drift between pages, see StreamDeduplicator. 0 disables it.
+REFETCH_DRIFTED_PAGES = int(os.getenv("REFETCH_DRIFTED_PAGES", 0))
+# Timeout of the shard worker lambda in seconds, the coordinator waits this long for each shard
+SHARD_WORKER_TIMEOUT = int(os.getenv("SHARD_WORKER_TIMEOUT", 600))
+
+# Kept between warm invocations so the secret is read and the OAuth token fetched
+# once per container instead of on every run. The wrapper refreshes the token.
+_twitch_wrapper = None
+
 
 """
     Gets the latest Twitch metrics and writes them to S3 in parquet
 
+    Every FLUSH_PAGES pages the streams collected so far are validated and kept in
+    memory while the crawl continues, and the whole crawl is uploaded as a single
+    object by the background uploader at the end. Streams returned more than once
+    because they moved between pages during the crawl are dropped, and up to
+    REFETCH_DRIFTED_PAGES pages around where that happened are fetched again once
+    the crawl finishes.
+
+    If a lambda context is provided, the crawl stops once the remaining execution
+    time drops below DEADLINE_BUFFER_MILLIS. The streams collected so far are staged
+    as a parquet part outside the folders read by the DLT pipeline and the pagination
+    cursor is saved to a checkpoint so the next invocation resumes the same snapshot.
+    The invocation finishing the crawl publishes the staged parts and its own streams
+    as a single snapshot. The next invocation only runs on the next trigger, and
+    resumes the checkpointed snapshot instead of taking a new one, so a crawl that
+    needs n invocations publishes one snapshot every n triggers.
+
     Parameters:
     -----------
     logger : logging.Logger
@@ -29,6 +75,14 @@ from twitch_wrapper import TwitchWrapper
 
     twitch_wrapper : TwitchWrapper, optional
         An instance of TwitchWrapper. If not provided will be created.
+
+    context : object, optional
+        The lambda context, used to check the remaining execution time. If not
+        provided the crawl runs to completion.
+
+    head_pages : int, optional
+        If provided, only sample the first head_pages pages of streams instead of
+        running the full crawl. See sample_top_streams.
 """
 
 def update_twitch_metrics(
@@ -38,9 +92,326 @@ def update_twitch_metrics(
     s3_bucket_path: str = None,
     aws_session: AwsWrapper=None,
     twitch_wrapper: TwitchWrapper=None,
+    context: object = None,
+    head_pages: int = None,
 ):
+    if not aws_session:
+        aws_session = AwsWrapper(
+            os.getenv("AWS_REGION"),
+            logger,
+            aws_access_key_id,
+            aws_secret_access_key
+        )
+
+    if not s3_bucket_path:
+        s3_bucket_path = os.getenv("S3_BUCKET_PATH")
+
+    if head_pages:
+        return sample_top_streams(
+            logger, head_pages, s3_bucket_path, aws_session, twitch_wrapper
+        )
+
+    checkpoint_path = f"{s3_bucket_path}{CHECKPOINT_FILE}"
+
+    checkpoint = aws_session.read_json_from_s3(checkpoint_path)
+    if checkpoint:
+        current_time = datetime.fromisoformat(checkpoint["snapshot_time"])
+        cursor = checkpoint["cursor"]
+        part = checkpoint["part"]
+        deduplicator = StreamDeduplicator(checkpoint.get("seen_stream_ids"))
+        logger.info("Resuming snapshot %s from part %s", checkpoint["snapshot_time"], part)
+    else:
+        current_time = datetime.now(ZoneInfo("America/Chicago"))
+        cursor = None
+        part = 0
+        deduplicator = StreamDeduplicator()
+
+    if not twitch_wrapper:
+        twitch_wrapper = _create_twitch_wrapper(logger, aws_session)
+
+    current_time_formatted = current_time.strftime("%Y-%m-%d_%H-%M-%S")
+    parts = []
+    game_ids = []
+
+    def build_part(pages: list, file_name: str) -> pd.DataFrame:
+        live_streams = _quarantine_invalid_rows(
+            logger,
+            _build_snapshot(pages, current_time),
+            s3_bucket_path,
+            current_time,
+            file_name,
+            aws_session,
+        )
+        if "game_id" in live_streams.columns:
+            game_ids.append(live_streams["game_id"])
+
+        return live_streams
+
+    # Every FLUSH_PAGES pages the streams are validated while the crawl continues
+    # and kept in memory, so the snapshot is uploaded once as a single object
+    pages = []
+    finished = True
+    for page, next_cursor in twitch_wrapper.get_stream_pages(after=cursor):
+        pages.append(deduplicator.add_page(page, cursor))
+        cursor = next_cursor
+        if cursor and _is_near_deadline(context):
+            logger.warning("Approaching the lambda timeout, checkpointing the crawl")
+            finished = False
+            break
+
+        if cursor and len(pages) >= FLUSH_PAGES:
+            parts.append(build_part(pages, f"{current_time_formatted}_part{part}_{len(parts)}"))
+            pages = []
+
+    if finished and REFETCH_DRIFTED_PAGES:
+        pages.extend(deduplicator.refetch_drifted(twitch_wrapper, REFETCH_DRIFTED_PAGES))
+    deduplicator.log_stats(logger)
+
+    # A snapshot crawled in a single invocation keeps the original file name.
+    file_name = current_time_formatted
+    if not (finished and part == 0):
+        file_name = f"{current_time_formatted}_part{part}"
+    parts.append(build_part(pages, file_name))
+
+    # Parts of a checkpointed crawl are staged outside the folders read by the DLT
+    # pipeline, and published with the rest of the snapshot once the crawl finishes
+    staged_paths = [
+        _staging_path(s3_bucket_path, current_time_formatted, f"part{i}")
+        for i in range(part)
+    ]
+    if finished:
+        parts = [aws_session.read_parquet_from_s3(path) for path in staged_paths] + parts
+        file_path = _snapshot_file_path(s3_bucket_path, current_time, current_time_formatted)
+    else:
+        file_path = _staging_path(s3_bucket_path, current_time_formatted, f"part{part}")
+
+    live_streams = pd.concat(
+        [df for df in parts if not df.empty] or parts, ignore_index=True
+    )
+    aws_session.upload_parquet(live_streams, file_path)
+
+    # Only checkpoint once the part is durable
+    aws_session.wait_for_uploads()
+
+    if not finished:
+        aws_session.write_json_to_s3(
+            {
+                "snapshot_time": current_time.isoformat(),
+                "cursor": cursor,
+                "part": part + 1,
+                "seen_stream_ids": deduplicator.seen_stream_ids(),
+            },
+            checkpoint_path,
+        )
+    elif checkpoint:
+        aws_session.delete_from_s3(checkpoint_path)
+        for staged_path in staged_paths:
+            aws_session.delete_from_s3(staged_path)
+
+    # The game dimension is only an enrichment, so it is skipped rather than risk
+    # running past the deadline
+    if game_ids and not _is_near_deadline(context):
+        _update_game_cache(
+            logger,
+            pd.DataFrame({"game_id": pd.concat(game_ids, ignore_index=True)}),
+            s3_bucket_path,
+            aws_session,
+            twitch_wrapper,
+        )
+
+    return file_path
+
+
+"""
+    Samples the streams with the most viewers. The streams endpoint returns streams
+    ordered by viewers so the first few pages cover most of the viewers on the site
+    for a fraction of the requests of the full crawl. Samples are written separately
+    from the full snapshots so they are not double counted by the DLT pipeline.
+
+    Parameters:
+    -----------
+    logger : logging.Logger
+        A logger instance.
+
+    head_pages : int
+        Number of pages of 100 streams to fetch.
+
+    s3_bucket_path : str
+        Bucket path to write to. The sample is written under HEAD_SAMPLE_FOLDER.
+
+    aws_session : AwsWrapper
+        An instance of AwsWrapper.
+
+    twitch_wrapper : TwitchWrapper, optional
+        An instance of TwitchWrapper. If not provided will be created.
+
+    Returns the path of the sample.
+"""
+def sample_top_streams(
+    logger: logging.Logger,
+    head_pages: int,
+    s3_bucket_path: str,
+    aws_session: AwsWrapper,
+    twitch_wrapper: TwitchWrapper = None,
+) -> str:
     current_time = datetime.now(ZoneInfo("America/Chicago"))
 
+    if not twitch_wrapper:
+        twitch_wrapper = _create_twitch_wrapper(logger, aws_session)
+
+    deduplicator = StreamDeduplicator()
+    pages = []
+    cursor = None
+    for page, next_cursor in twitch_wrapper.get_stream_pages():
+        pages.append(deduplicator.add_page(page, cursor))
+        cursor = next_cursor
+        if len(pages) >= head_pages:
+            break
+    deduplicator.log_stats(logger)
+
+    file_name = current_time.strftime("%Y-%m-%d_%H-%M-%S")
+    live_streams = _quarantine_invalid_rows(
+        logger,
+        _build_snapshot(pages, current_time),
+        f"{s3_bucket_path}{HEAD_SAMPLE_FOLDER}",
+        current_time,
+        file_name,
+        aws_session,
+    )
+    file_path = _snapshot_file_path(
+        f"{s3_bucket_path}{HEAD_SAMPLE_FOLDER}", current_time, file_name
+    )
+    aws_session.write_parquet_to_s3(live_streams, file_path, logger)
+    aws_session.wait_for_uploads()
+
+    return file_path
+
+
+"""
+    Crawls a single shard of a snapshot and writes it to the staging area of the
+    bucket. Staged parts are not read by the DLT pipeline until the coordinator
+    commits the snapshot.
+
+    Parameters:
+    -----------
+    logger : logging.Logger
+        A logger instance.
+
+    shard_event : dict
+        The shard to crawl, containing the snapshot_time, shard_id and languages.
+
+    s3_bucket_path : str, optional
+        Bucket path to write to. Defaults to the S3_BUCKET_PATH environment variable.
+
+    aws_session : AwsWrapper, optional
+        An instance of AwsWrapper. If not provided will be created.
+
+    twitch_wrapper : TwitchWrapper, optional
+        An instance of TwitchWrapper. If not provided will be created.
+
+    Returns a dictionary with the shard_id, the staged path, the number of rows and
+    the number of streams per language.
+"""
+def crawl_shard(
+    logger: logging.Logger,
+    shard_event: dict,
+    s3_bucket_path: str = None,
+    aws_session: AwsWrapper = None,
+    twitch_wrapper: TwitchWrapper = None,
+) -> dict:
+    if not aws_session:
+        aws_session = AwsWrapper(os.getenv("AWS_REGION"), logger)
+
+    if not twitch_wrapper:
+        twitch_wrapper = _create_twitch_wrapper(logger, aws_session)
+
+    if not s3_bucket_path:
+        s3_bucket_path = os.getenv("S3_BUCKET_PATH")
+
+    current_time = datetime.fromisoformat(shard_event["snapshot_time"])
+    shard_id = shard_event["shard_id"]
+
+    deduplicator = StreamDeduplicator()
+    pages = []
+    cursor = None
+    for page, next_cursor in twitch_wrapper.get_stream_pages(
+        languages=shard_event["languages"]
+    ):
+        pages.append(deduplicator.add_page(page, cursor))
+        cursor = next_cursor
+
+    if REFETCH_DRIFTED_PAGES:
+        pages.extend(
+            deduplicator.refetch_drifted(
+                twitch_wrapper, REFETCH_DRIFTED_PAGES, shard_event["languages"]
+            )
+        )
+    deduplicator.log_stats(logger)
+    current_time_formatted = current_time.strftime("%Y-%m-%d_%H-%M-%S")
+    live_streams = _quarantine_invalid_rows(
+        logger,
+        _build_snapshot(pages, current_time),
+        s3_bucket_path,
+        current_time,
+        f"{current_time_formatted}_shard{shard_id}",
+        aws_session,
+    )
+
+    staged_path = _staging_path(s3_bucket_path, current_time_formatted, f"shard{shard_id}")
+    aws_session.write_parquet_to_s3(live_streams, staged_path, logger)
+    aws_session.wait_for_uploads()
+
+    return {
+        "shard_id": shard_id,
+        "path": staged_path,
+        "rows": len(live_streams),
+        "language_counts": count_languages(live_streams),
+    }
+
+
+"""
+    Splits a snapshot into language shards, dispatches them to workers and commits
+    the snapshot once every shard has been staged. The staged shards are combined
+    and written next to the regular snapshots as a single object, so the snapshot is
+    either published whole or not at all. A manifest recording the shards is written
+    after it and the staged shards are then deleted, or if any shard fails the staged
+    shards are deleted and nothing is published. The streams per language of the
+    snapshot are saved to balance the shards of the next one.
+
+    Combining the shards is a serial step, the coordinator downloads every staged
+    shard and uploads the whole snapshot again by itself. Its run time and memory
+    grow with the size of the snapshot rather than of the largest shard, which is
+    the cost of publishing the snapshot as one object.
+
+    Parameters:
+    -----------
+    logger : logging.Logger
+        A logger instance.
+
+    dispatcher : function
+        Called with the list of shard events and returns the worker responses. See
+        LambdaShardDispatcher and LocalShardDispatcher.
+
+    shard_count : int
+        Number of shards to split the snapshot into.
+
+    s3_bucket_path : str, optional
+        Bucket path to write to. Defaults to the S3_BUCKET_PATH environment variable.
+
+    aws_session : AwsWrapper, optional
+        An instance of AwsWrapper. If not provided will be created.
+
+    Returns the path of the manifest.
+"""
+def coordinate_snapshot(
+    logger: logging.Logger,
+    dispatcher,
+    shard_count: int,
+    s3_bucket_path: str = None,
+    aws_session: AwsWrapper = None,
+    aws_access_key_id: str = None,
+    aws_secret_access_key: str = None,
+) -> str:
     if not aws_session:
         aws_session = AwsWrapper(
             os.getenv("AWS_REGION"),
@@ -49,26 +420,156 @@ def update_twitch_metrics(
             aws_secret_access_key
         )
 
-    if not twitch_wrapper:
+    if not s3_bucket_path:
+        s3_bucket_path = os.getenv("S3_BUCKET_PATH")
+
+    # Shards are balanced on the streams per language of the previous snapshot
+    language_counts_path = f"{s3_bucket_path}{LANGUAGE_COUNTS_FILE}"
+    stream_counts = aws_session.read_json_from_s3(language_counts_path)
+
+    current_time = datetime.now(ZoneInfo("America/Chicago"))
+    current_time_formatted = current_time.strftime("%Y-%m-%d_%H-%M-%S")
+    shard_events = [
+        {
+            "snapshot_time": current_time.isoformat(),
+            "shard_id": shard_id,
+            "languages": languages,
+        }
+        for shard_id, languages in enumerate(build_language_shards(shard_count, stream_counts))
+    ]
+
+    logger.info("Dispatching %s shards for %s", len(shard_events), current_time_formatted)
+    try:
+        responses = dispatcher(shard_events)
+
+        failed = [
+            event["shard_id"]
+            for event, response in zip(shard_events, responses)
+            if response.get("statusCode") != 200
+        ]
+        if failed:
+            raise RuntimeError(f"Shards {failed} failed, snapshot not committed")
+
+        # The shards are combined into a single object so the DLT pipeline, which
+        # reads every object in the day folder, never sees part of a snapshot
+        shards = [response["body"] for response in responses]
+        live_streams = pd.concat(
+            [aws_session.read_parquet_from_s3(shard["path"]) for shard in shards],
+            ignore_index=True,
+        )
+        file_path = _snapshot_file_path(s3_bucket_path, current_time, current_time_formatted)
+        aws_session.write_parquet_to_s3(live_streams, file_path, logger)
+    except Exception:
+        # Workers that finished have staged their shard even if another one failed
+        for event in shard_events:
+            aws_session.delete_from_s3(
+                _staging_path(s3_bucket_path, current_time_formatted, f"shard{event['shard_id']}")
+            )
+        raise
+
+    manifest_path = f"{s3_bucket_path}{MANIFEST_FOLDER}{current_time_formatted}.json"
+    aws_session.write_json_to_s3(
+        {
+            "snapshot_time": current_time.isoformat(),
+            "path": file_path,
+            "shards": [{"shard_id": shard["shard_id"], "rows": shard["rows"]} for shard in shards],
+            "rows": len(live_streams),
+        },
+        manifest_path,
+    )
+
+    for shard in shards:
+        aws_session.delete_from_s3(shard["path"])
+
+    aws_session.write_json_to_s3(count_languages(live_streams), language_counts_path)
+
+    return manifest_path
+
+
+def _create_twitch_wrapper(logger: logging.Logger, aws_session: AwsWrapper) -> TwitchWrapper:
+    global _twitch_wrapper
+    if _twitch_wrapper is None:
         twitch_credentials = aws_session.get_credentials(
             os.getenv("TWITCH_CREDENTIALS_NAME", "twitch-client-credentials")
         )
+        _twitch_wrapper = TwitchWrapper(twitch_credentials, logger)
 
-        twitch_wrapper = TwitchWrapper(twitch_credentials, logger)
+    return _twitch_wrapper
 
-    live_streams = twitch_wrapper.get_current_streams()
+
+def _build_snapshot(pages: list, current_time: datetime) -> pd.DataFrame:
+    live_streams = pd.concat(pages, ignore_index=True) if pages else pd.DataFrame()
     live_streams = live_streams.rename(columns={"id": "stream_id"})
     live_streams["timestamp"] = current_time
-    current_time_formatted = current_time.strftime("%Y-%m-%d_%H-%M-%S")
 
-    if not s3_bucket_path:
-        s3_bucket_path = os.getenv("S3_BUCKET_PATH")
-    file_path = f'{s3_bucket_path}{str(current_time.year)}/{str(current_time.month)}/{str(current_time.day)}/{current_time_formatted}.parquet'
-    aws_session.write_parquet_to_s3(live_streams, file_path, logger)
+    return live_streams
+
+
+def _quarantine_invalid_rows(
+    logger: logging.Logger,
+    live_streams: pd.DataFrame,
+    s3_bucket_path: str,
+    current_time: datetime,
+    file_name: str,
+    aws_session: AwsWrapper,
+) -> pd.DataFrame:
+    valid, quarantined, counts = validate_snapshot(live_streams)
+
+    if not quarantined.empty:
+        quarantine_path = _snapshot_file_path(
+            f"{s3_bucket_path}{QUARANTINE_FOLDER}", current_time, file_name
+        )
+        logger.warning(
+            "Quarantined %s of %s rows to %s: %s",
+            len(quarantined),
+            len(live_streams),
+            quarantine_path,
+            counts,
+        )
+        aws_session.upload_parquet(quarantined, quarantine_path)
+
+    return valid
+
+
+def _update_game_cache(
+    logger: logging.Logger,
+    live_streams: pd.DataFrame,
+    s3_bucket_path: str,
+    aws_session: AwsWrapper,
+    twitch_wrapper: TwitchWrapper,
+):
+    # The game dimension is an enrichment, a failure here should not lose the snapshot
+    game_cache_path = f"{s3_bucket_path}{GAME_CACHE_FILE}"
+    try:
+        game_cache = GameCache.from_dict(aws_session.read_json_from_s3(game_cache_path))
+        twitch_wrapper.enrich_games(live_streams, game_cache)
+
+        if game_cache.modified:
+            aws_session.write_json_to_s3(game_cache.to_dict(), game_cache_path)
+    except Exception as e:
+        logger.error("Error updating the game cache: %s", e, exc_info=True)
+
+
+def _staging_path(s3_bucket_path: str, current_time_formatted: str, name: str) -> str:
+    return f"{s3_bucket_path}{STAGING_FOLDER}{current_time_formatted}/{name}.parquet"
+
+
+def _snapshot_file_path(s3_bucket_path: str, current_time: datetime, file_name: str) -> str:
+    return f'{s3_bucket_path}{str(current_time.year)}/{str(current_time.month)}/{str(current_time.day)}/{file_name}.parquet'
+
+
+def _is_near_deadline(context: object) -> bool:
+    if not context:
+        return False
+
+    return context.get_remaining_time_in_millis() < DEADLINE_BUFFER_MILLIS
 
 
 def setup_logging() -> logging.Logger:
     logger = logging.getLogger("twitch_stream_updater")
+    # Warm lambda invocations reuse the logger, only configure it once
+    if logger.handlers:
+        return logger
     logger.setLevel(logging.DEBUG)
 
     handler = logging.StreamHandler(sys.stdout)
@@ -91,7 +592,8 @@ Parameters:
 -----------
 event : dict
     The event data passed to the Lambda function. This typically contains 
-    details about the triggering event such as the input data.
+    details about the triggering event such as the input data. If it contains
+    head_pages only the top streams are sampled, see sample_top_streams.
 
 context : object
     The runtime information provided by AWS Lambda, such as function 
@@ -120,7 +622,13 @@ def handle(
     logger = setup_logging()
 
     try:
-        file_path = update_function(logger, aws_access_key_id, aws_secret_access_key)
+        file_path = update_function(
+            logger,
+            aws_access_key_id,
+            aws_secret_access_key,
+            context=context,
+            head_pages=(event or {}).get("head_pages"),
+        )
 
         return {"statusCode": 200, "body": f"File update successful: {file_path}"}
     except Exception as e:
@@ -132,6 +640,82 @@ def handle(
         }
 
 
+"""
+Entrypoint for the coordinator lambda. Splits the current snapshot into shards, invokes
+a worker lambda per shard and commits the snapshot with a manifest.
+
+Parameters:
+-----------
+event : dict
+    The event data passed to the Lambda function. May contain shard_count to override
+    the SHARD_COUNT environment variable.
+
+context : object
+    The runtime information provided by AWS Lambda.
+
+coordinate_function : function, optional
+    By default will call coordinate_snapshot. Can be overridden for tests.
+"""
+def handle_coordinator(
+    event: dict,
+    context: object,
+    coordinate_function=coordinate_snapshot
+) -> dict:
+    logger = setup_logging()
+
+    try:
+        aws_session = AwsWrapper(os.getenv("AWS_REGION"), logger)
+        dispatcher = LambdaShardDispatcher(
+            os.getenv("SHARD_WORKER_FUNCTION_NAME"), aws_session, SHARD_WORKER_TIMEOUT
+        )
+        shard_count = (event or {}).get("shard_count", int(os.getenv("SHARD_COUNT", 4)))
+        manifest_path = coordinate_function(
+            logger, dispatcher, shard_count, aws_session=aws_session
+        )
+
+        return {"statusCode": 200, "body": f"Snapshot committed: {manifest_path}"}
+    except Exception as e:
+        logger.error("Error, exiting %s", e, exc_info=True)
+
+        return {
+            "statusCode": 500,
+            "body": "Snapshot failed, see above for error details.",
+        }
+
+
+"""
+Entrypoint for a shard worker. Crawls the shard described by the event and stages
+it for the coordinator.
+
+Parameters:
+-----------
+event : dict
+    A shard event created by coordinate_snapshot.
+
+context : object
+    The runtime information provided by AWS Lambda.
+
+shard_function : function, optional
+    By default will call crawl_shard. Can be overridden for tests.
+"""
+def handle_shard(
+    event: dict,
+    context: object,
+    shard_function=crawl_shard
+) -> dict:
+    logger = setup_logging()
+
+    try:
+        return {"statusCode": 200, "body": shard_function(logger, event)}
+    except Exception as e:
+        logger.error("Error, exiting %s", e, exc_info=True)
+
+        return {
+            "statusCode": 500,
+            "body": "Shard failed, see above for error details.",
+        }
+
+
 if __name__ == "__main__":
     # Credentials will be set in the AWS environment. This is only used for local testing
     import dotenv
@@ -1,16 +1,27 @@
-from datetime import datetime
 from enum import Enum
 import logging
+import os
 import requests
 import time
 
 import pandas as pd
 
-AUTH_ENDPOINT = "https://id.twitch.tv/oauth2/token"
-STREAM_ENDPOINT = "https://api.twitch.tv/helix/streams"
+from crawl_dedup import StreamDeduplicator
+from game_cache import GameCache
+
+# Both can be pointed at another server, ex: the local helix_simulator
+API_URL = os.getenv("TWITCH_API_URL", "https://api.twitch.tv/helix").rstrip("/")
+AUTH_ENDPOINT = os.getenv("TWITCH_AUTH_URL", "https://id.twitch.tv/oauth2/token")
+
+# The games endpoint accepts at most 100 ids per request
+GAMES_BATCH_SIZE = 100
 
 BACKOFF_INTERVAL_SECONDS = 5
 BACKOFF_MAX_SECONDS = 30
+# Longest wait for the rate limit bucket to refill after a 429
+RATE_LIMIT_MAX_WAIT_SECONDS = 60
+# The OAuth token is refreshed this long before it expires
+TOKEN_REFRESH_MARGIN_SECONDS = 60
 
 
 class HttpMethod(Enum):
@@ -29,12 +40,28 @@ twitch_credentials : dict
 
 logger : logging.Logger
     A logger instance.
+
+api_url : str, optional
+    Base url of the Helix api. Defaults to TWITCH_API_URL or the Twitch api.
+
+auth_url : str, optional
+    Url of the OAuth token endpoint. Defaults to TWITCH_AUTH_URL or the Twitch one.
 """
 class TwitchWrapper:
-    def __init__(self, twitch_credentials: dict, logger: logging.Logger):
+    def __init__(
+        self,
+        twitch_credentials: dict,
+        logger: logging.Logger,
+        api_url: str = API_URL,
+        auth_url: str = AUTH_ENDPOINT,
+    ):
         self._logger = logger
         self._twitch_credentials = twitch_credentials
+        self._stream_endpoint = f"{api_url.rstrip('/')}/streams"
+        self._games_endpoint = f"{api_url.rstrip('/')}/games"
+        self._auth_endpoint = auth_url
         self._session = requests.Session()
+        self._token_expires_at = None
         self._headers = self._get_twitch_authorization_headers()
 
     def __del__(self):
@@ -43,15 +70,42 @@ class TwitchWrapper:
     """
     Get the latest stream data from Twitch. See the Twitch api for details
     https://dev.twitch.tv/docs/api/reference/#get-streams
+    Streams returned on more than one page are only kept once.
     Returns a dataframe.
     """
     def get_current_streams(self) -> pd.DataFrame:
+        deduplicator = StreamDeduplicator()
+        pages = [deduplicator.add_page(df) for df, _ in self.get_stream_pages()]
+        if not pages:
+            return pd.DataFrame()
+
+        return pd.concat(pages, ignore_index=True)
+
+    """
+    Iterate over the pages of live streams one request at a time. Yields a tuple of
+    the page as a dataframe and the cursor for the next page, which is None on the
+    last page.
+
+    Parameters:
+    -----------
+    after : str, optional
+        Pagination cursor to resume from. Starts from the first page if unspecified.
+
+    languages : list, optional
+        Only return streams broadcasting in these languages. Twitch accepts up to 100
+        language codes per request.
+    """
+    def get_stream_pages(self, after: str = None, languages: list = None):
         stream_params = {"first": 100}
-        live_streams = pd.DataFrame()
+        if after:
+            stream_params["after"] = after
+        if languages:
+            stream_params["language"] = languages
+
         try:
             while True:
                 stream_data = self._handle_api_call_with_backoff(
-                    STREAM_ENDPOINT, HttpMethod.GET, params=stream_params
+                    self._stream_endpoint, HttpMethod.GET, params=stream_params
                 )
 
                 if not stream_data.get("data"):
@@ -63,10 +117,9 @@ class TwitchWrapper:
                 title = stream_info.get("title")
                 self._logger.info(f"Title: {title}, Viewers: {viewers}")
 
-                df = pd.DataFrame(stream_data["data"])
-                live_streams = pd.concat([live_streams, df], ignore_index=True)
-
                 cursor = stream_data.get("pagination").get("cursor")
+                yield pd.DataFrame(stream_data["data"]), cursor
+
                 if cursor:
                     stream_params["after"] = cursor
                 else:
@@ -78,7 +131,58 @@ class TwitchWrapper:
             )
             raise
 
-        return live_streams
+    """
+    Get the metadata for a list of games, 100 ids per request. See the Twitch api for details
+    https://dev.twitch.tv/docs/api/reference/#get-games
+    Returns a list of games.
+    """
+    def get_games(self, game_ids: list) -> list:
+        games = []
+        for i in range(0, len(game_ids), GAMES_BATCH_SIZE):
+            games_data = self._handle_api_call_with_backoff(
+                self._games_endpoint,
+                HttpMethod.GET,
+                params={"id": game_ids[i:i + GAMES_BATCH_SIZE]},
+            )
+            games.extend(games_data.get("data", []))
+
+        return games
+
+    """
+    Add the metadata for every game in a snapshot to the game cache. Only games that
+    are missing from the cache or have expired are fetched so a steady state run
+    usually makes no requests. Game ids Twitch does not return are cached as missing.
+
+    Parameters:
+    -----------
+    live_streams : pd.DataFrame
+        A snapshot of live streams containing a game_id column.
+
+    game_cache : GameCache
+        The cache to look up and add games to.
+
+    Returns the number of games fetched.
+    """
+    def enrich_games(self, live_streams: pd.DataFrame, game_cache: GameCache) -> int:
+        if "game_id" not in live_streams.columns:
+            return 0
+
+        game_ids = [
+            game_id for game_id in live_streams["game_id"].dropna().unique() if game_id
+        ]
+        missing_game_ids = game_cache.get_missing(game_ids)
+        if not missing_game_ids:
+            return 0
+
+        self._logger.debug("Fetching metadata for %s games", len(missing_game_ids))
+        games = self.get_games(missing_game_ids)
+        game_cache.update(games)
+        returned_game_ids = {game["id"] for game in games}
+        game_cache.update_missing(
+            [game_id for game_id in missing_game_ids if game_id not in returned_game_ids]
+        )
+
+        return len(games)
 
     def _get_twitch_authorization_headers(self) -> dict:
         self._logger.debug("Getting twitch OAuth token")
@@ -100,12 +204,15 @@ class TwitchWrapper:
             }
 
             auth_data = self._handle_api_call_with_backoff(
-                AUTH_ENDPOINT, HttpMethod.POST, params=auth_params
+                self._auth_endpoint, HttpMethod.POST, params=auth_params
             )
 
             if "access_token" not in auth_data:
                 raise KeyError("Twitch Access Token missing")
 
+            if "expires_in" in auth_data:
+                self._token_expires_at = time.monotonic() + auth_data["expires_in"]
+
             return {
                 "Client-ID": client_id,
                 "Authorization": f'Bearer {auth_data["access_token"]}',
@@ -121,18 +228,41 @@ class TwitchWrapper:
         self, url: str, type: HttpMethod, params: dict = None
     ) -> dict:
         currentBackoff = 0
+        refreshed = False
 
         while currentBackoff <= BACKOFF_MAX_SECONDS:
             try:
                 if type == HttpMethod.GET:
+                    if self._is_token_expiring():
+                        self._headers = self._get_twitch_authorization_headers()
+                        refreshed = True
+
                     response = self._session.get(
                         url, headers=self._headers, params=params
                     )
+
+                    # The token can be revoked or expire early, get a new one once
+                    if response.status_code == 401 and not refreshed:
+                        self._logger.warning("Twitch OAuth token rejected, refreshing it")
+                        self._headers = self._get_twitch_authorization_headers()
+                        refreshed = True
+                        continue
                 elif type == HttpMethod.POST:
                     response = self._session.post(url, params=params)
                 else:
                     break
 
+                # Twitch sends the time the bucket is full again, waiting until then
+                # avoids retrying into more 429s
+                rate_limit_wait = self._get_rate_limit_wait(response)
+                if rate_limit_wait is not None:
+                    self._logger.warning(
+                        "Twitch rate limit hit, waiting %.1fs for it to reset", rate_limit_wait
+                    )
+                    currentBackoff += BACKOFF_INTERVAL_SECONDS
+                    time.sleep(rate_limit_wait)
+                    continue
+
                 response.raise_for_status()
                 return response.json()
 
@@ -145,13 +275,30 @@ class TwitchWrapper:
 
         raise TimeoutError("%s hit max backoff", url)
 
-    def _print_api_limit_info(self, response: dict, logger: logging.Logger):
-        rate_limit = response.headers.get("Ratelimit-Limit")
-        rate_remaining = response.headers.get("Ratelimit-Remaining")
+    def _is_token_expiring(self) -> bool:
+        return (
+            self._token_expires_at is not None
+            and time.monotonic() > self._token_expires_at - TOKEN_REFRESH_MARGIN_SECONDS
+        )
+
+    """
+    Returns the seconds until the rate limit resets for a 429 response with a
+    Ratelimit-Reset header, or None otherwise.
+    """
+    def _get_rate_limit_wait(self, response: requests.Response) -> float:
         rate_reset = response.headers.get("Ratelimit-Reset")
-        rate_reset_time = datetime.fromtimestamp(int(rate_reset))
+        if response.status_code != 429 or rate_reset is None:
+            return None
+
+        self._logger.debug(
+            "Rate limit: %s, remaining: %s, reset: %s",
+            response.headers.get("Ratelimit-Limit"),
+            response.headers.get("Ratelimit-Remaining"),
+            rate_reset,
+        )
+        try:
+            wait = float(rate_reset) - time.time()
+        except ValueError:
+            return None
 
-        self._logger.debug("Rate limit stats")
-        self._logger.debug(rate_limit)
-        self._logger.debug(rate_remaining)
-        self._logger.debug(rate_reset_time)
\ No newline at end of file
+        return min(max(wait, 0), RATE_LIMIT_MAX_WAIT_SECONDS)
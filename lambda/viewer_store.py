@@ -0,0 +1,250 @@
+"""
+A compact on-disk store of viewer counts per streamer, one row per user_id and one
+column per 15 minute snapshot slot. The counts are kept in a memory-mapped numpy
+array so looking up a streamer's history is a single row read regardless of the
+number of streamers, and each new snapshot is written into its slot in place.
+
+The columns form a ring buffer of the last `slots` snapshots. Each column records
+which slot it currently holds so columns reused for a newer slot are cleared first.
+Each row records the last slot its streamer was seen in, and streamers not seen in
+any of the slots kept are evicted when a new slot starts so the rows of streamers
+that stopped streaming are reused.
+
+The store lives on local disk, so it is not updated by the lambda. The live metrics
+service appends each snapshot as it is polled, see LiveMetrics, and snapshots
+already in the bucket can be appended with the command line.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+SLOT_SECONDS = 15 * 60
+# One week of 15 minute snapshots
+DEFAULT_SLOTS = 7 * 24 * 4
+DEFAULT_CAPACITY = 1024
+
+VIEWERS_FILE = "viewers.npy"
+SLOT_TIMES_FILE = "slot_times.npy"
+LAST_SEEN_FILE = "last_seen.npy"
+INDEX_FILE = "user_ids.txt"
+
+
+"""
+Parameters:
+-----------
+directory : str
+    Directory holding the store. Created if it does not exist.
+
+slots : int, optional
+    Number of 15 minute slots kept per streamer. Only used when creating a store.
+
+capacity : int, optional
+    Initial number of streamer rows. The store grows as new streamers are added.
+"""
+class ViewerStore:
+    def __init__(
+        self,
+        directory: str,
+        slots: int = DEFAULT_SLOTS,
+        capacity: int = DEFAULT_CAPACITY,
+    ):
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        viewers_path = self._path(VIEWERS_FILE)
+        if os.path.exists(viewers_path):
+            self._viewers = np.lib.format.open_memmap(viewers_path, mode="r+")
+            self._slot_times = np.lib.format.open_memmap(
+                self._path(SLOT_TIMES_FILE), mode="r+"
+            )
+            self._last_seen = np.lib.format.open_memmap(
+                self._path(LAST_SEEN_FILE), mode="r+"
+            )
+            with open(self._path(INDEX_FILE)) as f:
+                user_ids = f.read().splitlines()
+        else:
+            self._viewers = np.lib.format.open_memmap(
+                viewers_path, mode="w+", dtype=np.int32, shape=(capacity, slots)
+            )
+            self._slot_times = np.lib.format.open_memmap(
+                self._path(SLOT_TIMES_FILE), mode="w+", dtype=np.int64, shape=(slots,)
+            )
+            self._slot_times[:] = -1
+            self._slot_times.flush()
+            self._last_seen = np.lib.format.open_memmap(
+                self._path(LAST_SEEN_FILE), mode="w+", dtype=np.int64, shape=(capacity,)
+            )
+            user_ids = []
+            open(self._path(INDEX_FILE), "w").close()
+
+        # The index file lists user ids in row order. New streamers are appended to
+        # it and it is only rewritten when streamers are evicted
+        self._index = {user_id: row for row, user_id in enumerate(user_ids)}
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._index
+
+    @property
+    def slots(self) -> int:
+        return self._viewers.shape[1]
+
+    """
+    Write a snapshot into its slot. Snapshots split into several parts can be
+    appended part by part. Snapshots older than the oldest slot kept are ignored.
+
+    Parameters:
+    -----------
+    snapshot : pd.DataFrame
+        A snapshot containing the user_id, viewer_count and timestamp columns.
+
+    Returns True if the snapshot was written.
+    """
+    def append_snapshot(self, snapshot: pd.DataFrame) -> bool:
+        if snapshot.empty:
+            return False
+
+        slot = int(pd.Timestamp(snapshot["timestamp"].iloc[0]).timestamp()) // SLOT_SECONDS
+        column = slot % self.slots
+
+        if self._slot_times[column] > slot:
+            return False
+        if self._slot_times[column] != slot:
+            self._evict(slot - self.slots)
+            self._viewers[: len(self._index), column] = 0
+            self._slot_times[column] = slot
+
+        snapshot = snapshot[snapshot["user_id"].notna()]
+        user_ids = snapshot["user_id"].astype(str)
+        self._add_users(user_ids.unique())
+
+        rows = user_ids.map(self._index).to_numpy()
+        self._viewers[rows, column] = snapshot["viewer_count"].to_numpy(dtype=np.int32)
+        self._last_seen[rows] = np.maximum(self._last_seen[rows], slot)
+
+        self._viewers.flush()
+        self._slot_times.flush()
+        self._last_seen.flush()
+        return True
+
+    """
+    Returns the row of viewer counts for a streamer in slot order. This is a view
+    of the memory-mapped file so no data is copied, see slot_times for the slot
+    each column holds. Returns None for unknown streamers.
+    """
+    def get_row(self, user_id: str) -> np.ndarray:
+        row = self._index.get(user_id)
+        if row is None:
+            return None
+
+        return self._viewers[row]
+
+    """
+    Returns the epoch slot number held by each column, or -1 for unused columns.
+    """
+    def slot_times(self) -> np.ndarray:
+        return self._slot_times
+
+    """
+    Returns the viewer counts of a streamer as a series indexed by snapshot time,
+    oldest first. Returns an empty series for unknown streamers.
+    """
+    def get_viewers(self, user_id: str) -> pd.Series:
+        row = self.get_row(user_id)
+        if row is None:
+            return pd.Series(dtype=np.int32)
+
+        used = np.flatnonzero(self._slot_times >= 0)
+        order = used[np.argsort(self._slot_times[used])]
+
+        return pd.Series(
+            row[order],
+            index=pd.to_datetime(self._slot_times[order] * SLOT_SECONDS, unit="s", utc=True),
+            name=user_id,
+        )
+
+    def _add_users(self, user_ids):
+        new_user_ids = [user_id for user_id in user_ids if user_id not in self._index]
+        if not new_user_ids:
+            return
+
+        required = len(self._index) + len(new_user_ids)
+        if required > self._viewers.shape[0]:
+            self._grow(max(required, 2 * self._viewers.shape[0]))
+
+        for user_id in new_user_ids:
+            self._index[user_id] = len(self._index)
+
+        with open(self._path(INDEX_FILE), "a") as f:
+            f.writelines(f"{user_id}\n" for user_id in new_user_ids)
+
+    """
+    Remove the streamers last seen in or before a slot and move the remaining rows
+    up so the rows freed are reused by new streamers.
+    """
+    def _evict(self, last_slot: int):
+        count = len(self._index)
+        kept = np.flatnonzero(self._last_seen[:count] > last_slot)
+        if len(kept) == count:
+            return
+
+        self._viewers[: len(kept)] = self._viewers[kept]
+        self._viewers[len(kept):count] = 0
+        self._last_seen[: len(kept)] = self._last_seen[kept]
+        self._last_seen[len(kept):count] = 0
+
+        user_ids = list(self._index)
+        user_ids = [user_ids[row] for row in kept]
+        self._index = {user_id: row for row, user_id in enumerate(user_ids)}
+
+        index_path = self._path(f"{INDEX_FILE}.evict")
+        with open(index_path, "w") as f:
+            f.writelines(f"{user_id}\n" for user_id in user_ids)
+        os.replace(index_path, self._path(INDEX_FILE))
+
+    def _grow(self, capacity: int):
+        self._viewers = self._grow_file(VIEWERS_FILE, self._viewers, (capacity, self.slots))
+        self._last_seen = self._grow_file(LAST_SEEN_FILE, self._last_seen, (capacity,))
+
+    def _grow_file(self, file_name: str, array: np.memmap, shape: tuple) -> np.memmap:
+        grown_path = self._path(f"{file_name}.grow")
+        grown = np.lib.format.open_memmap(
+            grown_path, mode="w+", dtype=array.dtype, shape=shape
+        )
+        grown[: array.shape[0]] = array
+        grown.flush()
+
+        del grown
+        del array
+        os.replace(grown_path, self._path(file_name))
+        return np.lib.format.open_memmap(self._path(file_name), mode="r+")
+
+    def _path(self, file_name: str) -> str:
+        return os.path.join(self._directory, file_name)
+
+
+if __name__ == "__main__":
+    # Appends the snapshots of a range of days to a store
+    import argparse
+    from datetime import date, timedelta
+
+    from backfill import read_snapshots
+
+    parser = argparse.ArgumentParser(description="Append snapshots to a viewer store")
+    parser.add_argument("source", help="Local directory or S3 prefix of the snapshots")
+    parser.add_argument("store", help="Directory of the viewer store")
+    parser.add_argument("--start", type=date.fromisoformat, required=True)
+    parser.add_argument("--end", type=date.fromisoformat, required=True)
+    args = parser.parse_args()
+
+    store = ViewerStore(args.store)
+    for i in range((args.end - args.start).days + 1):
+        snapshots = read_snapshots(args.source, args.start + timedelta(days=i))
+        if snapshots.empty:
+            continue
+
+        for _, snapshot in snapshots.groupby("timestamp"):
+            store.append_snapshot(snapshot)
@@ -0,0 +1,69 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC Materializes every table the dashboard reads for a page view into a single JSON
+# MAGIC bundle so a cold page load is one object fetch instead of a warehouse query per table.
+# MAGIC Runs after each refresh of the DLT pipeline.
+
+# COMMAND ----------
+
+from datetime import datetime, timezone
+import json
+
+# Increment when the layout of the bundle changes so older dashboards refuse to read it
+BUNDLE_VERSION = 1
+
+dbutils.widgets.text("bundle_path", "")  # noqa: F821
+dbutils.widgets.text("catalog", "")  # noqa: F821
+dbutils.widgets.text("schema", "default")  # noqa: F821
+bundle_path = dbutils.widgets.get("bundle_path")  # noqa: F821
+# The job task runs outside the pipeline, so the tables it published are qualified
+# with the catalog and schema of the pipeline
+schema = f"{dbutils.widgets.get('catalog')}.{dbutils.widgets.get('schema')}"  # noqa: F821
+
+TABLES = {
+    "latest_stream_metrics": f"SELECT * FROM {schema}.latest_stream_metrics",
+    "viewers": f"""SELECT
+        date_format(timestamp, 'MMM d HH:mm') as timestamp,
+        SUM(viewer_count) as total_viewers
+    FROM
+        {schema}.silver_twitch_streams
+    WHERE
+        timestamp >= CURRENT_TIMESTAMP() - INTERVAL 7 DAY
+    GROUP BY
+        timestamp
+    ORDER BY
+        timestamp ASC""",
+    "head_sample_viewers_hour": f"""SELECT
+        date_format(samples.timestamp, 'MMM d HH:mm') as timestamp,
+        samples.total_viewers
+    FROM
+        {schema}.head_sample_viewers_hour samples
+    ORDER BY
+        samples.timestamp ASC""",
+}
+for timescale in ["hour", "day", "week"]:
+    TABLES[f"latest_stream_metrics_{timescale}"] = (
+        f"SELECT * FROM {schema}.latest_stream_metrics_{timescale}"
+    )
+    TABLES[f"top_games_{timescale}"] = (
+        f"SELECT * FROM {schema}.top_games_{timescale} ORDER BY hours_watched DESC LIMIT 100"
+    )
+    TABLES[f"top_streamers_{timescale}"] = (
+        f"SELECT * FROM {schema}.top_streamers_{timescale} ORDER BY hours_watched DESC LIMIT 1000"
+    )
+
+# COMMAND ----------
+
+bundle = {
+    "version": BUNDLE_VERSION,
+    "generated_at": datetime.now(timezone.utc).isoformat(),
+    "tables": {},
+}
+for name, query in TABLES.items():
+    # The split orientation stores the column names once instead of on every row
+    df = spark.sql(query).toPandas()  # noqa: F821
+    bundle["tables"][name] = json.loads(
+        df.to_json(orient="split", index=False, date_format="iso")
+    )
+
+dbutils.fs.put(bundle_path, json.dumps(bundle, separators=(",", ":")), overwrite=True)  # noqa: F821
@@ -33,7 +33,7 @@ SELECT
 
 CREATE OR REFRESH STREAMING LIVE TABLE silver_twitch_streams ( 
   CONSTRAINT valid_timestamp EXPECT (timestamp IS NOT NULL) ON VIOLATION DROP ROW,
-  CONSTRAINT valid_user_id EXPECT (timestamp IS NOT NULL) ON VIOLATION DROP ROW,
+  CONSTRAINT valid_user_id EXPECT (user_id IS NOT NULL) ON VIOLATION DROP ROW,
   CONSTRAINT valid_started_at_timestamp EXPECT (CAST(started_at AS TIMESTAMP) IS NOT NULL) ON VIOLATION DROP ROW
 )
 AS SELECT
@@ -63,6 +63,27 @@ GROUP BY timestamp, game_id, game_name;
 
 -- COMMAND ----------
 
+-- Game metadata cached by the lambda from the Twitch games endpoint. Game ids the
+-- endpoint did not return are cached as missing and left out.
+CREATE OR REFRESH MATERIALIZED VIEW games AS
+SELECT
+  game.id AS game_id,
+  game.name AS game_name,
+  game.box_art_url,
+  game.igdb_id
+FROM (
+  SELECT explode(games) AS game
+  FROM read_files(
+    "${s3_path}_dimensions/game_cache.json",
+    format => "json",
+    multiLine => true,
+    schema => "games ARRAY<STRUCT<id STRING, name STRING, box_art_url STRING, igdb_id STRING, missing BOOLEAN>>"
+  )
+)
+WHERE NOT COALESCE(game.missing, false);
+
+-- COMMAND ----------
+
 CREATE OR REFRESH MATERIALIZED VIEW top_games_hour AS
 WITH metrics AS (
   SELECT
@@ -76,15 +97,18 @@ WITH metrics AS (
   GROUP BY game_id, game_name
 )
 SELECT
-  game_id,
-  game_name,
+  metrics.game_id,
+  metrics.game_name,
   hours_watched,
   max_viewer_count,
   max_streamers_count,
   DENSE_RANK() OVER (ORDER BY hours_watched DESC) AS rank_by_hours_watched,
-  DENSE_RANK() OVER (ORDER BY max_viewer_count DESC) AS rank_by_max_viewer
+  DENSE_RANK() OVER (ORDER BY max_viewer_count DESC) AS rank_by_max_viewer,
+  games.box_art_url,
+  games.igdb_id
 FROM
-  metrics;
+  metrics
+  LEFT JOIN live.games ON metrics.game_id = games.game_id;
 
 CREATE OR REFRESH MATERIALIZED VIEW top_games_day AS
 WITH metrics AS (
@@ -99,15 +123,18 @@ WITH metrics AS (
   GROUP BY game_id, game_name
 )
 SELECT
-  game_id,
-  game_name,
+  metrics.game_id,
+  metrics.game_name,
   hours_watched,
   max_viewer_count,
   max_streamers_count,
   DENSE_RANK() OVER (ORDER BY hours_watched DESC) AS rank_by_hours_watched,
-  DENSE_RANK() OVER (ORDER BY max_viewer_count DESC) AS rank_by_max_viewer
+  DENSE_RANK() OVER (ORDER BY max_viewer_count DESC) AS rank_by_max_viewer,
+  games.box_art_url,
+  games.igdb_id
 FROM
-  metrics;
+  metrics
+  LEFT JOIN live.games ON metrics.game_id = games.game_id;
 
 CREATE OR REFRESH MATERIALIZED VIEW top_games_week AS
 WITH metrics AS (
@@ -122,15 +149,18 @@ WITH metrics AS (
   GROUP BY game_id, game_name
 )
 SELECT
-  game_id,
-  game_name,
+  metrics.game_id,
+  metrics.game_name,
   hours_watched,
   max_viewer_count,
   max_streamers_count,
   DENSE_RANK() OVER (ORDER BY hours_watched DESC) AS rank_by_hours_watched,
-  DENSE_RANK() OVER (ORDER BY max_viewer_count DESC) AS rank_by_max_viewer
+  DENSE_RANK() OVER (ORDER BY max_viewer_count DESC) AS rank_by_max_viewer,
+  games.box_art_url,
+  games.igdb_id
 FROM
-  metrics;
+  metrics
+  LEFT JOIN live.games ON metrics.game_id = games.game_id;
 
 -- COMMAND ----------
 
@@ -236,6 +266,50 @@ CREATE OR REFRESH MATERIALIZED VIEW latest_stream_metrics_week AS
 
 -- COMMAND ----------
 
+-- Samples of the top streams taken every minute between full snapshots by the
+-- lambda. Kept apart from the snapshots so viewers are not counted twice.
+CREATE OR REFRESH STREAMING TABLE bronze_head_samples
+(
+  stream_id STRING,
+  user_id STRING,
+  user_login STRING,
+  user_name STRING,
+  game_id STRING,
+  game_name STRING,
+  viewer_count LONG,
+  started_at STRING,
+  language STRING,
+  timestamp TIMESTAMP,
+  is_mature BOOLEAN
+)
+as
+SELECT
+  stream_id,
+  user_id,
+  user_login,
+  user_name,
+  game_id,
+  game_name,
+  viewer_count,
+  started_at,
+  language,
+  timestamp,
+  is_mature
+ FROM cloud_files("${s3_path}_head_samples/", "parquet")
+ WHERE CAST(timestamp AS DATE) >= date_sub(current_date(), 7);
+
+CREATE OR REFRESH MATERIALIZED VIEW head_sample_viewers_hour AS
+  SELECT
+    timestamp,
+    SUM(viewer_count) as total_viewers,
+    COUNT(stream_id) as total_streams
+  FROM live.bronze_head_samples
+  WHERE timestamp >= CURRENT_TIMESTAMP() - INTERVAL 1 HOUR
+    AND user_id IS NOT NULL
+  GROUP BY timestamp;
+
+-- COMMAND ----------
+
 CREATE OR REFRESH MATERIALIZED VIEW unique_streamers AS
 SELECT
   DISTINCT user_name
@@ -44,6 +44,13 @@ resource "aws_s3_object" "twitch_data_prefix" {
   }
 }
 
+# The pipeline reads the head samples folder even when head sampling is disabled
+resource "aws_s3_object" "head_sample_prefix" {
+  bucket     = aws_s3_bucket.twitch_data_bucket.bucket
+  key        = "${aws_s3_object.twitch_data_prefix.key}_head_samples/"
+  depends_on = [aws_s3_object.twitch_data_prefix]
+}
+
 
 resource "aws_iam_role" "lambda_s3_role" {
   name = "${var.lambda.s3_role_name}-${terraform.workspace}"
@@ -91,7 +98,8 @@ resource "aws_iam_policy" "lambda_s3_policy" {
         Action = [
           "s3:ListBucket",
           "s3:GetObject",
-          "s3:PutObject"
+          "s3:PutObject",
+          "s3:DeleteObject"
         ],
         Effect = "Allow",
         Resource = [
@@ -103,10 +111,28 @@ resource "aws_iam_policy" "lambda_s3_policy" {
   })
 }
 
+resource "aws_iam_policy" "lambda_invoke_policy" {
+  name = "${var.sharded_crawl.invoke_policy_name}-${terraform.workspace}"
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Action = [
+          "lambda:InvokeFunction"
+        ],
+        Effect   = "Allow",
+        Resource = "arn:aws:lambda:${var.region}:*:function:${var.sharded_crawl.worker_name}-${terraform.workspace}"
+      }
+    ]
+  })
+}
+
 resource "aws_iam_role_policy_attachment" "lambda_attach_policies" {
   for_each = {
     secrets_policy = aws_iam_policy.lambda_secrets_policy.arn
     s3_policy      = aws_iam_policy.lambda_s3_policy.arn
+    invoke_policy  = aws_iam_policy.lambda_invoke_policy.arn
   }
 
   role       = aws_iam_role.lambda_s3_role.name
@@ -116,6 +142,7 @@ resource "aws_iam_role_policy_attachment" "lambda_attach_policies" {
     aws_iam_role.lambda_s3_role,
     aws_iam_policy.lambda_secrets_policy,
     aws_iam_policy.lambda_s3_policy,
+    aws_iam_policy.lambda_invoke_policy,
   ]
 }
 
@@ -136,6 +163,31 @@ data "archive_file" "lambda_zip" {
     content  = file("${path.module}/../lambda/twitch_wrapper.py")
     filename = "twitch_wrapper.py"
   }
+
+  source {
+    content  = file("${path.module}/../lambda/shard_dispatcher.py")
+    filename = "shard_dispatcher.py"
+  }
+
+  source {
+    content  = file("${path.module}/../lambda/game_cache.py")
+    filename = "game_cache.py"
+  }
+
+  source {
+    content  = file("${path.module}/../lambda/crawl_dedup.py")
+    filename = "crawl_dedup.py"
+  }
+
+  source {
+    content  = file("${path.module}/../lambda/s3_uploader.py")
+    filename = "s3_uploader.py"
+  }
+
+  source {
+    content  = file("${path.module}/../lambda/data_quality.py")
+    filename = "data_quality.py"
+  }
 }
 
 resource "aws_lambda_function" "twitch_get_streams_lambda" {
@@ -165,20 +217,81 @@ resource "aws_lambda_function" "twitch_get_streams_lambda" {
   ]
 }
 
+resource "aws_lambda_function" "twitch_shard_worker_lambda" {
+  function_name = "${var.sharded_crawl.worker_name}-${terraform.workspace}"
+  role          = aws_iam_role.lambda_s3_role.arn
+  handler       = var.sharded_crawl.worker_handler
+  runtime       = var.lambda.runtime
+  memory_size   = var.lambda.memory_size
+  timeout       = var.sharded_crawl.worker_timeout
+
+  filename         = data.archive_file.lambda_zip.output_path
+  source_code_hash = filebase64sha256(data.archive_file.lambda_zip.output_path)
+
+  layers = var.lambda.layers
+
+  environment {
+    variables = {
+      S3_BUCKET_PATH          = "s3://${aws_s3_bucket.twitch_data_bucket.bucket}/${aws_s3_object.twitch_data_prefix.key}",
+      TWITCH_CREDENTIALS_NAME = "${aws_secretsmanager_secret.twitch_client_credentials.name}"
+    }
+  }
+
+  depends_on = [
+    data.archive_file.lambda_zip,
+    aws_iam_role_policy_attachment.lambda_attach_policies
+  ]
+}
+
+resource "aws_lambda_function" "twitch_coordinator_lambda" {
+  function_name = "${var.sharded_crawl.coordinator_name}-${terraform.workspace}"
+  role          = aws_iam_role.lambda_s3_role.arn
+  handler       = var.sharded_crawl.coordinator_handler
+  runtime       = var.lambda.runtime
+  memory_size   = var.lambda.memory_size
+  timeout       = var.sharded_crawl.coordinator_timeout
+
+  filename         = data.archive_file.lambda_zip.output_path
+  source_code_hash = filebase64sha256(data.archive_file.lambda_zip.output_path)
+
+  layers = var.lambda.layers
+
+  environment {
+    variables = {
+      S3_BUCKET_PATH             = "s3://${aws_s3_bucket.twitch_data_bucket.bucket}/${aws_s3_object.twitch_data_prefix.key}",
+      SHARD_WORKER_FUNCTION_NAME = aws_lambda_function.twitch_shard_worker_lambda.function_name,
+      SHARD_COUNT                = var.sharded_crawl.shard_count
+      SHARD_WORKER_TIMEOUT       = var.sharded_crawl.worker_timeout
+    }
+  }
+
+  depends_on = [
+    data.archive_file.lambda_zip,
+    aws_iam_role_policy_attachment.lambda_attach_policies,
+    aws_lambda_function.twitch_shard_worker_lambda,
+  ]
+}
+
 resource "aws_cloudwatch_event_rule" "every_15_minutes" {
   name                = "${var.cloudwatch.name}-${terraform.workspace}"
   description         = "Triggers Lambda every 15 minutes"
   schedule_expression = var.cloudwatch.schedule_expression
 }
 
+# With sharding enabled the snapshot is crawled by the coordinator and its workers
+# instead of the single lambda
 resource "aws_cloudwatch_event_target" "trigger_lambda" {
   rule      = aws_cloudwatch_event_rule.every_15_minutes.name
   target_id = "lambda_target"
-  arn       = aws_lambda_function.twitch_get_streams_lambda.arn
+  arn = (var.sharded_crawl.enabled
+    ? aws_lambda_function.twitch_coordinator_lambda.arn
+    : aws_lambda_function.twitch_get_streams_lambda.arn
+  )
 
   depends_on = [
     aws_cloudwatch_event_rule.every_15_minutes,
     aws_lambda_function.twitch_get_streams_lambda,
+    aws_lambda_function.twitch_coordinator_lambda,
   ]
 }
 
@@ -195,12 +308,65 @@ resource "aws_lambda_permission" "allow_eventbridge" {
   ]
 }
 
+resource "aws_lambda_permission" "allow_eventbridge_coordinator" {
+  statement_id  = "AllowCoordinatorExecutionFromCloudWatch"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.twitch_coordinator_lambda.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.every_15_minutes.arn
+
+  depends_on = [
+    aws_lambda_function.twitch_coordinator_lambda,
+    aws_cloudwatch_event_rule.every_15_minutes
+  ]
+}
+
+resource "aws_cloudwatch_event_rule" "head_sample" {
+  count               = var.head_sampling.enabled ? 1 : 0
+  name                = "${var.head_sampling.name}-${terraform.workspace}"
+  description         = "Triggers Lambda to sample the top streams"
+  schedule_expression = var.head_sampling.schedule_expression
+}
+
+resource "aws_cloudwatch_event_target" "trigger_lambda_head_sample" {
+  count     = var.head_sampling.enabled ? 1 : 0
+  rule      = aws_cloudwatch_event_rule.head_sample[0].name
+  target_id = "lambda_head_sample_target"
+  arn       = aws_lambda_function.twitch_get_streams_lambda.arn
+  input     = jsonencode({ head_pages = var.head_sampling.pages })
+
+  depends_on = [
+    aws_cloudwatch_event_rule.head_sample,
+    aws_lambda_function.twitch_get_streams_lambda,
+  ]
+}
+
+resource "aws_lambda_permission" "allow_eventbridge_head_sample" {
+  count         = var.head_sampling.enabled ? 1 : 0
+  statement_id  = "AllowHeadSampleExecutionFromCloudWatch"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.twitch_get_streams_lambda.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.head_sample[0].arn
+
+  depends_on = [
+    aws_lambda_function.twitch_get_streams_lambda,
+    aws_cloudwatch_event_rule.head_sample
+  ]
+}
+
 resource "databricks_notebook" "twitch_notebook" {
   path   = "/Users/${var.databricks_pipeline.email}/${var.databricks.notebook}"
   format = "SOURCE"
   source = "${path.module}/../${var.databricks.notebook_path}/${var.databricks.notebook}"
 }
 
+resource "databricks_notebook" "dashboard_bundle_notebook" {
+  path   = "/Users/${var.databricks_pipeline.email}/${var.databricks.bundle_notebook}"
+  format = "SOURCE"
+  source = "${path.module}/../${var.databricks.notebook_path}/${var.databricks.bundle_notebook}"
+}
+
 resource "databricks_pipeline" "this" {
   name = var.databricks.name
   configuration = {
@@ -233,6 +399,26 @@ resource "databricks_job" "this" {
     }
   }
 
+  task {
+    task_key = var.databricks.bundle_task_key
+    depends_on {
+      task_key = var.databricks.task_key
+    }
+    notebook_task {
+      notebook_path = databricks_notebook.dashboard_bundle_notebook.id
+      # Defaults to the data bucket, outside the prefix read by the pipeline, so the
+      # dashboard can read it with DASHBOARD_BUNDLE_URL
+      base_parameters = {
+        bundle_path = coalesce(
+          var.databricks_pipeline.bundle_path,
+          "s3://${aws_s3_bucket.twitch_data_bucket.bucket}/dashboard/dashboard_bundle.json"
+        )
+        catalog = databricks_pipeline.this.catalog
+        schema  = databricks_pipeline.this.target
+      }
+    }
+  }
+
   schedule {
     quartz_cron_expression = var.databricks.schedule_expression
     timezone_id            = var.databricks.timezone_id
@@ -240,6 +426,7 @@ resource "databricks_job" "this" {
 
   depends_on = [
     databricks_notebook.twitch_notebook,
+    databricks_notebook.dashboard_bundle_notebook,
   ]
 
   email_notifications {
@@ -79,6 +79,48 @@ variable "cloudwatch" {
   }
 }
 
+variable "head_sampling" {
+  description = "Schedule for sampling the top streams between full crawls. Disabled by default as every minute adds 1,440 lambda runs a day"
+  type = object({
+    enabled             = bool
+    name                = string
+    schedule_expression = string
+    pages               = number
+  })
+  default = {
+    enabled             = false
+    name                = "trigger_twitch_lambda_head_sample"
+    schedule_expression = "rate(1 minute)"
+    pages               = 10
+  }
+}
+
+variable "sharded_crawl" {
+  description = "Coordinator and shard worker lambdas crawling a snapshot by language in parallel. The coordinator waits for every worker so its timeout must be longer than the worker timeout"
+  type = object({
+    enabled             = bool
+    coordinator_name    = string
+    coordinator_handler = string
+    worker_name         = string
+    worker_handler      = string
+    shard_count         = number
+    worker_timeout      = number
+    coordinator_timeout = number
+    invoke_policy_name  = string
+  })
+  default = {
+    enabled             = false
+    coordinator_name    = "twitch_snapshot_coordinator"
+    coordinator_handler = "twitch_metrics_updater.handle_coordinator"
+    worker_name         = "twitch_snapshot_shard_worker"
+    worker_handler      = "twitch_metrics_updater.handle_shard"
+    shard_count         = 4
+    worker_timeout      = 600
+    coordinator_timeout = 900
+    invoke_policy_name  = "twitch_lambda_invoke_policy"
+  }
+}
+
 variable "databricks" {
   description = "Databricks variables"
   type = object({
@@ -88,6 +130,8 @@ variable "databricks" {
     timezone_id         = string
     notebook            = string
     notebook_path       = string
+    bundle_notebook     = string
+    bundle_task_key     = string
   })
   default = {
     name                = "Twitch pipeline"
@@ -96,19 +140,23 @@ variable "databricks" {
     timezone_id         = "America/Chicago"
     notebook            = "twitch_pipeline.sql"
     notebook_path       = "notebooks"
+    bundle_notebook     = "dashboard_bundle.py"
+    bundle_task_key     = "Build_dashboard_bundle"
   }
 }
 
 variable "databricks_pipeline" {
-  description = "Databricks additional configuration"
+  description = "Databricks additional configuration. An empty bundle_path writes the dashboard bundle to dashboard/dashboard_bundle.json in the data bucket"
   type = object({
     s3_bucket_path = string
     catalog        = string
     email          = string
+    bundle_path    = optional(string, "")
   })
   default = {
     s3_bucket_path = "CHANGEME"
     catalog        = "CHANGEME"
     email          = "CHANGEME"
+    bundle_path    = ""
   }
 }
\ No newline at end of file